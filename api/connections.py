@@ -0,0 +1,91 @@
+"""
+api/connections.py — ODBC connection strings for DatabaseConfig rows.
+
+Built strings (with the decrypted password) are kept in process memory,
+keyed by config id and its ``updated_at`` stamp, so the request path does
+no decryption after the first use.  A saved config gets a new stamp and is
+rebuilt on next use in every process; save/delete signals also drop the
+entry in the process that made the change.  Connection strings are never
+put in the shared cache.
+"""
+
+import threading
+from typing import Dict, Tuple
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from backend.crypto import decrypt_field
+from backend.db_router import db_router
+from backend.governor import query_bulkheads
+
+from .models import DatabaseConfig
+
+_descriptors: Dict[int, Tuple[object, str]] = {}  # config id → (updated_at, conn_str)
+_descriptors_lock = threading.Lock()
+
+
+def _host_conn_str(config: DatabaseConfig, host: str) -> str:
+    db = config.database_name
+
+    if config.trusted_connection:
+        conn_str = (
+            f"Driver={{ODBC Driver 17 for SQL Server}};"
+            f"Server={host};"
+            f"Database={db};"
+            f"Trusted_Connection=yes;"
+        )
+    else:
+        conn_str = (
+            f"Driver={{ODBC Driver 17 for SQL Server}};"
+            f"Server={host};"
+            f"Database={db};"
+            f"UID={config.username};"
+            f"PWD={decrypt_field(config.password_secret_ref)};"
+        )
+
+    # For named instances (e.g. localhost\SQLEXPRESS), port is resolved via SQL Server Browser.
+    # Only append port when no named instance (or explicit 'host,port') is present.
+    if config.port and config.port != 1433 and '\\' not in host and ',' not in host:
+        conn_str = conn_str.replace(
+            f"Server={host};",
+            f"Server={host},{config.port};"
+        )
+    return conn_str
+
+
+def build_conn_str(config: DatabaseConfig) -> str:
+    """
+    Build an ODBC connection string from a DatabaseConfig model instance
+    (cached per config version, see module docstring).  Also registers the
+    config's query concurrency budget (per host), its read replicas for
+    that target and matching connection pool sizes.  The returned (primary) string identifies the target
+    everywhere — caches, query slots — while db_router sends the queries
+    themselves to a healthy replica when there are any.
+    """
+    cached = _descriptors.get(config.pk)
+    if cached is not None and cached[0] == config.updated_at:
+        return cached[1]
+
+    conn_str = _host_conn_str(config, config.host)
+    replicas = [_host_conn_str(config, host.strip()) for host in config.read_replicas or [] if host.strip()]
+    # The budget is per host, so a replica set adds capacity rather than sharing it.
+    budget = config.max_concurrent_queries or query_bulkheads.default_size
+    slots = budget * (1 + len(replicas))
+    query_bulkheads.configure(conn_str, slots)
+    db_router.set_replicas(conn_str, replicas)
+    # Every slot the target can grant (plus the shared overflow) may land on one
+    # host when the others are down, so each host's pool has room for all of them.
+    for host_conn_str in [conn_str, *replicas]:
+        db_router.set_pool_size(host_conn_str, slots + query_bulkheads.overflow.size)
+    if config.pk is not None:
+        with _descriptors_lock:
+            _descriptors[config.pk] = (config.updated_at, conn_str)
+    return conn_str
+
+
+@receiver(post_save, sender=DatabaseConfig)
+@receiver(post_delete, sender=DatabaseConfig)
+def _drop_descriptor(sender, instance, **kwargs):
+    with _descriptors_lock:
+        _descriptors.pop(instance.pk, None)
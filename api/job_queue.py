@@ -0,0 +1,510 @@
+"""
+api/job_queue.py — async query jobs (run_query_async / validate_query_async).
+
+A job is a ``kind`` plus a JSON payload; the function registered for the
+kind with @handler turns the payload into the result dict.  Job state —
+queued, running, completed with its result, failed with its error, or
+cancelled with the reason — is published to the cache under
+``qjob:<job id>`` for the status endpoints.
+
+Where jobs run depends on QUERY_WORKERS:
+
+- off (default): on a PriorityExecutor in the web process that accepted
+  them.  Jobs still waiting are lost if that process restarts.
+- on: web processes only insert a QueryJob row.  ``manage.py
+  run_query_workers`` processes claim rows (lowest priority value, then
+  oldest, first), run them and delete them.  A claim is a lease of
+  QUERY_JOB_VISIBILITY_SECONDS, renewed by the watchdog while the job runs:
+  a job whose worker died is claimed again once its lease lapses, and a job
+  whose handler raised is retried with backoff, up to QUERY_JOB_MAX_ATTEMPTS
+  runs.  Kinds registered with ``retry=False`` (handlers with side effects)
+  are failed instead of being run again.  Claims are conditional UPDATEs on
+  the attempt counter, so any number of worker processes, on any host,
+  share the queue.
+
+Either way at most QUERY_JOB_QUEUE_MAX jobs wait; enqueue() raises QueueFull
+beyond that.
+
+Cancellation
+------------
+cancel() flags a job in the cache (``qjob:cancel:<id>``).  A queued job is
+dropped at once; a running one is stopped by the watchdog thread of the
+process running it, which checks its jobs' flags every
+_WATCHDOG_INTERVAL_SECONDS and cancels their statements on the server
+(backend/cancellation.py).  The watchdog also cancels jobs whose client has
+stopped asking for their status for QUERY_JOB_ABANDON_SECONDS
+(``qjob:client:<id>``, refreshed by mark_seen()), and enqueue(supersede=...)
+cancels the previous job enqueued under the same key.
+
+Coalescing
+----------
+enqueue(coalesce=...) attaches a job to an execution already in flight for
+the same key (``qjob:flight:<key>``) instead of running it again.  The job
+id's state points at that execution (``follows``) and read() resolves it,
+so every subscriber receives the one result.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from backend.cancellation import CancelScope, activate
+from backend.config import (
+    QUERY_JOB_ABANDON_SECONDS, QUERY_JOB_MAX_ATTEMPTS, QUERY_JOB_QUEUE_MAX, QUERY_JOB_VISIBILITY_SECONDS,
+    QUERY_WORKERS,
+)
+from backend.governor import PRIORITY_VALIDATE, PriorityExecutor
+
+from .models import QueryJob
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = "qjob:{}"
+JOB_TTL_SECONDS = 10 * 60
+JOB_DONE = ('completed', 'failed', 'cancelled')
+_CANCEL_KEY = "qjob:cancel:{}"
+_CLIENT_KEY = "qjob:client:{}"     # {'user_id': owner, 'seen': last status request (epoch seconds)}
+_LATEST_KEY = "qjob:latest:{}"     # newest job id per supersession key
+_FLIGHT_KEY = "qjob:flight:{}"     # execution shared by jobs with this coalesce key
+_SUBSCRIBERS_KEY = "qjob:subs:{}"  # jobs still following an execution
+
+# Notified whenever a job run by this process finishes (wakes long-polling status requests).
+job_finished = threading.Condition()
+
+_RETRY_BACKOFF_SECONDS = 2
+_CLAIM_BATCH = 10
+_IDLE_MIN_SECONDS = 0.1
+_IDLE_MAX_SECONDS = 1.0
+_WATCHDOG_INTERVAL_SECONDS = 0.5
+_LEASE_RENEW_SECONDS = max(1.0, QUERY_JOB_VISIBILITY_SECONDS / 3)
+
+_handlers: Dict[str, Callable[[dict], dict]] = {}
+_no_retry: Set[str] = set()   # kinds whose jobs must not run twice
+_local_executor = PriorityExecutor(max_workers=6, name="qb-jobs")
+
+
+class QueueFull(Exception):
+    """Raised by enqueue() when QUERY_JOB_QUEUE_MAX jobs are already waiting."""
+
+
+def handler(kind: str, retry: bool = True):
+    """
+    Registers the function that runs jobs of ``kind``: ``fn(payload) -> result dict``.
+    ``retry=False`` for handlers that are not idempotent: a durable job of
+    that kind that raised, or whose worker died, is failed, not run again.
+    """
+    def register(fn):
+        _handlers[kind] = fn
+        if retry:
+            _no_retry.discard(kind)
+        else:
+            _no_retry.add(kind)
+        return fn
+    return register
+
+
+def publish(job_id: str, state: dict) -> None:
+    cache.set(JOB_KEY.format(job_id), state, timeout=JOB_TTL_SECONDS)
+    if state.get('status') in JOB_DONE:
+        with job_finished:
+            job_finished.notify_all()
+
+
+def waiting() -> int:
+    """Jobs accepted but not yet started."""
+    if QUERY_WORKERS:
+        return QueryJob.objects.filter(status='queued').count()
+    return _local_executor.pending()
+
+
+def enqueue(
+    kind: str,
+    payload: dict,
+    priority: int = PRIORITY_VALIDATE,
+    queue_position: int = 0,
+    user_id=None,
+    supersede: Optional[str] = None,
+    coalesce: Optional[str] = None,
+) -> str:
+    """
+    Accepts a job and returns its id.  ``payload`` must be JSON-serialisable;
+    ``queue_position`` is the caller's place in the database's slot queue,
+    reported while the job waits.  ``user_id`` owns the job (may cancel it,
+    keeps it alive by asking for its status).  A ``supersede`` key cancels
+    the previous job enqueued with the same key.
+
+    Jobs with the same ``coalesce`` key share one execution while it is in
+    flight: the job id follows that execution and reads its result.  Only
+    pass it for jobs whose result does not depend on who asked.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job_id = uuid4().hex
+    client = {'user_id': user_id, 'seen': time.time()}
+    if coalesce:
+        flight = _join_flight(coalesce, kind, payload, priority, queue_position)
+        publish(job_id, {'status': 'queued', 'queue_position': queue_position, 'follows': flight})
+        client['flight'] = flight
+    else:
+        _submit(job_id, kind, payload, priority, queue_position)
+    if user_id is not None:
+        cache.set(_CLIENT_KEY.format(job_id), client, timeout=JOB_TTL_SECONDS)
+
+    if supersede:
+        previous = cache.get(_LATEST_KEY.format(supersede))
+        cache.set(_LATEST_KEY.format(supersede), job_id, timeout=JOB_TTL_SECONDS)
+        if previous:
+            cancel(previous, reason='superseded')
+    return job_id
+
+
+def _submit(job_id: str, kind: str, payload: dict, priority: int, queue_position: int) -> None:
+    """Queues one execution of a job (QueueFull when the queue is at QUERY_JOB_QUEUE_MAX)."""
+    if waiting() >= QUERY_JOB_QUEUE_MAX:
+        raise QueueFull()
+
+    # Published before the job can start, so a fast worker's 'running' is never overwritten.
+    publish(job_id, {'status': 'queued', 'queue_position': queue_position})
+    if QUERY_WORKERS:
+        try:
+            QueryJob.objects.create(
+                job_id=job_id, kind=kind, payload=payload, priority=priority, available_at=timezone.now(),
+            )
+        except Exception:
+            cache.delete(JOB_KEY.format(job_id))
+            raise
+    else:
+        _local_executor.submit(lambda: _run_local(job_id, kind, payload), priority=priority)
+
+
+def _join_flight(coalesce: str, kind: str, payload: dict, priority: int, queue_position: int) -> str:
+    """
+    Returns the id of the unfinished execution for ``coalesce``, subscribing
+    to it, or starts a new one.  An execution has no owner of its own: its
+    subscribers' status requests keep it alive, and it is cancelled once its
+    last subscriber is.
+    """
+    key = _FLIGHT_KEY.format(coalesce)
+    for _ in range(2):
+        flight = cache.get(key)
+        if flight is not None and _subscribe(flight):
+            return flight
+        new_flight = uuid4().hex
+        # add() lets exactly one of several simultaneous first requests start the
+        # execution; a finished or cancelled one left under the key is replaced.
+        if cache.add(key, new_flight, timeout=JOB_TTL_SECONDS) or (flight is not None and cache.get(key) == flight):
+            cache.set(key, new_flight, timeout=JOB_TTL_SECONDS)
+            return _start_flight(new_flight, kind, payload, priority, queue_position)
+    return _start_flight(uuid4().hex, kind, payload, priority, queue_position)
+
+
+def _subscribe(flight: str) -> bool:
+    state = cache.get(JOB_KEY.format(flight))
+    if not state or state.get('status') in JOB_DONE:
+        return False
+    try:
+        cache.incr(_SUBSCRIBERS_KEY.format(flight))
+    except ValueError:
+        return False  # expired
+    state = cache.get(JOB_KEY.format(flight))
+    return bool(state) and state.get('status') != 'cancelled'
+
+
+def _start_flight(flight: str, kind: str, payload: dict, priority: int, queue_position: int) -> str:
+    cache.set(_SUBSCRIBERS_KEY.format(flight), 1, timeout=JOB_TTL_SECONDS)
+    cache.set(_CLIENT_KEY.format(flight), {'user_id': None, 'seen': time.time()}, timeout=JOB_TTL_SECONDS)
+    _submit(flight, kind, payload, priority, queue_position)
+    return flight
+
+
+def _run_local(job_id: str, kind: str, payload: dict) -> None:
+    reason = _cancel_reasons([job_id]).get(job_id)
+    if reason:
+        publish(job_id, {'status': 'cancelled', 'reason': reason})
+        return
+
+    scope = CancelScope()
+    try:
+        with _watchdog.guard(job_id, scope), activate(scope):
+            publish(job_id, {'status': 'running'})
+            try:
+                result = _handlers[kind](payload)
+            except Exception as e:
+                if not scope.cancelled:
+                    logger.error(f"Async job failed for job_id={job_id}: {e}", exc_info=True)
+                    publish(job_id, {'status': 'failed', 'error': str(e)})
+                    return
+        if scope.cancelled:
+            publish(job_id, {'status': 'cancelled', 'reason': scope.reason})
+        else:
+            publish(job_id, {'status': 'completed', 'result': result})
+    finally:
+        close_old_connections()
+
+
+def claim(worker: str) -> Optional[QueryJob]:
+    """
+    Leases the next runnable job to ``worker``: a queued job whose backoff has
+    passed, or a running job whose lease expired.  Returns None when there is
+    none.  Expired jobs that have used up their attempts are failed instead.
+    """
+    now = timezone.now()
+    candidates = QueryJob.objects.filter(
+        Q(status='queued', available_at__lte=now) | Q(status='running', leased_until__lt=now)
+    ).order_by('priority', 'created_at')[:_CLAIM_BATCH]
+
+    for job in candidates:
+        fence = QueryJob.objects.filter(pk=job.pk, attempts=job.attempts)
+        if job.status == 'running' and (job.attempts >= QUERY_JOB_MAX_ATTEMPTS or job.kind in _no_retry):
+            if fence.delete()[0]:
+                logger.error(f"Job {job.job_id} abandoned by worker {job.worker} after {job.attempts} attempt(s)")
+                publish(job.job_id, {'status': 'failed', 'error': 'Query job did not finish. Please try again.'})
+            continue
+
+        leased_until = now + timedelta(seconds=QUERY_JOB_VISIBILITY_SECONDS)
+        if fence.update(status='running', attempts=job.attempts + 1, worker=worker, leased_until=leased_until):
+            if job.status == 'running':
+                logger.warning(f"Job {job.job_id}: lease held by {job.worker} expired, retrying")
+            job.status, job.attempts, job.worker, job.leased_until = 'running', job.attempts + 1, worker, leased_until
+            return job
+    return None
+
+
+def run_claimed(job: QueryJob) -> None:
+    """
+    Runs a job returned by claim() and settles it: deleted and published on
+    success or cancellation, re-queued with backoff on error while attempts
+    remain (and its kind may be retried), failed otherwise.  The lease is
+    renewed while the handler runs.  A worker whose lease was taken over no longer
+    owns the row and leaves it alone.
+    """
+    fence = QueryJob.objects.filter(pk=job.pk, attempts=job.attempts)
+    reason = _cancel_reasons([job.job_id]).get(job.job_id)
+    if reason:
+        fence.delete()
+        publish(job.job_id, {'status': 'cancelled', 'reason': reason})
+        return
+
+    scope = CancelScope()
+    with _watchdog.guard(job.job_id, scope, lease=(job.pk, job.attempts)), activate(scope):
+        publish(job.job_id, {'status': 'running'})
+        try:
+            result = _handlers[job.kind](job.payload)
+            error = None
+        except Exception as e:
+            result, error = None, e
+
+    if scope.cancelled:
+        fence.delete()
+        publish(job.job_id, {'status': 'cancelled', 'reason': scope.reason})
+    elif error is not None:
+        if job.attempts < QUERY_JOB_MAX_ATTEMPTS and job.kind not in _no_retry:
+            logger.warning(f"Job {job.job_id} attempt {job.attempts} failed, retrying: {error}")
+            retry_at = timezone.now() + timedelta(seconds=_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+            if fence.update(status='queued', leased_until=None, available_at=retry_at, last_error=str(error)):
+                publish(job.job_id, {'status': 'queued', 'queue_position': 0})
+            return
+        logger.error(f"Async job failed for job_id={job.job_id}: {error}", exc_info=error)
+        if fence.delete()[0]:
+            publish(job.job_id, {'status': 'failed', 'error': str(error)})
+    else:
+        fence.delete()
+        publish(job.job_id, {'status': 'completed', 'result': result})
+
+
+def work(worker: str, stop) -> None:
+    """
+    Claims and runs jobs until ``stop`` (a threading or multiprocessing
+    Event) is set, backing off while the queue is empty.
+    """
+    idle = _IDLE_MIN_SECONDS
+    while not stop.is_set():
+        try:
+            job = claim(worker)
+            if job is not None:
+                run_claimed(job)
+        except Exception:
+            logger.exception(f"Query worker {worker}: error while processing the queue")
+            job = None
+        finally:
+            close_old_connections()
+
+        if job is None:
+            stop.wait(idle)
+            idle = min(idle * 2, _IDLE_MAX_SECONDS)
+        else:
+            idle = _IDLE_MIN_SECONDS
+
+
+def read(job_ids: Iterable[str]) -> Dict[str, dict]:
+    """
+    {job_id: state} for those of ``job_ids`` that exist, with coalesced jobs
+    showing the state of the execution they follow (one cache round trip,
+    two when any job is coalesced).
+    """
+    keys = {JOB_KEY.format(job_id): job_id for job_id in job_ids}
+    jobs = {keys[key]: state for key, state in cache.get_many(list(keys)).items()}
+    flights = {state['follows'] for state in jobs.values() if 'follows' in state}
+    if flights:
+        flight_states = cache.get_many([JOB_KEY.format(flight) for flight in flights])
+        for job_id, state in jobs.items():
+            if 'follows' in state:
+                shared = flight_states.get(JOB_KEY.format(state['follows']))
+                jobs[job_id] = shared or {k: v for k, v in state.items() if k != 'follows'}
+    return jobs
+
+
+def owner(job_id: str):
+    """User id that enqueued the job, or None (unknown, expired, or enqueued without one)."""
+    client = cache.get(_CLIENT_KEY.format(job_id))
+    return client['user_id'] if client else None
+
+
+def mark_seen(job_ids: Iterable[str], user_id) -> None:
+    """Records that ``user_id`` is still waiting for those of ``job_ids`` it owns."""
+    keys = [_CLIENT_KEY.format(job_id) for job_id in job_ids]
+    now = time.time()
+    seen = {
+        key: {**client, 'seen': now}
+        for key, client in cache.get_many(keys).items() if client['user_id'] == user_id
+    }
+    # A followed execution stays wanted while any of its subscribers is.
+    for client in list(seen.values()):
+        if client.get('flight'):
+            seen[_CLIENT_KEY.format(client['flight'])] = {'user_id': None, 'seen': now}
+    if seen:
+        cache.set_many(seen, timeout=JOB_TTL_SECONDS)
+
+
+def cancel(job_id: str, reason: str = 'cancelled') -> bool:
+    """
+    Cancels a job: a queued one never runs, a running one has its statement
+    stopped within _WATCHDOG_INTERVAL_SECONDS by whichever process runs it.
+    Returns False when the job is unknown or already finished.
+    """
+    state = cache.get(JOB_KEY.format(job_id))
+    if state and 'follows' in state:
+        return _unsubscribe(job_id, state['follows'], reason)
+    if not state or state.get('status') in JOB_DONE:
+        return False
+    cache.set(_CANCEL_KEY.format(job_id), reason, timeout=JOB_TTL_SECONDS)
+    if QUERY_WORKERS:
+        QueryJob.objects.filter(job_id=job_id, status='queued').delete()
+    if state.get('status') == 'queued':
+        publish(job_id, {'status': 'cancelled', 'reason': reason})
+    _watchdog.cancel(job_id, reason)  # fast path when it runs in this process
+    return True
+
+
+def _unsubscribe(job_id: str, flight: str, reason: str) -> bool:
+    """Cancels a coalesced job; its shared execution is cancelled with its last subscriber."""
+    flight_state = cache.get(JOB_KEY.format(flight))
+    if not flight_state or flight_state.get('status') in JOB_DONE:
+        return False
+    publish(job_id, {'status': 'cancelled', 'reason': reason})
+    try:
+        remaining = cache.decr(_SUBSCRIBERS_KEY.format(flight))
+    except ValueError:
+        remaining = 0
+    if remaining <= 0:
+        cancel(flight, reason)
+    return True
+
+
+def _cancel_reasons(job_ids) -> Dict[str, str]:
+    """{job_id: reason} for those of ``job_ids`` that are cancelled or abandoned (one cache round trip)."""
+    keys = {}
+    for job_id in job_ids:
+        keys[_CANCEL_KEY.format(job_id)] = job_id
+        keys[_CLIENT_KEY.format(job_id)] = job_id
+    stale_before = time.time() - QUERY_JOB_ABANDON_SECONDS
+    reasons = {}
+    for key, value in cache.get_many(list(keys)).items():
+        job_id = keys[key]
+        if key.startswith("qjob:cancel:"):
+            reasons[job_id] = value
+        elif value['seen'] < stale_before:
+            reasons.setdefault(job_id, 'abandoned')
+    return reasons
+
+
+def _renew_leases(leases: Iterable[Tuple[int, int]]) -> None:
+    """Extends the lease of each ``(pk, attempts)`` durable job still held by this claim."""
+    leased_until = timezone.now() + timedelta(seconds=QUERY_JOB_VISIBILITY_SECONDS)
+    try:
+        for pk, attempts in leases:
+            QueryJob.objects.filter(pk=pk, attempts=attempts, status='running').update(leased_until=leased_until)
+    finally:
+        close_old_connections()
+
+
+class _Watchdog:
+    """
+    Cancels jobs running in this process once they are cancelled elsewhere
+    (the cancel request may reach another web process) or abandoned, and
+    renews the leases of the durable ones every _LEASE_RENEW_SECONDS.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._jobs: Dict[str, CancelScope] = {}
+        self._leases: Dict[str, Tuple[int, int]] = {}  # job id → (QueryJob pk, attempts) of its claim
+        self._renewed_at = 0.0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @contextmanager
+    def guard(self, job_id: str, scope: CancelScope, lease: Optional[Tuple[int, int]] = None):
+        with self._lock:
+            self._jobs[job_id] = scope
+            if lease is not None:
+                self._leases[job_id] = lease
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="qb-job-watchdog", daemon=True)
+                self._thread.start()
+        try:
+            yield scope
+        finally:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._leases.pop(job_id, None)
+
+    def cancel(self, job_id: str, reason: str) -> None:
+        with self._lock:
+            scope = self._jobs.get(job_id)
+        if scope is not None:
+            scope.cancel(reason)
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                jobs = dict(self._jobs)
+                leases = list(self._leases.values())
+            if not jobs:
+                continue
+            try:
+                for job_id, reason in _cancel_reasons(jobs).items():
+                    logger.info(f"Cancelling job {job_id} ({reason})")
+                    jobs[job_id].cancel(reason)
+            except Exception:
+                logger.exception("Job watchdog failed to check for cancellations")
+            if leases and time.monotonic() - self._renewed_at >= _LEASE_RENEW_SECONDS:
+                self._renewed_at = time.monotonic()
+                try:
+                    _renew_leases(leases)
+                except Exception:
+                    logger.exception("Job watchdog failed to renew leases")
+
+
+_watchdog = _Watchdog(_WATCHDOG_INTERVAL_SECONDS)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from api.connections import build_conn_str
+from api.models import SolutionSnapshot
+from api import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Re-run captured solution queries and flag snapshots whose results have drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--config', type=int, help='Only check snapshots for this DatabaseConfig id.')
+        parser.add_argument('--question', type=int, help='Only check snapshots for this Question id.')
+
+    def handle(self, *args, **options):
+        qs = SolutionSnapshot.objects.select_related('question', 'db_config').order_by('db_config_id', 'question_id')
+        if options['config']:
+            qs = qs.filter(db_config_id=options['config'])
+        if options['question']:
+            qs = qs.filter(question_id=options['question'])
+
+        conn_strs = {}
+        counts = {'ok': 0, 'drifted': 0, 'errors': 0}
+        for snapshot in qs:
+            config = snapshot.db_config
+            if config.id not in conn_strs:
+                conn_strs[config.id] = build_conn_str(config)
+            drifted, err = snapshots.check_drift(snapshot, conn_strs[config.id])
+            label = f'question {snapshot.question_id} on config {config.id} ({config.config_name})'
+            if err:
+                counts['errors'] += 1
+                self.stdout.write(self.style.ERROR(f'  {label}: {err}'))
+            elif drifted:
+                counts['drifted'] += 1
+                self.stdout.write(self.style.WARNING(f'  {label}: {snapshot.drift_detail}'))
+            else:
+                counts['ok'] += 1
+
+        summary = f"Checked {sum(counts.values())} snapshot(s): {counts['ok']} ok, {counts['drifted']} drifted, {counts['errors']} failed."
+        if counts['drifted'] or counts['errors']:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
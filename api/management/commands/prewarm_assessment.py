@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Assessment
+from api import prewarm
+
+
+class Command(BaseCommand):
+    help = (
+        "Warm an assessment's database before the exam starts: connections, schema cache "
+        "and every question's solution result. Prints each step's timing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('assessment_id', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            assessment = Assessment.objects.select_related('db_config').get(pk=options['assessment_id'])
+        except Assessment.DoesNotExist:
+            raise CommandError(f"Assessment {options['assessment_id']} does not exist.")
+
+        report = prewarm.prewarm(assessment)
+
+        conns = report['connections']
+        self.stdout.write(f"Connections ({conns['ms']} ms, pool size {conns['pool_size']}):")
+        for target in conns['targets'].values():
+            self._line(f"{target['target']}: {target['idle']} idle, {target['ms']} ms", target['error'])
+
+        schema = report['schema']
+        self.stdout.write(f"Schema ({schema['ms']} ms):")
+        self._line(f"{schema['tables']} table(s)", schema['error'])
+
+        sols = report['solutions']
+        self.stdout.write(f"Solutions ({sols['ms']} ms):")
+        for question_id, sol in sols['questions'].items():
+            self._line(f"question {question_id}: {sol['status']}, {sol['ms']} ms", sol['error'])
+
+        summary = f"Pre-warmed assessment {assessment.id} ({assessment.name}) in {report['total_ms']} ms."
+        if report['ok']:
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            self.stdout.write(self.style.WARNING(summary + ' Some steps failed.'))
+
+    def _line(self, text, error):
+        if error:
+            self.stdout.write(self.style.ERROR(f'  {text} — {error}'))
+        else:
+            self.stdout.write(f'  {text}')
@@ -0,0 +1,84 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def _serve(threads, stop):
+    """Worker process: ``threads`` threads claiming jobs until ``stop`` is set."""
+    import django
+    django.setup()  # no-op when forked from an already set-up parent
+    from api import job_queue, views  # noqa: F401 — importing views registers the job handlers
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl-C and sets ``stop``
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=stop.set).start())
+
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    workers = [
+        threading.Thread(target=job_queue.work, args=(f"{prefix}:{i}", stop), name=f"qb-worker-{i}")
+        for i in range(threads)
+    ]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+
+class Command(BaseCommand):
+    help = (
+        'Run async query jobs from the durable job queue (QUERY_WORKERS=True). '
+        'Start the command on more hosts to add capacity.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Worker processes (default 2).')
+        parser.add_argument('--threads', type=int, default=4, help='Jobs run at once per process (default 4).')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        threads = max(1, options['threads'])
+        stop = multiprocessing.Event()
+        stopping = []
+
+        def _shutdown(*_):
+            # Only flag it here: setting ``stop`` could deadlock if the signal
+            # lands while this thread holds the event's lock.
+            stopping.append(True)
+
+        signal.signal(signal.SIGINT, _shutdown)
+        signal.signal(signal.SIGTERM, _shutdown)
+
+        connections.close_all()  # never share a database connection with forked children
+        procs = [self._spawn(threads, stop) for _ in range(processes)]
+        self.stdout.write(self.style.SUCCESS(
+            f'Started {processes} query worker process(es) x {threads} thread(s).'
+        ))
+
+        while not stopping:
+            for i, proc in enumerate(procs):
+                if not proc.is_alive():
+                    logger.error(f"Query worker process {proc.pid} exited with {proc.exitcode}; restarting")
+                    procs[i] = self._spawn(threads, stop)
+            time.sleep(1)
+
+        self.stdout.write('Stopping query workers (finishing running jobs)...')
+        stop.set()
+        for proc in procs:
+            proc.join(timeout=30)
+            if proc.is_alive():
+                proc.terminate()
+        self.stdout.write(self.style.SUCCESS('Query workers stopped.'))
+
+    @staticmethod
+    def _spawn(threads, stop):
+        proc = multiprocessing.Process(target=_serve, args=(threads, stop), name='qb-query-worker')
+        proc.start()
+        return proc
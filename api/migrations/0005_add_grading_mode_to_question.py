@@ -0,0 +1,27 @@
+# Generated migration to add checksum grading mode to Question
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_add_lti_fields_to_attempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='grading_mode',
+            field=models.CharField(
+                choices=[('ROWS', 'Row comparison'), ('CHECKSUM', 'Server-side checksum')],
+                default='ROWS',
+                help_text=(
+                    'ROWS compares up to MAX_RESULT_ROWS result rows in the app. CHECKSUM has SQL Server '
+                    'fingerprint the complete results (row count + checksum aggregate) for questions with '
+                    'large answers; it is always order-insensitive.'
+                ),
+                max_length=20,
+            ),
+        ),
+    ]
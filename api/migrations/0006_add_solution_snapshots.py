@@ -0,0 +1,49 @@
+# Generated migration to add golden solution snapshots
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_add_grading_mode_to_question'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolutionSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grading_mode', models.CharField(default='ROWS', max_length=20)),
+                ('solution_sql_hash', models.CharField(
+                    help_text='SHA-256 of the solution query captured; a snapshot is ignored once the solution is edited.',
+                    max_length=64,
+                )),
+                ('columns', models.JSONField(default=list)),
+                ('column_signature', models.JSONField(default=list, help_text='[[column name, Python type name], ...]')),
+                ('row_count', models.BigIntegerField()),
+                ('digest', models.CharField(help_text='Order-independent digest of the expected rows.', max_length=100)),
+                ('rows_blob', models.BinaryField(
+                    blank=True,
+                    help_text='zlib-compressed JSON rows (row grading only; empty when a value is not JSON-safe).',
+                    null=True,
+                )),
+                ('checksum', models.JSONField(blank=True, help_text='Server-side checksum aggregates (checksum grading).', null=True)),
+                ('captured_at', models.DateTimeField()),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('is_drifted', models.BooleanField(default=False)),
+                ('drift_detail', models.CharField(blank=True, default='', max_length=255)),
+                ('db_config', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='api.databaseconfig',
+                )),
+                ('question', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='api.question',
+                )),
+            ],
+            options={
+                'db_table': 'solution_snapshots',
+                'unique_together': {('question', 'db_config')},
+            },
+        ),
+    ]
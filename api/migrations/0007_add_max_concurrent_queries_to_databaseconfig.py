@@ -0,0 +1,25 @@
+# Generated migration to add per-database query concurrency budgets
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_add_solution_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaseconfig',
+            name='max_concurrent_queries',
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                null=True,
+                help_text=(
+                    'Queries that may run on this database at once (all workers), before borrowing from the '
+                    'shared overflow pool. Blank uses MAX_CONCURRENT_QUERY_RUNS.'
+                ),
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated migration to add the durable async query job queue
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_add_max_concurrent_queries_to_databaseconfig'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=32, unique=True)),
+                ('kind', models.CharField(max_length=30)),
+                ('payload', models.JSONField(default=dict)),
+                ('priority', models.PositiveSmallIntegerField(default=1)),
+                ('status', models.CharField(
+                    choices=[('queued', 'Queued'), ('running', 'Running')], default='queued', max_length=10,
+                )),
+                ('attempts', models.PositiveSmallIntegerField(
+                    default=0,
+                    help_text='Times a worker has claimed the job; also fences out a worker whose lease expired.',
+                )),
+                ('available_at', models.DateTimeField(help_text='Not claimed before this (retry backoff).')),
+                ('leased_until', models.DateTimeField(
+                    blank=True, null=True, help_text='While running: another worker may reclaim the job after this.',
+                )),
+                ('worker', models.CharField(blank=True, default='', max_length=100)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'query_jobs',
+                'indexes': [models.Index(fields=['status', 'priority', 'created_at'], name='query_jobs_status_b83d2e_idx')],
+            },
+        ),
+    ]
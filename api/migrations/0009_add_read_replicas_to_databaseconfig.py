@@ -0,0 +1,26 @@
+# Generated migration to add read replicas to database configs
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_add_query_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaseconfig',
+            name='read_replicas',
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text=(
+                    "Hosts of read-only replicas of this database (same database name, port and credentials; "
+                    "'host,port' to override the port). Participant queries are spread across the healthy "
+                    "replicas, falling back to the host above. max_concurrent_queries applies to each host."
+                ),
+            ),
+        ),
+    ]
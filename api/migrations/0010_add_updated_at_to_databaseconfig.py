@@ -0,0 +1,18 @@
+# Generated migration to stamp database config changes (connection string cache key)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_add_read_replicas_to_databaseconfig'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaseconfig',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
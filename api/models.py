@@ -25,7 +25,23 @@ class DatabaseConfig(models.Model):
         max_length=128, blank=True, default='',
         help_text="When set, the schema explorer only shows tables belonging to this schema.",
     )
+    max_concurrent_queries = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        help_text=(
+            "Queries that may run on this database at once (all workers), before borrowing from the "
+            "shared overflow pool. Blank uses MAX_CONCURRENT_QUERY_RUNS."
+        ),
+    )
+    read_replicas = models.JSONField(
+        default=list, blank=True,
+        help_text=(
+            "Hosts of read-only replicas of this database (same database name, port and credentials; "
+            "'host,port' to override the port). Participant queries are spread across the healthy "
+            "replicas, falling back to the host above. max_concurrent_queries applies to each host."
+        ),
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'database_configs'
@@ -51,6 +67,18 @@ class Question(models.Model):
         default=False,
         help_text="When True, participant result row order must match the solution exactly.",
     )
+    GRADING_MODE_CHOICES = [
+        ('ROWS', 'Row comparison'),
+        ('CHECKSUM', 'Server-side checksum'),
+    ]
+    grading_mode = models.CharField(
+        max_length=20, choices=GRADING_MODE_CHOICES, default='ROWS',
+        help_text=(
+            "ROWS compares up to MAX_RESULT_ROWS result rows in the app. CHECKSUM has SQL Server "
+            "fingerprint the complete results (row count + checksum aggregate) for questions with "
+            "large answers; it is always order-insensitive."
+        ),
+    )
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -61,6 +89,42 @@ class Question(models.Model):
         return self.title
 
 
+class SolutionSnapshot(models.Model):
+    """
+    Golden output of a question's solution query against one DatabaseConfig,
+    captured when the question is validated (see api/snapshots.py).  Grading
+    uses it instead of executing the solution; the drift check re-runs the
+    solution and flags the snapshot when the live data no longer matches.
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='snapshots')
+    db_config = models.ForeignKey(DatabaseConfig, on_delete=models.CASCADE, related_name='snapshots')
+    grading_mode = models.CharField(max_length=20, default='ROWS')
+    solution_sql_hash = models.CharField(
+        max_length=64,
+        help_text="SHA-256 of the solution query captured; a snapshot is ignored once the solution is edited.",
+    )
+    columns = models.JSONField(default=list)
+    column_signature = models.JSONField(default=list, help_text="[[column name, Python type name], ...]")
+    row_count = models.BigIntegerField()
+    digest = models.CharField(max_length=100, help_text="Order-independent digest of the expected rows.")
+    rows_blob = models.BinaryField(
+        null=True, blank=True,
+        help_text="zlib-compressed JSON rows (row grading only; empty when a value is not JSON-safe).",
+    )
+    checksum = models.JSONField(null=True, blank=True, help_text="Server-side checksum aggregates (checksum grading).")
+    captured_at = models.DateTimeField()
+    verified_at = models.DateTimeField(null=True, blank=True)
+    is_drifted = models.BooleanField(default=False)
+    drift_detail = models.CharField(max_length=255, blank=True, default='')
+
+    class Meta:
+        db_table = 'solution_snapshots'
+        unique_together = ('question', 'db_config')
+
+    def __str__(self):
+        return f"Snapshot q{self.question_id} @ config {self.db_config_id}"
+
+
 class Assessment(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -179,3 +243,38 @@ class AttemptAnswer(models.Model):
 
     class Meta:
         db_table = 'attempt_answers'
+
+
+class QueryJob(models.Model):
+    """
+    A queued async query run or validation (see api/job_queue.py), held here
+    so it survives web restarts until a ``run_query_workers`` process has
+    finished it.  Status and results are published to the cache; the row is
+    deleted once the job is done.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+    ]
+    job_id = models.CharField(max_length=32, unique=True)
+    kind = models.CharField(max_length=30)
+    payload = models.JSONField(default=dict)
+    priority = models.PositiveSmallIntegerField(default=1)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(
+        default=0, help_text='Times a worker has claimed the job; also fences out a worker whose lease expired.',
+    )
+    available_at = models.DateTimeField(help_text='Not claimed before this (retry backoff).')
+    leased_until = models.DateTimeField(
+        null=True, blank=True, help_text='While running: another worker may reclaim the job after this.',
+    )
+    worker = models.CharField(max_length=100, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'query_jobs'
+        indexes = [models.Index(fields=['status', 'priority', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.kind} job {self.job_id} ({self.status})"
@@ -0,0 +1,73 @@
+"""
+api/prewarm.py — warming an assessment's database target before the exam starts.
+
+Without it the first wave of participants pays for everything at once: new
+connections, schema introspection and a run of every question's solution.
+prewarm() does that work up front, in order, and reports each step's time:
+
+1. connections — fills this process's pools for the config's host and each
+   read replica to the per-host query budget.  Pools are per process, so
+   this warms the worker (or command) that runs it and checks every host
+   accepts connections; other workers still open their own on first use.
+2. schema      — introspects the database into the shared schema cache.  Each
+   question's filtered view is derived from it in process on request, so
+   there is nothing further to warm.
+3. solutions   — runs every solution into the shared solution-result cache
+   (rows or checksum, per the question's grading mode).  Questions graded
+   against a golden snapshot are skipped: grading never runs them.
+"""
+
+import time
+from typing import Any, Dict
+
+from backend.governor import query_bulkheads
+from backend.db_router import db_router
+from backend.runner import warm_solution
+from backend.schema_loader import inspect_schema
+
+from . import snapshots
+from .connections import build_conn_str
+from .models import Assessment
+
+
+def _ms(started: float) -> float:
+    return round((time.monotonic() - started) * 1000, 1)
+
+
+def prewarm(assessment: Assessment) -> Dict[str, Any]:
+    """Warms ``assessment``'s DatabaseConfig. Returns the per-step report."""
+    started = time.monotonic()
+    config = assessment.db_config
+    conn_str = build_conn_str(config)
+    questions = list(assessment.questions.all().order_by('assessmentquestion__sort_order'))
+    report: Dict[str, Any] = {'assessment_id': assessment.id, 'db_config_id': config.id}
+
+    step = time.monotonic()
+    budget = config.max_concurrent_queries or query_bulkheads.default_size
+    targets = db_router.warm(conn_str, budget)
+    report['connections'] = {'ms': _ms(step), 'pool_size': budget, 'targets': targets}
+
+    step = time.monotonic()
+    full = inspect_schema(conn_str=conn_str, schema_filter=config.schema_filter or '')
+    report['schema'] = {'ms': _ms(step), 'tables': len(full.get('tables', [])), 'error': full.get('error')}
+
+    step = time.monotonic()
+    solutions = {}
+    for question in questions:
+        q_started = time.monotonic()
+        if snapshots.load_expected(question, config) is not None:
+            solutions[question.id] = {'status': 'snapshot', 'ms': 0.0, 'error': None}
+            continue
+        cache_status, err = warm_solution(
+            str(question.id), question.solution_query, conn_str=conn_str, grading_mode=question.grading_mode,
+        )
+        solutions[question.id] = {'status': cache_status, 'ms': _ms(q_started), 'error': err}
+    report['solutions'] = {'ms': _ms(step), 'questions': solutions}
+
+    report['total_ms'] = _ms(started)
+    report['ok'] = (
+        not any(t['error'] for t in targets.values())
+        and report['schema']['error'] is None
+        and not any(s['error'] for s in solutions.values())
+    )
+    return report
@@ -1,7 +1,7 @@
 
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import DatabaseConfig, Question, Assessment, Assignment, Attempt, AttemptAnswer
+from .models import DatabaseConfig, Question, SolutionSnapshot, Assessment, Assignment, Attempt, AttemptAnswer
 from backend.crypto import encrypt_field
 
 
@@ -23,6 +23,11 @@ class DatabaseConfigSerializer(serializers.ModelSerializer):
             validated_data['password_secret_ref'] = encrypt_field(raw)
         return validated_data
 
+    def validate_read_replicas(self, value):
+        if not isinstance(value, list) or not all(isinstance(h, str) and h.strip() for h in value):
+            raise serializers.ValidationError("Must be a list of replica host names.")
+        return [h.strip() for h in value]
+
     def create(self, validated_data):
         return super().create(self._encrypt_password(validated_data))
 
@@ -45,6 +50,17 @@ class QuestionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class SolutionSnapshotSerializer(serializers.ModelSerializer):
+    has_rows = serializers.SerializerMethodField()
+
+    def get_has_rows(self, obj):
+        return obj.rows_blob is not None
+
+    class Meta:
+        model = SolutionSnapshot
+        exclude = ['rows_blob']
+
+
 class AssessmentSerializer(serializers.ModelSerializer):
     questions_count = serializers.IntegerField(source='questions.count', read_only=True)
     db_config_detail = DatabaseConfigSerializer(source='db_config', read_only=True)
@@ -0,0 +1,178 @@
+"""
+api/snapshots.py — golden-result snapshots of solution queries.
+
+Validating a question against a DatabaseConfig captures what its solution
+returns there (SolutionSnapshot): columns, column signature, row count, an
+order-independent digest and — for row grading — the compressed rows, or
+for checksum grading the server-side checksum aggregates.  Grading then
+compares participants against the snapshot and never runs the solution.
+
+A snapshot is only used while it matches the question as it is now (same
+solution SQL and grading mode) and has not been flagged by the drift check,
+which re-runs the solution against the live data and compares digests.
+"""
+
+import hashlib
+import json
+import logging
+import zlib
+from typing import Optional, Tuple, Union
+
+from django.utils import timezone
+
+from backend import sql_eval
+from backend.runner import checksum_query, execute_query
+
+from .models import DatabaseConfig, Question, SolutionSnapshot
+
+logger = logging.getLogger(__name__)
+
+_SNAPSHOT_USER = "system_snapshot"
+
+
+def solution_hash(solution_query: str) -> str:
+    return hashlib.sha256(solution_query.strip().encode()).hexdigest()
+
+
+def _pack_rows(rows) -> Optional[bytes]:
+    try:
+        return zlib.compress(json.dumps(rows, separators=(',', ':'), allow_nan=False).encode())
+    except (TypeError, ValueError):
+        return None  # bytes, times, NaN … — grading falls back to running the solution
+
+
+def _unpack_rows(blob) -> list:
+    return [tuple(r) for r in json.loads(zlib.decompress(bytes(blob)))]
+
+
+def _row_signature(res: sql_eval.ResultSet) -> list:
+    """[[column, type name of its first non-NULL normalised value], ...] for a row result."""
+    return [
+        [col, next((type(v).__name__ for v in values if v is not None), '')]
+        for col, values in zip(res.columns, res.column_major())
+    ]
+
+
+def _run_solution(question: Question, conn_str: str):
+    """
+    Runs the solution the way grading would for the question's mode.
+    Returns ``(fields, error)`` where fields are the SolutionSnapshot values
+    that describe the result.
+    """
+    if question.grading_mode == 'CHECKSUM':
+        res, err, _ = checksum_query(question.solution_query, _SNAPSHOT_USER, conn_str=conn_str)
+        if err:
+            return None, err
+        return {
+            'columns': res.columns,
+            'column_signature': res.signature,
+            'row_count': res.row_count,
+            'digest': f"{res.checksum[0]}:{res.checksum[1]}",
+            'rows_blob': None,
+            'checksum': list(res.checksum),
+        }, None
+
+    res, err, _ = execute_query(question.solution_query, _SNAPSHOT_USER, conn_str=conn_str)
+    if err:
+        return None, err
+    return {
+        'columns': res.columns,
+        'column_signature': _row_signature(res),
+        'row_count': len(res.rows),
+        'digest': sql_eval.multiset_digest(res.rows),
+        'rows_blob': _pack_rows(res.rows),
+        'checksum': None,
+    }, None
+
+
+def capture(question: Question, db_config: DatabaseConfig, conn_str: str) -> Tuple[Optional[SolutionSnapshot], Optional[str]]:
+    """
+    Runs the solution and stores (or replaces) its snapshot for ``db_config``,
+    marking the question validated.  Returns ``(snapshot, error)``.
+    """
+    fields, err = _run_solution(question, conn_str)
+    if err:
+        return None, err
+
+    now = timezone.now()
+    snapshot, _ = SolutionSnapshot.objects.update_or_create(
+        question=question,
+        db_config=db_config,
+        defaults={
+            **fields,
+            'grading_mode': question.grading_mode,
+            'solution_sql_hash': solution_hash(question.solution_query),
+            'captured_at': now,
+            'verified_at': now,
+            'is_drifted': False,
+            'drift_detail': '',
+        },
+    )
+    if not question.is_validated:
+        question.is_validated = True
+        question.save(update_fields=['is_validated'])
+    return snapshot, None
+
+
+def load_expected(
+    question: Question,
+    db_config: Optional[DatabaseConfig],
+) -> Optional[Union[sql_eval.ResultSet, sql_eval.ResultChecksum]]:
+    """
+    The golden result to grade against, or None when there is no usable
+    snapshot (none captured, solution edited, grading mode changed, drifted,
+    or rows not stored).
+    """
+    if db_config is None:
+        return None
+    snapshot = SolutionSnapshot.objects.filter(
+        question=question,
+        db_config=db_config,
+        grading_mode=question.grading_mode,
+        solution_sql_hash=solution_hash(question.solution_query),
+        is_drifted=False,
+    ).first()
+    if snapshot is None:
+        return None
+
+    if snapshot.grading_mode == 'CHECKSUM':
+        return sql_eval.ResultChecksum(
+            snapshot.columns, snapshot.column_signature, snapshot.row_count, tuple(snapshot.checksum or ()),
+        )
+    if snapshot.rows_blob is None:
+        return None
+    try:
+        return sql_eval.ResultSet(snapshot.columns, _unpack_rows(snapshot.rows_blob))
+    except (zlib.error, ValueError) as e:
+        logger.error(f"Unreadable rows in snapshot {snapshot.id}: {e}")
+        return None
+
+
+def check_drift(snapshot: SolutionSnapshot, conn_str: str) -> Tuple[bool, Optional[str]]:
+    """
+    Re-runs the snapshot's solution against the live data and flags the
+    snapshot when columns, row count or digest differ.  Returns
+    ``(drifted, error)``; on error the snapshot is left unchanged.
+    """
+    question = snapshot.question
+    if snapshot.solution_sql_hash != solution_hash(question.solution_query) \
+            or snapshot.grading_mode != question.grading_mode:
+        drifted, detail = True, "Solution query or grading mode changed since capture."
+    else:
+        fields, err = _run_solution(question, conn_str)
+        if err:
+            return False, err
+        if fields['columns'] != snapshot.columns:
+            drifted, detail = True, f"Columns changed: {', '.join(fields['columns'])}"
+        elif fields['row_count'] != snapshot.row_count:
+            drifted, detail = True, f"Row count changed: {snapshot.row_count} -> {fields['row_count']}"
+        elif fields['digest'] != snapshot.digest:
+            drifted, detail = True, "Row values changed (digest mismatch)."
+        else:
+            drifted, detail = False, ''
+
+    snapshot.is_drifted = drifted
+    snapshot.drift_detail = detail[:255]
+    snapshot.verified_at = timezone.now()
+    snapshot.save(update_fields=['is_drifted', 'drift_detail', 'verified_at'])
+    return drifted, None
@@ -0,0 +1,438 @@
+"""
+Query admission tests (backend/governor.py).
+
+1. QuerySlots: multi-slot acquisition is atomic (all or nothing).
+2. QuerySlots: slots are shared through the cache and held as renewable leases.
+3. Bulkheads: per-target budgets with a shared overflow pool.
+4. Scheduling: priority classes, per-user round robin, aging.
+5. Rate limiting: per-kind token buckets (LocMemCache path).
+6. Adaptive concurrency: AIMD limit between the floor and the static ceiling.
+7. Load shedding: queue-depth wait estimates, 503 + Retry-After from the API.
+8. Read replicas: a DatabaseConfig's replicas are routed to, with a budget per host.
+
+Run with:  python manage.py test api.tests.test_governor
+"""
+
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from api.connections import build_conn_str
+from api.models import DatabaseConfig
+from backend import governor, runner
+from backend.db_router import db_router
+from backend.governor import (
+    PRIORITY_PREVIEW, PRIORITY_SUBMIT, PRIORITY_VALIDATE, RATE_LIMITS, AdaptiveLimit, Bulkhead, QueueEstimate, Bulkheads, PriorityExecutor, QuerySlots,
+    check_rate_limit, query_bulkheads,
+)
+from backend.sql_eval import ResultSet, StreamingComparator
+
+
+
+class QuerySlotsTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_pair_acquire_is_all_or_nothing(self):
+        slots = QuerySlots(3)
+        self.assertTrue(slots.acquire(timeout=0, units=2))
+        # Only one slot left — a second pair must not take it half-way.
+        self.assertFalse(slots.acquire(timeout=0.01, units=2))
+        self.assertEqual(slots.in_use, 2)
+        self.assertTrue(slots.acquire(timeout=0))
+
+    def test_pair_larger_than_pool_is_rejected(self):
+        self.assertFalse(QuerySlots(1).acquire(timeout=0, units=2))
+
+    def test_waiting_pair_admitted_once_both_slots_free(self):
+        slots = QuerySlots(2)
+        slots.acquire(units=2)
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(slots.acquire(timeout=2, units=2)))
+        waiter.start()
+        slots.release()
+        slots.release()
+        waiter.join()
+        self.assertEqual(admitted, [True])
+        self.assertEqual(slots.in_use, 2)
+
+
+class QuerySlotLeaseTest(SimpleTestCase):
+    """Two QuerySlots with the same name stand in for two worker processes."""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_slots_are_shared_between_workers(self):
+        worker_a, worker_b = QuerySlots(2, name="shared"), QuerySlots(2, name="shared")
+        self.assertTrue(worker_a.acquire(timeout=0, units=2))
+        self.assertFalse(worker_b.acquire(timeout=0.05))
+        self.assertEqual(worker_b.occupancy(), {'size': 2, 'in_use': 2, 'held_here': 0})
+        worker_a.release(units=2)
+        self.assertTrue(worker_b.acquire(timeout=0))
+
+    def test_crashed_worker_slot_expires(self):
+        crashed = QuerySlots(1, name="lease", lease_seconds=1)
+        self.assertTrue(crashed.acquire(timeout=0))
+        crashed._held.clear()  # the process died: nothing renews or releases the lease
+        survivor = QuerySlots(1, name="lease", lease_seconds=1)
+        self.assertFalse(survivor.acquire(timeout=0))
+        self.assertTrue(survivor.acquire(timeout=3))
+
+    def test_held_slot_is_renewed(self):
+        holder = QuerySlots(1, name="renew", lease_seconds=1)
+        self.assertTrue(holder.acquire(timeout=0))
+        time.sleep(1.5)
+        self.assertFalse(QuerySlots(1, name="renew", lease_seconds=1).acquire(timeout=0))
+        holder.release()
+        self.assertEqual(holder.in_use, 0)
+
+
+class BulkheadsTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.bulkheads = Bulkheads(default_size=2, overflow_size=1)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_busy_target_does_not_block_others(self):
+        slow = self.bulkheads.for_target("DSN=slow")
+        self.assertTrue(slow.acquire(timeout=0, units=2))
+        self.assertTrue(slow.acquire(timeout=0))           # borrowed from overflow
+        self.assertFalse(slow.acquire(timeout=0.05))       # own budget and overflow both full
+        self.assertTrue(self.bulkheads.for_target("DSN=other").acquire(timeout=0, units=2))
+
+    def test_release_returns_borrowed_slots_first(self):
+        target = self.bulkheads.for_target("DSN=a")
+        target.acquire(timeout=0, units=2)
+        target.acquire(timeout=0)
+        self.assertEqual(target.occupancy()['borrowed'], 1)
+        target.release()
+        self.assertEqual(self.bulkheads.overflow.in_use, 0)
+        self.assertEqual(target.own.in_use, 2)
+
+    def test_configured_size(self):
+        self.bulkheads.configure("DSN=small", 1)
+        small = self.bulkheads.for_target("DSN=small")
+        self.assertEqual(small.size, 1)
+        self.bulkheads.configure("DSN=small", None)
+        self.assertEqual(small.size, 2)
+
+    def test_pair_evaluation_is_sequential_when_two_slots_can_never_be_granted(self):
+        self.bulkheads.configure("DSN=small", 1)   # own budget 1, overflow 1: no pair fits either pool
+        self.assertEqual(self.bulkheads.for_target("DSN=small").capacity(), 1)
+        solution = ResultSet(['id'], [(1,)])
+        comparator = StreamingComparator(solution)
+        comparator.feed([(1,)])
+        with mock.patch.object(runner, 'query_bulkheads', self.bulkheads), \
+                mock.patch.object(runner, '_solution_result', return_value=((solution, None), 'miss')), \
+                mock.patch.object(runner, 'compare_query', return_value=((['id'], comparator), None, 1.0)), \
+                mock.patch.object(runner, 'execute_query') as execute:
+            result = runner.evaluate_submission(
+                'p1', '1', 'SELECT id FROM t', 'SELECT id FROM t', conn_str="DSN=small",
+                concurrent=True, check_rate=False,
+            )
+        self.assertEqual(result['status'], 'CORRECT')
+        execute.assert_not_called()
+
+    def test_pair_evaluation_runs_the_solution_on_its_own_thread(self):
+        solution = ResultSet(['id'], [(1,)])
+        threads = []
+
+        def solution_result(*args):
+            threads.append(threading.current_thread().name)
+            return (solution, None), 'miss'
+
+        with mock.patch.object(runner, 'query_bulkheads', self.bulkheads), \
+                mock.patch.object(runner, '_solution_result', side_effect=solution_result), \
+                mock.patch.object(runner, 'execute_query', return_value=(ResultSet(['id'], [(1,)]), None, 1.0)):
+            result = runner.evaluate_submission(
+                'p1', '1', 'SELECT id FROM t', 'SELECT id FROM t', conn_str="DSN=pair",
+                concurrent=True, check_rate=False,
+            )
+        self.assertEqual(result['status'], 'CORRECT')
+        self.assertEqual(threads, ['qb-eval'])
+
+
+class SchedulingTest(SimpleTestCase):
+    """One slot, held while waiters queue; each release admits exactly one waiter."""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def _admission_order(self, bulkhead, waiters):
+        order = []
+        lock = threading.Lock()
+
+        def _wait(label, priority, user_id):
+            if bulkhead.acquire(timeout=5, priority=priority, user_id=user_id):
+                with lock:
+                    order.append(label)
+
+        threads = []
+        for label, priority, user_id in waiters:
+            t = threading.Thread(target=_wait, args=(label, priority, user_id))
+            t.start()
+            threads.append(t)
+            time.sleep(0.02)  # enqueue in a known order
+        for _ in waiters:
+            bulkhead.release()
+            time.sleep(0.05)
+        for t in threads:
+            t.join()
+        return order
+
+    def _busy_bulkhead(self, name, aging_seconds=60):
+        bulkhead = Bulkhead(name, 1, QuerySlots(0, name=f"{name}-overflow"), aging_seconds=aging_seconds)
+        self.assertTrue(bulkhead.acquire(timeout=0))
+        return bulkhead
+
+    def test_higher_priority_admitted_first(self):
+        bulkhead = self._busy_bulkhead("prio")
+        order = self._admission_order(bulkhead, [
+            ("preview", PRIORITY_PREVIEW, "u1"),
+            ("validate", PRIORITY_VALIDATE, "u2"),
+            ("submit", PRIORITY_SUBMIT, "u3"),
+        ])
+        self.assertEqual(order, ["submit", "validate", "preview"])
+
+    def test_users_take_turns_within_a_class(self):
+        bulkhead = self._busy_bulkhead("fair")
+        order = self._admission_order(bulkhead, [
+            ("spam1", PRIORITY_PREVIEW, "spammer"),
+            ("spam2", PRIORITY_PREVIEW, "spammer"),
+            ("spam3", PRIORITY_PREVIEW, "spammer"),
+            ("other", PRIORITY_PREVIEW, "other"),
+        ])
+        self.assertEqual(order[:2], ["spam1", "other"])
+
+    def test_waiting_lower_class_is_promoted(self):
+        bulkhead = self._busy_bulkhead("aging", aging_seconds=0.1)
+        order = []
+
+        def _wait(label, priority, user_id):
+            if bulkhead.acquire(timeout=5, priority=priority, user_id=user_id):
+                order.append(label)
+
+        preview = threading.Thread(target=_wait, args=("preview", PRIORITY_PREVIEW, "u1"))
+        preview.start()
+        time.sleep(0.5)  # the preview has now waited long enough to outrank a fresh submit
+        submit = threading.Thread(target=_wait, args=("submit", PRIORITY_SUBMIT, "u2"))
+        submit.start()
+        time.sleep(0.05)
+        bulkhead.release()
+        preview.join()
+        bulkhead.release()
+        submit.join()
+        self.assertEqual(order, ["preview", "submit"])
+
+    def test_occupancy_reports_queued_classes(self):
+        bulkhead = self._busy_bulkhead("occ")
+        t = threading.Thread(target=lambda: bulkhead.acquire(timeout=0.3, priority=PRIORITY_PREVIEW, user_id="u"))
+        t.start()
+        time.sleep(0.05)
+        self.assertEqual(bulkhead.occupancy()['waiting'], {'preview': 1})
+        t.join()
+        self.assertEqual(bulkhead.occupancy()['waiting'], {})
+
+
+class PriorityExecutorTest(SimpleTestCase):
+
+    def test_lower_priority_value_runs_first(self):
+        executor = PriorityExecutor(max_workers=1, name="test-jobs")
+        gate, ran, done = threading.Event(), [], threading.Event()
+        executor.submit(gate.wait)   # occupies the only worker
+        executor.submit(lambda: ran.append("preview"), priority=PRIORITY_PREVIEW)
+        executor.submit(lambda: ran.append("validate"), priority=PRIORITY_VALIDATE)
+        executor.submit(done.set, priority=PRIORITY_PREVIEW)
+        gate.set()
+        done.wait(2)
+        self.assertEqual(ran, ["validate", "preview"])
+
+
+@mock.patch.dict(RATE_LIMITS, {'preview': 6, 'submit': 2})
+class RateLimitTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_burst_then_retry_after(self):
+        with mock.patch('backend.governor.time.time', return_value=1000.0):
+            results = [check_rate_limit('u1', 'submit') for _ in range(3)]
+        self.assertEqual([bool(r) for r in results], [True, True, False])
+        self.assertEqual(results[1].remaining, 0)
+        self.assertAlmostEqual(results[2].retry_after, 30.0)  # 2/min refills one token every 30 s
+
+    def test_tokens_refill_gradually(self):
+        with mock.patch('backend.governor.time.time', return_value=1000.0):
+            check_rate_limit('u1', 'submit')
+            check_rate_limit('u1', 'submit')
+        with mock.patch('backend.governor.time.time', return_value=1015.0):
+            limit = check_rate_limit('u1', 'submit')
+        self.assertFalse(limit)
+        self.assertAlmostEqual(limit.retry_after, 15.0)
+        with mock.patch('backend.governor.time.time', return_value=1030.0):
+            self.assertTrue(check_rate_limit('u1', 'submit'))
+
+    def test_kinds_and_users_are_independent(self):
+        with mock.patch('backend.governor.time.time', return_value=1000.0):
+            check_rate_limit('u1', 'submit')
+            check_rate_limit('u1', 'submit')
+            self.assertFalse(check_rate_limit('u1', 'submit'))
+            self.assertEqual(check_rate_limit('u1', 'preview').remaining, 5)
+            self.assertTrue(check_rate_limit('u2', 'submit'))
+
+    def test_zero_limit_turns_rate_limiting_off(self):
+        with mock.patch.dict(RATE_LIMITS, submit=0):
+            results = [check_rate_limit('u1', 'submit') for _ in range(5)]
+        self.assertTrue(all(results))
+
+    def test_redis_backend_without_client_access_limits_locally(self):
+        backend = RedisCache('redis://localhost:6379/0', {})
+        backend._cache = object()   # no get_client
+        with mock.patch.object(governor, 'caches', {'default': backend}), \
+                mock.patch('backend.governor.time.time', return_value=1000.0):
+            results = [check_rate_limit('u1', 'submit') for _ in range(3)]
+        self.assertEqual([bool(r) for r in results], [True, True, False])
+
+
+@mock.patch('backend.governor.ADAPTIVE_WINDOW_SAMPLES', 4)
+@mock.patch('backend.governor.ADAPTIVE_MIN_LIMIT', 2)
+class AdaptiveLimitTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def _window(self, limiter, duration_ms, timed_out=False):
+        for _ in range(4):
+            limiter.record(duration_ms, timed_out)
+
+    def test_starts_at_ceiling_and_grows_back_after_a_cut(self):
+        limiter = AdaptiveLimit("grow", ceiling=6)
+        self.assertEqual(limiter.current(), 6)
+        self._window(limiter, 100)       # baseline 100 ms; already at the ceiling
+        self._window(limiter, 400)
+        self.assertEqual(limiter.current(), 5)
+        for _ in range(3):
+            self._window(limiter, 100)
+        self.assertEqual(limiter.current(), 6)
+        self.assertEqual([h['limit'] for h in limiter.snapshot()['history']], [5, 6])
+
+    def test_latency_rise_and_timeouts_cut_the_limit(self):
+        limiter = AdaptiveLimit("cut", ceiling=20)
+        self._window(limiter, 100)       # baseline 100 ms, limit stays 20
+        self._window(limiter, 400)
+        self.assertEqual(limiter.current(), 18)
+        self._window(limiter, 100, timed_out=True)
+        self.assertEqual(limiter.current(), 9)
+        self.assertEqual(limiter.snapshot()['history'][-1]['reason'], 'timeouts')
+
+    def test_limit_is_shared_between_workers(self):
+        worker_a, worker_b = AdaptiveLimit("shared", ceiling=10), AdaptiveLimit("shared", ceiling=10)
+        self._window(worker_a, 100)
+        self._window(worker_a, 400)
+        worker_b._refreshed = 0.0
+        self.assertEqual(worker_b.current(), 9)
+
+
+@mock.patch('backend.governor.QUERY_WAIT_BUDGET_SECONDS', 1)
+class LoadSheddingTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.bulkhead = Bulkhead("shed", 1, QuerySlots(0, name="shed-overflow"))
+        self.bulkhead.record(1000)                 # average query takes 1 s
+        self.assertTrue(self.bulkhead.acquire(timeout=0))
+        self.waiters = []
+
+    def tearDown(self):
+        for t in self.waiters:
+            t.join()
+        cache.clear()
+
+    def _queue(self, priority):
+        t = threading.Thread(target=self.bulkhead.acquire, kwargs={'timeout': 0.3, 'priority': priority})
+        t.start()
+        self.waiters.append(t)
+        time.sleep(0.05)
+
+    def test_estimate_counts_same_and_higher_classes(self):
+        self.assertEqual(self.bulkhead.estimate(PRIORITY_PREVIEW).position, 0)
+        self._queue(PRIORITY_PREVIEW)
+        self._queue(PRIORITY_SUBMIT)
+        preview = self.bulkhead.estimate(PRIORITY_PREVIEW)
+        self.assertEqual((preview.position, preview.wait_seconds), (3, 3.0))
+        self.assertTrue(preview.overloaded)
+        submit = self.bulkhead.estimate(PRIORITY_SUBMIT)
+        self.assertEqual(submit.position, 2)
+
+    def test_acquire_fails_fast_when_the_wait_exceeds_the_timeout(self):
+        self._queue(PRIORITY_VALIDATE)
+        started = time.monotonic()
+        self.assertFalse(self.bulkhead.acquire(timeout=1, priority=PRIORITY_VALIDATE))
+        self.assertLess(time.monotonic() - started, 0.2)
+
+
+class LoadSheddingViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('p1', password='x'))
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_overloaded_target_returns_503_with_retry_after(self):
+        with mock.patch.object(Bulkhead, 'estimate', return_value=QueueEstimate(7, 12.4)), \
+                mock.patch('backend.governor.QUERY_WAIT_BUDGET_SECONDS', 3):
+            response = self.client.post('/api/v1/attempts/run_query/', {'query': 'SELECT 1'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '13')
+        self.assertEqual(response.data['queue_position'], 7)
+
+
+class ReadReplicaConfigTest(TestCase):
+
+    def test_replicas_are_registered_with_the_router_and_add_budget(self):
+        config = DatabaseConfig.objects.create(
+            config_name='exam', host='db-main', port=1444, database_name='exam', provider='SQL_SERVER',
+            trusted_connection=True, max_concurrent_queries=4, read_replicas=['db-r1', 'db-r2,1500'],
+        )
+        conn_str = build_conn_str(config)
+        self.addCleanup(db_router.set_replicas, conn_str, [])
+        replicas = db_router._replicas_for(conn_str)
+        self.assertEqual(len(replicas), 2)
+        self.assertIn('Server=db-r1,1444;Database=exam;', replicas[0])
+        self.assertIn('Server=db-r2,1500;Database=exam;', replicas[1])
+        self.assertEqual(query_bulkheads.for_target(conn_str).size, 12)
+        pool_size = 12 + query_bulkheads.overflow.size   # every grantable slot fits in each host's pool
+        self.assertEqual([db_router.get_pool(c).max_size for c in [conn_str, *replicas]], [pool_size] * 3)
+
+        config.read_replicas = []
+        config.save()
+        self.assertEqual(db_router._replicas_for(build_conn_str(config)), [])
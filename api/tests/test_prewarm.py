@@ -0,0 +1,102 @@
+"""
+Assessment pre-warm tests (api/prewarm.py).
+
+1. Every step runs and reports its timing; solutions land in the solution cache.
+2. Questions graded against a golden snapshot are not run.
+3. The staff endpoint and the management command.
+
+Run with:  python manage.py test api.tests.test_prewarm
+"""
+
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api import prewarm, snapshots
+from api.models import Assessment, AssessmentQuestion, DatabaseConfig, Question
+from backend.sql_eval import ResultSet
+
+
+SOLUTION_ROWS = ResultSet(['id'], [(1,), (2,)])
+SCHEMA = {'tables': [{'name': 't', 'qualifiedName': 'dbo.t', 'columns': []}]}
+
+
+class PrewarmTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.config = DatabaseConfig.objects.create(
+            config_name='cfg', host='h', database_name='db', provider='SQL_SERVER', max_concurrent_queries=3,
+        )
+        self.assessment = Assessment.objects.create(name='exam', db_config=self.config)
+        self.questions = []
+        for i in range(2):
+            q = Question.objects.create(
+                title=f'q{i}', prompt='p', difficulty='EASY', solution_query=f'SELECT id FROM t WHERE {i} = {i}',
+            )
+            AssessmentQuestion.objects.create(assessment=self.assessment, question=q, sort_order=i)
+            self.questions.append(q)
+        patches = [
+            mock.patch.object(prewarm.db_router, 'warm', return_value={'fp': {'target': 'h/db', 'idle': 3, 'ms': 1.0, 'error': None}}),
+            mock.patch.object(prewarm, 'inspect_schema', return_value=SCHEMA),
+            mock.patch('backend.runner.execute_query', return_value=(SOLUTION_ROWS, None, 1)),
+        ]
+        self.warm, self.inspect, self.execute = [p.start() for p in patches]
+        for p in patches:
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_runs_every_step_and_caches_solutions(self):
+        report = prewarm.prewarm(self.assessment)
+        self.assertTrue(report['ok'])
+        self.assertEqual(report['connections']['pool_size'], 3)
+        self.assertEqual(self.warm.call_args.args[1], 3)
+        self.assertEqual(report['schema']['tables'], 1)
+        self.inspect.assert_called_once()  # the full schema only; filtered views need no warming
+        statuses = {qid: s['status'] for qid, s in report['solutions']['questions'].items()}
+        self.assertEqual(statuses, {q.id: 'miss' for q in self.questions})
+        for key in ('connections', 'schema', 'solutions'):
+            self.assertIn('ms', report[key])
+
+        again = prewarm.prewarm(self.assessment)
+        self.assertEqual({s['status'] for s in again['solutions']['questions'].values()}, {'hit'})
+        self.assertEqual(self.execute.call_count, len(self.questions))
+
+    def test_snapshot_questions_are_skipped(self):
+        with mock.patch.object(snapshots, 'execute_query', return_value=(SOLUTION_ROWS, None, 1)):
+            snapshots.capture(self.questions[0], self.config, 'conn')
+        report = prewarm.prewarm(self.assessment)
+        self.assertEqual(report['solutions']['questions'][self.questions[0].id]['status'], 'snapshot')
+        self.assertEqual(self.execute.call_count, 1)
+
+    def test_solution_error_is_reported(self):
+        self.execute.return_value = (None, 'Database Error: boom', 1)
+        report = prewarm.prewarm(self.assessment)
+        self.assertFalse(report['ok'])
+        self.assertEqual(report['solutions']['questions'][self.questions[0].id]['error'], 'Database Error: boom')
+
+    def test_endpoint_is_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('p1', password='x'))
+        url = f'/api/v1/assessments/{self.assessment.id}/prewarm/'
+        self.assertEqual(client.post(url).status_code, 403)
+
+        client.force_authenticate(User.objects.create_user('admin', password='x', is_staff=True))
+        response = client.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assessment_id'], self.assessment.id)
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('prewarm_assessment', str(self.assessment.id), stdout=out)
+        output = out.getvalue()
+        self.assertIn('Connections', output)
+        self.assertIn(f'question {self.questions[0].id}: miss', output)
+        self.assertIn('Pre-warmed assessment', output)
@@ -0,0 +1,362 @@
+"""
+Async query job status tests (api/views.py).
+
+1. Long poll: ?wait= returns as soon as the job finishes, in this process or another.
+2. Long poll: the response comes back pending once the wait runs out.
+3. Batch lookup: many job ids resolved in one request, unknown ids listed as missing.
+4. Durable queue (api/job_queue.py): claim/run/delete, lease expiry and renewal,
+   retries (not for non-retryable kinds), bound.
+5. Cancellation: cancel endpoint, supersession, abandoned jobs, cursor.cancel() on the server.
+6. Coalescing: identical previews share one execution and all receive its result.
+
+Run with:  python manage.py test api.tests.test_query_jobs
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+import pyodbc
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import job_queue, views
+from api.models import QueryJob
+from backend import cancellation, runner
+from backend.governor import query_bulkheads
+
+
+_release = threading.Event()
+
+
+@job_queue.handler('test_wait')
+def _wait_job(payload):
+    _release.wait(5)
+    return {'rows': [[payload['n']]]}
+
+
+@job_queue.handler('test_fail')
+def _failing_job(payload):
+    raise RuntimeError('database unreachable')
+
+
+@job_queue.handler('test_side_effect', retry=False)
+def _side_effect_job(payload):
+    raise RuntimeError('database unreachable')
+
+
+def _state(job_id):
+    return cache.get(job_queue.JOB_KEY.format(job_id))
+
+
+class QueryJobStatusTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('p1', password='x'))
+
+    def tearDown(self):
+        cache.clear()
+
+    def _status(self, job_id, wait=0):
+        return self.client.get('/api/v1/attempts/run_query_status/', {'job_id': job_id, 'wait': wait})
+
+    def test_long_poll_returns_when_job_finishes(self):
+        _release.clear()
+        job_id = job_queue.enqueue('test_wait', {'n': 1})
+        threading.Timer(0.2, _release.set).start()
+
+        started = time.monotonic()
+        response = self._status(job_id, wait=10)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['result'], {'rows': [[1]]})
+
+    def test_long_poll_sees_job_finished_by_another_worker(self):
+        cache.set(job_queue.JOB_KEY.format('other'), {'status': 'running'})
+        threading.Timer(0.2, cache.set, args=(job_queue.JOB_KEY.format('other'), {'status': 'failed', 'error': 'boom'})).start()
+
+        response = self._status('other', wait=10)
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertEqual(response.data['error'], 'boom')
+
+    def test_long_poll_times_out_pending(self):
+        cache.set(job_queue.JOB_KEY.format('slow'), {'status': 'queued', 'queue_position': 3})
+        started = time.monotonic()
+        response = self._status('slow', wait=0.3)
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertEqual(response.data, {'job_id': 'slow', 'status': 'queued', 'queue_position': 3})
+
+    def test_unknown_job_is_404(self):
+        self.assertEqual(self._status('nope', wait=5).status_code, 404)
+
+    def test_batch_status(self):
+        cache.set(job_queue.JOB_KEY.format('a'), {'status': 'completed', 'result': {'status': 'CORRECT'}})
+        cache.set(job_queue.JOB_KEY.format('b'), {'status': 'running'})
+        response = self.client.get('/api/v1/attempts/job_status/', {'job_ids': 'a,b,c,a'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['jobs']['a']['result'], {'status': 'CORRECT'})
+        self.assertEqual(response.data['jobs']['b']['status'], 'running')
+        self.assertEqual(response.data['missing'], ['c'])
+
+    def test_batch_status_limits(self):
+        self.assertEqual(self.client.get('/api/v1/attempts/job_status/').status_code, 400)
+        ids = ','.join(str(i) for i in range(views.MAX_JOB_STATUS_IDS + 1))
+        self.assertEqual(self.client.get('/api/v1/attempts/job_status/', {'job_ids': ids}).status_code, 400)
+
+
+@mock.patch.object(job_queue, 'QUERY_WORKERS', True)
+class DurableQueueTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        _release.set()
+
+    def tearDown(self):
+        cache.clear()
+
+    def _expire_lease(self, job):
+        QueryJob.objects.filter(pk=job.pk).update(leased_until=timezone.now() - timedelta(seconds=1))
+
+    def test_worker_runs_and_deletes_job(self):
+        job_id = job_queue.enqueue('test_wait', {'n': 7})
+        self.assertEqual(_state(job_id)['status'], 'queued')
+        self.assertEqual(job_queue.waiting(), 1)
+
+        job = job_queue.claim('w1')
+        self.assertEqual((job.job_id, job.attempts), (job_id, 1))
+        self.assertIsNone(job_queue.claim('w2'))  # leased
+
+        job_queue.run_claimed(job)
+        self.assertEqual(_state(job_id), {'status': 'completed', 'result': {'rows': [[7]]}})
+        self.assertFalse(QueryJob.objects.exists())
+
+    def test_claims_by_priority_then_age(self):
+        low = job_queue.enqueue('test_wait', {'n': 1}, priority=2)
+        high = job_queue.enqueue('test_wait', {'n': 2}, priority=0)
+        self.assertEqual(job_queue.claim('w').job_id, high)
+        self.assertEqual(job_queue.claim('w').job_id, low)
+
+    def test_expired_lease_is_reclaimed_and_fences_old_worker(self):
+        job_queue.enqueue('test_wait', {'n': 1})
+        stale = job_queue.claim('w1')
+        self._expire_lease(stale)
+
+        fresh = job_queue.claim('w2')
+        self.assertEqual((fresh.worker, fresh.attempts), ('w2', 2))
+        with mock.patch.object(job_queue, '_handlers', {'test_wait': _failing_job}):
+            job_queue.run_claimed(stale)  # no longer owns the row: must not requeue it
+        self.assertEqual(QueryJob.objects.get().attempts, 2)
+        self.assertEqual(QueryJob.objects.get().worker, 'w2')
+
+    def test_abandoned_job_fails_after_max_attempts(self):
+        job_id = job_queue.enqueue('test_wait', {'n': 1})
+        with mock.patch.object(job_queue, 'QUERY_JOB_MAX_ATTEMPTS', 2):
+            for _ in range(2):
+                self._expire_lease(job_queue.claim('w'))
+            self.assertIsNone(job_queue.claim('w'))
+        self.assertEqual(_state(job_id)['status'], 'failed')
+        self.assertFalse(QueryJob.objects.exists())
+
+    def test_handler_error_retries_with_backoff_then_fails(self):
+        job_id = job_queue.enqueue('test_fail', {})
+        with mock.patch.object(job_queue, 'QUERY_JOB_MAX_ATTEMPTS', 2):
+            job_queue.run_claimed(job_queue.claim('w'))
+            row = QueryJob.objects.get()
+            self.assertEqual(row.status, 'queued')
+            self.assertIn('unreachable', row.last_error)
+            self.assertIsNone(job_queue.claim('w'))  # backing off
+
+            QueryJob.objects.update(available_at=timezone.now())
+            job_queue.run_claimed(job_queue.claim('w'))
+        self.assertEqual(_state(job_id), {'status': 'failed', 'error': 'database unreachable'})
+        self.assertFalse(QueryJob.objects.exists())
+
+    def test_running_job_lease_is_renewed(self):
+        job_queue.enqueue('test_wait', {'n': 1})
+        job = job_queue.claim('w1')
+        self._expire_lease(job)
+        job_queue._renew_leases([(job.pk, job.attempts)])
+        self.assertGreater(QueryJob.objects.get().leased_until, timezone.now())
+        self.assertIsNone(job_queue.claim('w2'))
+
+        self._expire_lease(job)
+        job_queue._renew_leases([(job.pk, job.attempts - 1)])  # a claim that was taken over renews nothing
+        self.assertIsNotNone(job_queue.claim('w2'))
+
+    def test_non_retryable_job_fails_instead_of_running_again(self):
+        job_id = job_queue.enqueue('test_side_effect', {})
+        job_queue.run_claimed(job_queue.claim('w'))
+        self.assertEqual(_state(job_id), {'status': 'failed', 'error': 'database unreachable'})
+        self.assertFalse(QueryJob.objects.exists())
+
+        job_id = job_queue.enqueue('test_side_effect', {})
+        self._expire_lease(job_queue.claim('w1'))
+        self.assertIsNone(job_queue.claim('w2'))
+        self.assertEqual(_state(job_id)['status'], 'failed')
+
+    def test_queue_is_bounded(self):
+        with mock.patch.object(job_queue, 'QUERY_JOB_QUEUE_MAX', 1):
+            job_queue.enqueue('test_wait', {'n': 1})
+            with self.assertRaises(job_queue.QueueFull):
+                job_queue.enqueue('test_wait', {'n': 2})
+
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user('p1', password='x'))
+            with mock.patch('api.views.query_bulkheads') as bulkheads:
+                bulkheads.for_target.return_value.estimate.return_value.overloaded = False
+                response = client.post('/api/v1/attempts/run_query_async/', {'query': 'SELECT 1'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+
+class _BlockingCursor:
+    """Runs "forever" until cancelled, then fails the way pyodbc does (HY008)."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.started = threading.Event()
+
+    def execute(self, sql):
+        self.started.set()
+        self.cancelled.wait(10)
+        raise pyodbc.Error('HY008', 'Operation canceled')
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def close(self):
+        pass
+
+
+class CancellationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('p1', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cursor = _BlockingCursor()
+        connection = mock.Mock()
+        connection.cursor.return_value = self.cursor
+
+        @contextmanager
+        def _connection(conn_str=None):
+            yield connection
+
+        patcher = mock.patch.object(runner.db_router, 'connection', _connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        cache.clear()
+
+    def _start_preview(self, attempt_id=None, query='SELECT 1', client=None):
+        client = client or self.client
+        body = {'query': query, **({'attempt_id': attempt_id} if attempt_id else {})}
+        response = client.post('/api/v1/attempts/run_query_async/', body, format='json')
+        self.assertEqual(response.status_code, 202)
+        return response.data['job_id']
+
+    def _wait_status(self, job_id):
+        return self.client.get('/api/v1/attempts/run_query_status/', {'job_id': job_id, 'wait': 5}).data
+
+    def test_cancel_stops_running_statement(self):
+        job_id = self._start_preview()
+        self.assertTrue(self.cursor.started.wait(5))
+
+        response = self.client.post('/api/v1/attempts/cancel_job/', {'job_id': job_id}, format='json')
+        self.assertEqual(response.data, {'job_id': job_id, 'cancelled': True})
+        self.assertTrue(self.cursor.cancelled.is_set())
+        self.assertEqual(self._wait_status(job_id), {'job_id': job_id, 'status': 'cancelled', 'reason': 'cancelled'})
+
+    def test_cancel_requires_owner(self):
+        job_id = self._start_preview()
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('p2', password='x'))
+        response = other.post('/api/v1/attempts/cancel_job/', {'job_id': job_id}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(self.cursor.cancelled.is_set())
+        self.client.post('/api/v1/attempts/cancel_job/', {'job_id': job_id}, format='json')
+
+    def test_new_preview_supersedes_previous(self):
+        first = self._start_preview(attempt_id=5)
+        self.assertTrue(self.cursor.started.wait(5))
+        second = self._start_preview(attempt_id=5, query='SELECT 2')
+
+        self.assertEqual(self._wait_status(first)['reason'], 'superseded')
+        self.assertTrue(self.cursor.cancelled.is_set())
+        self.assertNotEqual(job_queue.read([second])[second]['status'], 'cancelled')
+
+    def test_abandoned_job_is_cancelled(self):
+        job_id = self._start_preview()
+        self.assertTrue(self.cursor.started.wait(5))
+        flight = _state(job_id)['follows']
+        cache.set(job_queue._CLIENT_KEY.format(flight), {'user_id': None, 'seen': time.time() - 3600})
+
+        self.assertTrue(self.cursor.cancelled.wait(5))
+        self.assertEqual(self._wait_status(job_id)['reason'], 'abandoned')
+
+    def test_identical_previews_share_one_execution(self):
+        users = [APIClient() for _ in range(3)]
+        for i, client in enumerate(users):
+            client.force_authenticate(User.objects.create_user(f'room{i}', password='x'))
+        job_ids = [self._start_preview(client=users[0], query='SELECT 1')]
+        self.assertTrue(self.cursor.started.wait(5))
+        job_ids += [
+            self._start_preview(client=users[1], query='select   1;'),
+            self._start_preview(client=users[2], query='SELECT 1'),
+        ]
+        flights = {_state(job_id)['follows'] for job_id in job_ids}
+        self.assertEqual(len(flights), 1)
+        self.assertEqual(self.client.post('/api/v1/attempts/cancel_job/', {'job_id': job_ids[0]}).status_code, 404)
+
+        # One subscriber leaving does not stop the shared execution ...
+        users[0].post('/api/v1/attempts/cancel_job/', {'job_id': job_ids[0]}, format='json')
+        time.sleep(0.6)
+        self.assertFalse(self.cursor.cancelled.is_set())
+        # ... every remaining subscriber receives its result.
+        self.cursor.cancel()   # let the statement end (as a database error)
+        results = [users[i].get('/api/v1/attempts/run_query_status/', {'job_id': job_ids[i], 'wait': 5}).data for i in (1, 2)]
+        self.assertEqual([r['status'] for r in results], ['completed', 'completed'])
+        self.assertEqual(results[0]['result'], results[1]['result'])
+        self.assertEqual(job_queue.read([job_ids[0]])[job_ids[0]]['status'], 'cancelled')
+
+    def test_last_subscriber_cancels_shared_execution(self):
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('p2', password='x'))
+        first = self._start_preview()
+        self.assertTrue(self.cursor.started.wait(5))
+        second = self._start_preview(client=other)
+
+        self.client.post('/api/v1/attempts/cancel_job/', {'job_id': first}, format='json')
+        self.assertFalse(self.cursor.cancelled.is_set())
+        other.post('/api/v1/attempts/cancel_job/', {'job_id': second}, format='json')
+        self.assertTrue(self.cursor.cancelled.wait(5))
+
+    @mock.patch.object(job_queue, 'QUERY_WORKERS', True)
+    def test_cancelled_scope_releases_a_held_slot(self):
+        slots = query_bulkheads.for_target(None)
+        before = slots.occupancy()['in_use']
+        self.assertTrue(slots.acquire(timeout=1))
+        scope = cancellation.CancelScope()
+        scope.cancel("superseded")
+        with cancellation.activate(scope):
+            res, err, _ = runner.execute_query('SELECT 1', 'p1', slot_held=True)
+        self.assertIsNone(res)
+        self.assertEqual(err, runner._CANCELLED_MSG)
+        self.assertEqual(slots.occupancy()['in_use'], before)
+
+    def test_cancel_queued_durable_job(self):
+        _release.set()
+        job_id = job_queue.enqueue('test_wait', {'n': 1}, user_id=self.user.id)
+        self.assertTrue(job_queue.cancel(job_id))
+        self.assertFalse(QueryJob.objects.exists())
+        self.assertEqual(_state(job_id)['status'], 'cancelled')
+        self.assertFalse(job_queue.cancel(job_id))
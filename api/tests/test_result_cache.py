@@ -0,0 +1,112 @@
+"""
+Solution-result cache tests (backend/result_cache.py).
+
+1. Hits, misses and the disabled mode.
+2. Single-flight: concurrent misses run the computation once.
+3. Per-target and per-question invalidation.
+4. Verdict cache: only graded verdicts are stored; keys follow invalidation.
+
+Run with:  python manage.py test api.tests.test_result_cache
+"""
+
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from backend import result_cache
+
+
+class SolutionCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_miss_then_hit(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return ([('a', 1)], None), True
+
+        self.assertEqual(result_cache.get_or_compute("k1", compute, ttl=60)[1], "miss")
+        value, status = result_cache.get_or_compute("k1", compute, ttl=60)
+        self.assertEqual(status, "hit")
+        self.assertEqual(value, ([('a', 1)], None))
+        self.assertEqual(len(calls), 1)
+
+    def test_uncacheable_value_is_not_stored(self):
+        def compute():
+            return (None, "Database Error"), False
+
+        result_cache.get_or_compute("k2", compute, ttl=60)
+        self.assertEqual(result_cache.get_or_compute("k2", compute, ttl=60)[1], "miss")
+
+    def test_disabled_when_ttl_zero(self):
+        value, status = result_cache.get_or_compute("k3", lambda: ("v", True), ttl=0)
+        self.assertEqual((value, status), ("v", "disabled"))
+        self.assertIsNone(cache.get("k3"))
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return "gold", True
+
+        def worker():
+            results.append(result_cache.get_or_compute("k4", compute, ttl=60)[0])
+
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["gold"] * 20)
+
+    def test_invalidate_target_changes_key(self):
+        before = result_cache.solution_cache_key("DSN=a", "7", "SELECT 1")
+        result_cache.invalidate_target("DSN=a")
+        self.assertNotEqual(before, result_cache.solution_cache_key("DSN=a", "7", "SELECT 1"))
+
+    def test_invalidate_question_is_scoped_to_question(self):
+        q7 = result_cache.solution_cache_key("DSN=a", "7", "SELECT 1")
+        q8 = result_cache.solution_cache_key("DSN=a", "8", "SELECT 1")
+        result_cache.invalidate_question("7")
+        self.assertNotEqual(q7, result_cache.solution_cache_key("DSN=a", "7", "SELECT 1"))
+        self.assertEqual(q8, result_cache.solution_cache_key("DSN=a", "8", "SELECT 1"))
+
+
+class VerdictCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def _key(self, sql="SELECT A FROM T", variant="ROWS:0"):
+        return result_cache.verdict_cache_key("DSN=a", "7", "SELECT a FROM t", sql, variant=variant)
+
+    def test_graded_verdict_round_trip(self):
+        verdict = {"status": "INCORRECT", "feedback": "Row count mismatch", "execution_metadata": {}}
+        result_cache.store_verdict(self._key(), verdict)
+        self.assertEqual(result_cache.peek_verdict(self._key()), verdict)
+
+    def test_errors_are_not_stored(self):
+        result_cache.store_verdict(self._key(), {"status": "ERROR", "feedback": "busy"})
+        self.assertIsNone(result_cache.peek_verdict(self._key()))
+
+    def test_variant_and_dataset_version_change_key(self):
+        key = self._key()
+        self.assertNotEqual(key, self._key(variant="ROWS:1"))
+        result_cache.invalidate_target("DSN=a")
+        self.assertNotEqual(key, self._key())
@@ -4,14 +4,23 @@ Security guardrail tests (ASVS-aligned).
 1. CSP header present on every response.
 2. SQL safety: validate_sql rejects unsafe/dangerous queries (unit + HTTP).
 3. Throttle: rate limiting smoke test (overrides rate to 5/min for speed).
+4. Field encryption: one process-wide cipher, key rotation, and connection
+   strings decrypted once per DatabaseConfig version.
 
 Run with:  python manage.py test api.tests.test_security
 """
 
+import os
+from unittest import mock
+
+from cryptography.fernet import Fernet
 from django.test import TestCase
 from django.core.cache import cache
 from rest_framework.test import APIRequestFactory
 
+from api import connections
+from api.models import DatabaseConfig
+from backend import crypto
 from backend.sql_eval import validate_sql
 
 
@@ -161,3 +170,41 @@ class ThrottleTest(TestCase):
             status_codes,
             f"Expected HTTP 429 after exceeding 5/min rate limit; got: {status_codes}",
         )
+
+
+# ── 4. Field encryption ─────────────────────────────────────────────────────
+
+class FieldEncryptionTest(TestCase):
+
+    def test_cipher_is_reused_and_rotated_keys_still_decrypt(self):
+        old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+        with mock.patch.dict(os.environ, {'DB_FIELD_ENCRYPTION_KEY': old_key}):
+            stored = crypto.encrypt_field('s3cret')
+            self.assertIs(crypto._get_fernet(), crypto._get_fernet())
+        with mock.patch.dict(os.environ, {'DB_FIELD_ENCRYPTION_KEY': f'{new_key},{old_key}'}):
+            self.assertEqual(crypto.decrypt_field(stored), 's3cret')
+            rotated = crypto.encrypt_field('s3cret')
+        with mock.patch.dict(os.environ, {'DB_FIELD_ENCRYPTION_KEY': new_key}):
+            self.assertEqual(crypto.decrypt_field(rotated), 's3cret')
+
+    def test_conn_str_is_decrypted_once_per_config_version(self):
+        key = Fernet.generate_key().decode()
+        with mock.patch.dict(os.environ, {'DB_FIELD_ENCRYPTION_KEY': key}), \
+                mock.patch.object(connections, 'decrypt_field', wraps=crypto.decrypt_field) as decrypt:
+            config = DatabaseConfig.objects.create(
+                config_name='cfg', host='h', database_name='db', provider='SQL_SERVER',
+                username='u', password_secret_ref=crypto.encrypt_field('pw1'),
+            )
+            first = connections.build_conn_str(config)
+            self.assertIn('PWD=pw1;', first)
+            self.assertEqual(connections.build_conn_str(DatabaseConfig.objects.get(pk=config.pk)), first)
+            self.assertEqual(decrypt.call_count, 1)
+
+            config.password_secret_ref = crypto.encrypt_field('pw2')
+            config.save()
+            self.assertIn('PWD=pw2;', connections.build_conn_str(config))
+            self.assertEqual(decrypt.call_count, 2)
+
+            config_id = config.pk
+            config.delete()
+            self.assertNotIn(config_id, connections._descriptors)
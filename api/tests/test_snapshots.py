@@ -0,0 +1,171 @@
+"""
+Golden solution snapshot tests (api/snapshots.py).
+
+1. Capture → load_expected round trip for row and checksum grading.
+2. Snapshots are ignored once the solution or grading mode changes.
+3. Drift check flags snapshots whose live result differs.
+4. validate_query without a config_id grades without a snapshot.
+5. Grading against a snapshot still reports a row count mismatch after an early stop,
+   and rows in the wrong order as such.
+
+Run with:  python manage.py test api.tests.test_snapshots
+"""
+
+from contextlib import contextmanager
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api import snapshots
+from api.models import DatabaseConfig, Question
+from backend import runner
+from backend.sql_eval import ResultChecksum, ResultSet
+
+
+SOLUTION_ROWS = ResultSet(['id', 'name'], [(1, 'a'), (2, 'b')])
+
+
+class SnapshotTest(TestCase):
+
+    def setUp(self):
+        self.config = DatabaseConfig.objects.create(
+            config_name='cfg', host='h', database_name='db', provider='SQL_SERVER',
+        )
+        self.question = Question.objects.create(
+            title='q', prompt='p', difficulty='EASY',
+            solution_query='SELECT id, name FROM t',
+        )
+
+    def _capture(self, result=SOLUTION_ROWS):
+        with mock.patch.object(snapshots, 'execute_query', return_value=(result, None, 1)):
+            return snapshots.capture(self.question, self.config, 'conn')
+
+    def test_capture_round_trip(self):
+        snapshot, err = self._capture()
+        self.assertIsNone(err)
+        self.assertEqual(snapshot.row_count, 2)
+        self.assertEqual(snapshot.column_signature, [['id', 'int'], ['name', 'str']])
+        self.question.refresh_from_db()
+        self.assertTrue(self.question.is_validated)
+
+        expected = snapshots.load_expected(self.question, self.config)
+        self.assertEqual(expected, SOLUTION_ROWS)
+
+    def test_capture_error_stores_nothing(self):
+        with mock.patch.object(snapshots, 'execute_query', return_value=(None, 'Database Error', 1)):
+            snapshot, err = snapshots.capture(self.question, self.config, 'conn')
+        self.assertIsNone(snapshot)
+        self.assertEqual(err, 'Database Error')
+        self.assertFalse(self.question.snapshots.exists())
+
+    def test_edited_solution_ignores_snapshot(self):
+        self._capture()
+        self.question.solution_query = 'SELECT id FROM t'
+        self.assertIsNone(snapshots.load_expected(self.question, self.config))
+        self.question.solution_query = 'SELECT id, name FROM t'
+        self.question.grading_mode = 'CHECKSUM'
+        self.assertIsNone(snapshots.load_expected(self.question, self.config))
+
+    def test_unserialisable_rows_are_not_stored(self):
+        snapshot, _ = self._capture(ResultSet(['b'], [(b'\x00',)]))
+        self.assertIsNone(snapshot.rows_blob)
+        self.assertIsNone(snapshots.load_expected(self.question, self.config))
+
+    def test_checksum_snapshot(self):
+        self.question.grading_mode = 'CHECKSUM'
+        self.question.save()
+        fingerprint = ResultChecksum(['id'], [('id', 'int')], 2, (3, 7))
+        with mock.patch.object(snapshots, 'checksum_query', return_value=(fingerprint, None, 1)):
+            snapshot, err = snapshots.capture(self.question, self.config, 'conn')
+        self.assertIsNone(err)
+        self.assertIsNone(snapshot.rows_blob)
+
+        expected = snapshots.load_expected(self.question, self.config)
+        self.assertTrue(expected.same_rows(fingerprint))
+
+    def test_drift_check(self):
+        snapshot, _ = self._capture()
+        with mock.patch.object(snapshots, 'execute_query', return_value=(SOLUTION_ROWS, None, 1)):
+            self.assertEqual(snapshots.check_drift(snapshot, 'conn'), (False, None))
+
+        changed = ResultSet(['id', 'name'], [(1, 'a'), (2, 'c')])
+        with mock.patch.object(snapshots, 'execute_query', return_value=(changed, None, 1)):
+            self.assertEqual(snapshots.check_drift(snapshot, 'conn'), (True, None))
+        self.assertIn('digest', snapshot.drift_detail)
+        self.assertIsNone(snapshots.load_expected(self.question, self.config))
+
+    def test_drift_check_error_leaves_snapshot(self):
+        snapshot, _ = self._capture()
+        with mock.patch.object(snapshots, 'execute_query', return_value=(None, 'Timeout', 1)):
+            self.assertEqual(snapshots.check_drift(snapshot, 'conn'), (False, 'Timeout'))
+        snapshot.refresh_from_db()
+        self.assertFalse(snapshot.is_drifted)
+
+
+class ValidateWithoutConfigTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.question = Question.objects.create(
+            title='q', prompt='p', difficulty='EASY', solution_query='SELECT id FROM t',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('p1', password='x'))
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_validate_query_without_config_id(self):
+        with mock.patch('api.views.evaluate_submission', return_value={'status': 'CORRECT'}) as evaluate:
+            response = self.client.post(
+                '/api/v1/attempts/validate_query/', {'query': 'SELECT id FROM t', 'question_id': self.question.id},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'CORRECT')
+        self.assertIsNone(evaluate.call_args.kwargs['expected'])
+        self.assertIsNone(evaluate.call_args.kwargs['conn_str'])
+
+
+class SnapshotGradingFeedbackTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def _grade(self, rows, order_sensitive=False):
+        cursor = mock.Mock()
+        cursor.description = [('id', int, None, None, None, None, True), ('name', str, None, None, None, None, True)]
+        cursor.fetchmany.side_effect = [rows, []]
+        connection = mock.Mock()
+        connection.cursor.return_value = cursor
+
+        @contextmanager
+        def _connection(conn_str=None):
+            yield connection
+
+        with mock.patch.object(runner.db_router, 'connection', _connection):
+            result = runner.evaluate_submission(
+                'p1', '1', 'SELECT id, name FROM t', 'SELECT id, name FROM t',
+                order_sensitive=order_sensitive, expected=SOLUTION_ROWS, check_rate=False,
+            )
+        return result, cursor
+
+    def test_too_few_rows_keeps_row_count_feedback(self):
+        result, cursor = self._grade([(9, 'z')])
+        self.assertEqual(result['status'], 'INCORRECT')
+        self.assertTrue(result['feedback'].startswith('Row count mismatch: You returned 1 rows, expected 2.'))
+        cursor.cancel.assert_called_once()
+
+    def test_same_count_wrong_values(self):
+        result, _ = self._grade([(1, 'a'), (9, 'z')])
+        self.assertTrue(result['feedback'].startswith('Row count matches but values are incorrect.'))
+
+    def test_misordered_rows_get_order_feedback(self):
+        result, _ = self._grade([(2, 'b'), (1, 'a')], order_sensitive=True)
+        self.assertEqual(result['feedback'], 'Rows are not in the expected order. Check your ORDER BY clause.')
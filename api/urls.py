@@ -7,7 +7,7 @@ from .views import (
     login_view, logout_view, me_view,
     results_view, bulk_assign_view, bulk_assign_by_text_view,
     users_view, user_detail_view, bulk_import_users_view,
-    schema_view,
+    schema_view, capacity_view,
 )
 
 router = DefaultRouter()
@@ -25,6 +25,7 @@ urlpatterns = [
     path('auth/me/', me_view, name='auth-me'),
     path('results/', results_view, name='results'),
     path('schema/', schema_view, name='schema'),
+    path('system/capacity/', capacity_view, name='system-capacity'),
     path('assignments/bulk_assign/', bulk_assign_view, name='bulk-assign'),
     path('assignments/bulk_assign_by_text/', bulk_assign_by_text_view, name='bulk-assign-by-text'),
     path('users/', users_view, name='users'),
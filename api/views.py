@@ -1,12 +1,11 @@
 
+import hashlib
 import logging
+import math
 import time
-from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from uuid import uuid4
 from django.contrib.auth import authenticate, login, logout # type: ignore
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
@@ -14,39 +13,129 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from .models import DatabaseConfig, Question, Assessment, AssessmentQuestion, Assignment, Attempt, AttemptAnswer
 from .serializers import *
+from .connections import build_conn_str
+from . import job_queue, prewarm, snapshots
 from backend.runner import evaluate_submission, execute_query, validate_sql_security
+from backend import result_cache, sql_eval
+from backend.db_router import db_router
+from backend.governor import (
+    PRIORITY_PREVIEW, PRIORITY_SUBMIT, PRIORITY_VALIDATE, check_rate_limit, query_bulkheads,
+)
 from backend.schema_loader import inspect_schema
-from backend.crypto import decrypt_field
 
 logger = logging.getLogger(__name__)
 
-# Async job executor — threads are per-process; job state lives in Django cache
-# so results are visible across workers when the cache backend is Redis.
-QUERY_JOB_TTL_SECONDS = 10 * 60
-_query_job_executor = ThreadPoolExecutor(max_workers=6)
+# Status endpoints accept ?wait=<seconds> and hold the request until the job
+# finishes (long poll), so clients make one request per job instead of polling.
+# Jobs finishing in this process wake waiters at once; jobs run by other
+# workers are seen by re-reading the cache, backing off up to _JOB_WAIT_POLL_MAX.
+QUERY_JOB_MAX_WAIT_SECONDS = 25
+MAX_JOB_STATUS_IDS = 50
+_JOB_WAIT_POLL_MIN = 0.05
+_JOB_WAIT_POLL_MAX = 0.5
 
-_JOB_KEY = "qjob:{}"
 
+def _get_query_jobs(job_ids, wait_seconds: float = 0, user_id=None) -> dict:
+    """
+    Reads the given jobs (job_queue.read, one cache.get_many); returns
+    {job_id: job} for those that exist.  With ``wait_seconds`` > 0 (capped at
+    QUERY_JOB_MAX_WAIT_SECONDS) it returns as soon as any of them has finished
+    or disappeared, or when the wait runs out.  Jobs owned by ``user_id`` are
+    marked as still wanted, so they are not cancelled as abandoned.
+    """
+    if user_id is not None:
+        job_queue.mark_seen(job_ids, user_id)
+    deadline = time.monotonic() + min(max(wait_seconds, 0), QUERY_JOB_MAX_WAIT_SECONDS)
+    interval = _JOB_WAIT_POLL_MIN
+    while True:
+        jobs = job_queue.read(job_ids)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or len(jobs) < len(job_ids) \
+                or any(job.get('status') in job_queue.JOB_DONE for job in jobs.values()):
+            return jobs
+        with job_queue.job_finished:
+            job_queue.job_finished.wait(min(interval, remaining))
+        interval = min(interval * 2, _JOB_WAIT_POLL_MAX)
+
+
+def _get_query_job(job_id: str, wait_seconds: float = 0, user_id=None):
+    return _get_query_jobs([job_id], wait_seconds, user_id).get(job_id)
+
+
+def _wait_param(request) -> float:
+    try:
+        wait = float(request.query_params.get('wait', 0))
+    except ValueError:
+        return 0
+    return wait if math.isfinite(wait) else 0
 
-def _start_query_job(work_fn):
-    job_id = uuid4().hex
-    cache.set(_JOB_KEY.format(job_id), {'status': 'queued'}, timeout=QUERY_JOB_TTL_SECONDS)
 
-    def _runner():
-        cache.set(_JOB_KEY.format(job_id), {'status': 'running'}, timeout=QUERY_JOB_TTL_SECONDS)
-        try:
-            result = work_fn()
-            cache.set(_JOB_KEY.format(job_id), {'status': 'completed', 'result': result}, timeout=QUERY_JOB_TTL_SECONDS)
-        except Exception as e:
-            logger.error(f"Async job failed for job_id={job_id}: {e}", exc_info=True)
-            cache.set(_JOB_KEY.format(job_id), {'status': 'failed', 'error': str(e)}, timeout=QUERY_JOB_TTL_SECONDS)
+def _job_payload(job_id: str, job: dict, failed_message: str) -> dict:
+    payload = {'job_id': job_id, 'status': job.get('status')}
+    if job.get('status') == 'queued':
+        payload['queue_position'] = job.get('queue_position', 0)
+    elif job.get('status') == 'completed':
+        payload['result'] = job.get('result')
+    elif job.get('status') == 'failed':
+        payload['error'] = job.get('error', failed_message)
+    elif job.get('status') == 'cancelled':
+        payload['reason'] = job.get('reason', 'cancelled')
+    return payload
 
-    _query_job_executor.submit(_runner)
-    return job_id
 
+_RATE_KINDS = {PRIORITY_SUBMIT: 'submit', PRIORITY_VALIDATE: 'validate', PRIORITY_PREVIEW: 'preview'}
 
-def _get_query_job(job_id: str):
-    return cache.get(_JOB_KEY.format(job_id))
+
+def _admit(request, conn_str, priority):
+    """
+    Admission control in front of query work.  Returns ``(rejection, estimate)``:
+    ``rejection`` is None when the request may proceed, else a ready response —
+    503 when the target database's queue is too deep (load shedding, checked
+    first so a shed request costs no rate-limit token) or 429 when the user's
+    rate limit for this kind of run is exhausted, both with Retry-After.
+    ``estimate`` is the governor.QueueEstimate for the request's class.
+    """
+    estimate = query_bulkheads.for_target(conn_str).estimate(priority)
+    if estimate.overloaded:
+        retry_after = max(1, math.ceil(estimate.wait_seconds))
+        return Response(
+            {
+                'error': 'Server is busy. Too many queries are waiting for this database. Please try again shortly.',
+                'queue_position': estimate.position,
+                'estimated_wait_seconds': round(estimate.wait_seconds, 1),
+                'retry_after': retry_after,
+            },
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': str(retry_after)},
+        ), estimate
+
+    limit = check_rate_limit(str(request.user.id), _RATE_KINDS[priority])
+    if not limit:
+        return Response(
+            {'error': 'Rate limit exceeded. Please wait a moment before trying again.', 'retry_after': limit.retry_after},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(max(1, math.ceil(limit.retry_after)))},
+        ), estimate
+    return None, estimate
+
+
+def _queue_job(kind, payload, priority, estimate, supersede=None, coalesce=None):
+    """Enqueues an async job; 202 with its id, or 503 when the job queue is full."""
+    try:
+        job_id = job_queue.enqueue(
+            kind, payload, priority=priority, queue_position=estimate.position,
+            user_id=payload['user_id'], supersede=supersede, coalesce=coalesce,
+        )
+    except job_queue.QueueFull:
+        return Response(
+            {'error': 'Server is busy. Too many queries are waiting. Please try again shortly.', 'retry_after': 5},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': '5'},
+        )
+    return Response(
+        {'job_id': job_id, 'status': 'queued', 'queue_position': estimate.position},
+        status=status.HTTP_202_ACCEPTED,
+    )
 
 
 def _is_better_result(new_status: str, new_time_ms: int, current_best_status: str, current_best_time_ms: int) -> bool:
@@ -118,6 +207,95 @@ def _update_best_result_if_needed(
     return False
 
 
+def _job_target(config_id):
+    """``(DatabaseConfig or None, conn_str or None)`` for a job payload's config_id."""
+    if not config_id:
+        return None, None
+    config = DatabaseConfig.objects.get(pk=config_id)
+    return config, build_conn_str(config)
+
+
+@job_queue.handler('run_query')
+def _run_query_job(payload):
+    _, conn_str = _job_target(payload.get('config_id'))
+    results, err, duration = execute_query(
+        payload['query'], user_id=str(payload['user_id']), conn_str=conn_str, priority=PRIORITY_PREVIEW,
+    )
+    if err:
+        return {'columns': [], 'rows': [], 'execution_time_ms': duration, 'error': err}
+    return {**results.to_payload(), 'execution_time_ms': duration}
+
+
+@job_queue.handler('validate_query', retry=False)  # counts the attempt and updates the best result
+def _validate_query_job(payload):
+    query = payload['query']
+    user_id = payload['user_id']
+    attempt_id = payload.get('attempt_id')
+    question = Question.objects.get(id=payload['question_id'])
+    config, conn_str = _job_target(payload.get('config_id'))
+
+    eval_result = evaluate_submission(
+        user_id=str(user_id),
+        question_id=str(question.id),
+        participant_query=query,
+        solution_query=question.solution_query,
+        conn_str=conn_str,
+        order_sensitive=question.order_sensitive,
+        grading_mode=question.grading_mode,
+        expected=snapshots.load_expected(question, config),
+        check_rate=False,
+    )
+
+    # Track best result if attempt_id is provided
+    if attempt_id:
+        try:
+            attempt = Attempt.objects.get(id=attempt_id)
+            # Verify user owns this attempt (security check)
+            if attempt.assignment.user_id == user_id or User.objects.filter(pk=user_id, is_staff=True).exists():
+                # Get or create the answer record
+                attempt_answer, created = AttemptAnswer.objects.get_or_create(
+                    attempt=attempt,
+                    question=question,
+                    defaults={
+                        'participant_query': '',
+                        'status': 'NOT_ATTEMPTED',
+                        'attempt_count': 1
+                    }
+                )
+
+                if not created:
+                    attempt_answer.attempt_count += 1
+
+                # Check and update best result
+                new_status = eval_result.get('status', 'INCORRECT')
+                new_time_ms = eval_result.get('execution_metadata', {}).get('duration_ms')
+
+                is_new_best = _update_best_result_if_needed(
+                    attempt_answer,
+                    new_status,
+                    query,
+                    new_time_ms
+                )
+
+                attempt_answer.save()
+
+                # Add tracking info to response
+                eval_result['is_new_best'] = is_new_best
+                eval_result['attempt_count'] = attempt_answer.attempt_count
+                if is_new_best:
+                    eval_result['best_result'] = {
+                        'status': attempt_answer.best_status,
+                        'execution_time_ms': attempt_answer.best_execution_time_ms,
+                        'achieved_at': attempt_answer.best_achieved_at.isoformat() if attempt_answer.best_achieved_at else None
+                    }
+        except Attempt.DoesNotExist:
+            logger.warning(f"Attempt {attempt_id} not found for validate_query_async tracking")
+        except Exception as e:
+            logger.error(f"Error tracking best result in validate_query_async: {e}", exc_info=True)
+
+    return eval_result
+
+
 def _attempt_expired(attempt) -> bool:
     """
     Returns True if the attempt has exceeded the assessment's allowed duration
@@ -151,38 +329,6 @@ def _user_to_dict(user):
     }
 
 
-def _build_conn_str(config: DatabaseConfig) -> str:
-    """Build an ODBC connection string from a DatabaseConfig model instance."""
-    host = config.host
-    db = config.database_name
-
-    if config.trusted_connection:
-        conn_str = (
-            f"Driver={{ODBC Driver 17 for SQL Server}};"
-            f"Server={host};"
-            f"Database={db};"
-            f"Trusted_Connection=yes;"
-        )
-    else:
-        conn_str = (
-            f"Driver={{ODBC Driver 17 for SQL Server}};"
-            f"Server={host};"
-            f"Database={db};"
-            f"UID={config.username};"
-            f"PWD={decrypt_field(config.password_secret_ref)};"
-        )
-
-    # For named instances (e.g. localhost\SQLEXPRESS), port is resolved via SQL Server Browser.
-    # Only append port when no named instance is present.
-    if config.port and config.port != 1433 and '\\' not in host:
-        conn_str = conn_str.replace(
-            f"Server={host};",
-            f"Server={host},{config.port};"
-        )
-
-    return conn_str
-
-
 # ─── Auth ─────────────────────────────────────────────────────────────────────
 
 @api_view(['POST'])
@@ -328,17 +474,68 @@ def schema_view(request):
     except DatabaseConfig.DoesNotExist:
         return Response({'error': 'DatabaseConfig not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-    conn_str = _build_conn_str(config)
+    conn_str = build_conn_str(config)
     schema = inspect_schema(conn_str=conn_str, solution_query=solution_query, schema_filter=config.schema_filter or '')
     return Response(schema)
 
 
+# ─── Capacity ─────────────────────────────────────────────────────────────────
+
+@api_view(['GET'])
+def capacity_view(request):
+    """
+    Live query capacity: per-database query slot occupancy (cluster-wide, for
+    the databases this worker has used), the shared overflow pool, and this
+    worker's connection pools and replica probe results.  Staff only.
+    GET /api/v1/system/capacity/
+    """
+    if not request.user.is_staff:
+        return Response({'error': 'Forbidden.'}, status=status.HTTP_403_FORBIDDEN)
+    return Response({
+        'query_slots': query_bulkheads.occupancy(),
+        'pools': db_router.pool_stats(),
+        'replicas': db_router.replica_health(),
+    })
+
+
 # ─── ViewSets ─────────────────────────────────────────────────────────────────
 
 class QuestionViewSet(viewsets.ModelViewSet):
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
 
+    @action(detail=True, methods=['post'])
+    def invalidate_solution_cache(self, request, pk=None):
+        """Drops cached solution results for this question on every database target."""
+        if not request.user.is_staff:
+            return Response({'error': 'Forbidden.'}, status=status.HTTP_403_FORBIDDEN)
+        question = self.get_object()
+        result_cache.invalidate_question(question.id)
+        return Response({'invalidated': True, 'question_id': question.id})
+
+    @action(detail=True, methods=['post'])
+    def capture_snapshot(self, request, pk=None):
+        """
+        Runs the solution against a database config and stores its golden
+        snapshot; grading on that config then uses the snapshot.
+        Body: { config_id }
+        """
+        if not request.user.is_staff:
+            return Response({'error': 'Forbidden.'}, status=status.HTTP_403_FORBIDDEN)
+        question = self.get_object()
+        config_id = request.data.get('config_id')
+        if not config_id:
+            return Response({'error': 'config_id is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            config = DatabaseConfig.objects.get(pk=config_id)
+        except DatabaseConfig.DoesNotExist:
+            return Response({'error': 'Database config not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        snapshot, err = snapshots.capture(question, config, build_conn_str(config))
+        if err:
+            return Response({'error': err}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(SolutionSnapshotSerializer(snapshot).data)
+
 
 class AssessmentViewSet(viewsets.ModelViewSet):
     queryset = Assessment.objects.prefetch_related('questions').all()
@@ -367,6 +564,17 @@ class AssessmentViewSet(viewsets.ModelViewSet):
         data['questions_data'] = QuestionSerializer(questions, many=True).data
         return Response(data)
 
+    @action(detail=True, methods=['post'])
+    def prewarm(self, request, pk=None):
+        """
+        Warms the assessment's database before the exam: connection pools,
+        schema cache and every solution result.  Returns each step's timings.
+        Also available as ``manage.py prewarm_assessment <id>``.
+        """
+        if not request.user.is_staff:
+            return Response({'error': 'Forbidden.'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(prewarm.prewarm(self.get_object()))
+
 
 class AssignmentViewSet(viewsets.ModelViewSet):
     serializer_class = AssignmentSerializer
@@ -458,12 +666,17 @@ class AttemptViewSet(viewsets.ModelViewSet):
 
         # Determine which database to evaluate against
         conn_str = None
+        db_config = None
         try:
             db_config = attempt.assignment.assessment.db_config
-            conn_str = _build_conn_str(db_config)
+            conn_str = build_conn_str(db_config)
         except Exception:
             pass
 
+        rejected, estimate = _admit(request, conn_str, PRIORITY_SUBMIT)
+        if rejected:
+            return rejected
+
         # Full deterministic evaluation
         eval_result = evaluate_submission(
             user_id=str(request.user.id),
@@ -472,6 +685,10 @@ class AttemptViewSet(viewsets.ModelViewSet):
             solution_query=question.solution_query,
             conn_str=conn_str,
             order_sensitive=question.order_sensitive,
+            grading_mode=question.grading_mode,
+            expected=snapshots.load_expected(question, db_config) if conn_str else None,
+            priority=PRIORITY_SUBMIT,
+            check_rate=False,
         )
 
         # Get or create the answer record
@@ -603,7 +820,7 @@ class AttemptViewSet(viewsets.ModelViewSet):
         if config_id:
             try:
                 config = DatabaseConfig.objects.get(pk=config_id)
-                conn_str = _build_conn_str(config)
+                conn_str = build_conn_str(config)
             except DatabaseConfig.DoesNotExist:
                 return Response({'error': 'DatabaseConfig not found.'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -614,8 +831,14 @@ class AttemptViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        rejected, estimate = _admit(request, conn_str, PRIORITY_PREVIEW)
+        if rejected:
+            return rejected
+
         try:
-            results, err, duration = execute_query(query, user_id=str(request.user.id), conn_str=conn_str)
+            results, err, duration = execute_query(
+                query, user_id=str(request.user.id), conn_str=conn_str, priority=PRIORITY_PREVIEW,
+            )
         except Exception as e:
             logger.error(f"run_query unexpected error for user {request.user.id}: {e}", exc_info=True)
             return Response(
@@ -632,17 +855,14 @@ class AttemptViewSet(viewsets.ModelViewSet):
                 'error': err
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        if results:
-            columns = list(results[0].keys())
-            rows = [list(row.values()) for row in results]
-            return Response({'columns': columns, 'rows': rows, 'execution_time_ms': duration})
-
-        return Response({'columns': [], 'rows': [], 'execution_time_ms': duration})
+        return Response({**results.to_payload(), 'execution_time_ms': duration})
 
     @action(detail=False, methods=['post'])
     def run_query_async(self, request):
         """
         Starts async query execution and returns a job_id for polling.
+        Cancels the user's previous preview for the same ``attempt_id``, and
+        joins an identical preview already running instead of repeating it.
         """
         query = request.data.get('query')
         config_id = request.data.get('config_id')
@@ -654,7 +874,7 @@ class AttemptViewSet(viewsets.ModelViewSet):
         if config_id:
             try:
                 config = DatabaseConfig.objects.get(pk=config_id)
-                conn_str = _build_conn_str(config)
+                conn_str = build_conn_str(config)
             except DatabaseConfig.DoesNotExist:
                 return Response({'error': 'DatabaseConfig not found.'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -662,38 +882,35 @@ class AttemptViewSet(viewsets.ModelViewSet):
         if not is_safe:
             return Response({'error': validation_msg}, status=status.HTTP_400_BAD_REQUEST)
 
-        def _run_query_job():
-            results, err, duration = execute_query(query, user_id=str(request.user.id), conn_str=conn_str)
-            if err:
-                return {'columns': [], 'rows': [], 'execution_time_ms': duration, 'error': err}
-            if results:
-                columns = list(results[0].keys())
-                rows = [list(row.values()) for row in results]
-                return {'columns': columns, 'rows': rows, 'execution_time_ms': duration}
-            return {'columns': [], 'rows': [], 'execution_time_ms': duration}
-
-        job_id = _start_query_job(_run_query_job)
-        return Response({'job_id': job_id, 'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
+        rejected, estimate = _admit(request, conn_str, PRIORITY_PREVIEW)
+        if rejected:
+            return rejected
+
+        # A new preview replaces the user's previous one for the same attempt (or editor session).
+        # Identical previews of the same database (canonical SQL) share one execution while it runs.
+        canonical = hashlib.sha256(sql_eval.canonicalize_sql(query).encode()).hexdigest()[:24]
+        return _queue_job(
+            'run_query', {'query': query, 'user_id': request.user.id, 'config_id': config_id},
+            PRIORITY_PREVIEW, estimate,
+            supersede=f"preview:{request.user.id}:{request.data.get('attempt_id') or '-'}",
+            coalesce=f"run_query:{config.pk if config_id else '-'}:{canonical}",
+        )
 
     @action(detail=False, methods=['get'])
     def run_query_status(self, request):
         """
-        Polls status/result for an async query execution job.
+        Status/result for an async query execution job.  Pass ``wait=<seconds>``
+        (at most QUERY_JOB_MAX_WAIT_SECONDS) to have the response held until
+        the job finishes instead of polling.
         """
         job_id = request.query_params.get('job_id', '').strip()
         if not job_id:
             return Response({'error': 'job_id query parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        job = _get_query_job(job_id)
+        job = _get_query_job(job_id, _wait_param(request), request.user.id)
         if not job:
             return Response({'error': 'Job not found or expired.'}, status=status.HTTP_404_NOT_FOUND)
-
-        payload = {'job_id': job_id, 'status': job.get('status')}
-        if job.get('status') == 'completed':
-            payload['result'] = job.get('result')
-        elif job.get('status') == 'failed':
-            payload['error'] = job.get('error', 'Async query execution failed.')
-        return Response(payload)
+        return Response(_job_payload(job_id, job, 'Async query execution failed.'))
 
     @action(detail=False, methods=['post'])
     def validate_query(self, request):
@@ -716,13 +933,18 @@ class AttemptViewSet(viewsets.ModelViewSet):
 
         # Determine database connection
         conn_str = None
+        config = None
         if config_id:
             try:
                 config = DatabaseConfig.objects.get(pk=config_id)
-                conn_str = _build_conn_str(config)
+                conn_str = build_conn_str(config)
             except DatabaseConfig.DoesNotExist:
                 return Response({'error': 'DatabaseConfig not found.'}, status=status.HTTP_404_NOT_FOUND)
 
+        rejected, estimate = _admit(request, conn_str, PRIORITY_VALIDATE)
+        if rejected:
+            return rejected
+
         try:
             # Use the same validation logic as submit_answer
             eval_result = evaluate_submission(
@@ -732,6 +954,9 @@ class AttemptViewSet(viewsets.ModelViewSet):
                 solution_query=question.solution_query,
                 conn_str=conn_str,
                 order_sensitive=question.order_sensitive,
+                grading_mode=question.grading_mode,
+                expected=snapshots.load_expected(question, config),
+                check_rate=False,
             )
             
             # Track best result if attempt_id is provided
@@ -812,101 +1037,118 @@ class AttemptViewSet(viewsets.ModelViewSet):
         if config_id:
             try:
                 config = DatabaseConfig.objects.get(pk=config_id)
-                conn_str = _build_conn_str(config)
+                conn_str = build_conn_str(config)
             except DatabaseConfig.DoesNotExist:
                 return Response({'error': 'DatabaseConfig not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Capture user and attempt for the background job
-        user_id = request.user.id
-        user = request.user
-
-        def _validate_query_job():
-            eval_result = evaluate_submission(
-                user_id=str(user_id),
-                question_id=str(question.id),
-                participant_query=query,
-                solution_query=question.solution_query,
-                conn_str=conn_str,
-                order_sensitive=question.order_sensitive,
-            )
-            
-            # Track best result if attempt_id is provided
-            if attempt_id:
-                try:
-                    attempt = Attempt.objects.get(id=attempt_id)
-                    # Verify user owns this attempt (security check)
-                    if attempt.assignment.user_id == user_id or user.is_staff:
-                        # Get or create the answer record
-                        attempt_answer, created = AttemptAnswer.objects.get_or_create(
-                            attempt=attempt,
-                            question=question,
-                            defaults={
-                                'participant_query': '',
-                                'status': 'NOT_ATTEMPTED',
-                                'attempt_count': 1
-                            }
-                        )
-                        
-                        if not created:
-                            attempt_answer.attempt_count += 1
-                        
-                        # Check and update best result
-                        new_status = eval_result.get('status', 'INCORRECT')
-                        new_time_ms = eval_result.get('execution_metadata', {}).get('duration_ms')
-                        
-                        is_new_best = _update_best_result_if_needed(
-                            attempt_answer,
-                            new_status,
-                            query,
-                            new_time_ms
-                        )
-                        
-                        attempt_answer.save()
-                        
-                        # Add tracking info to response
-                        eval_result['is_new_best'] = is_new_best
-                        eval_result['attempt_count'] = attempt_answer.attempt_count
-                        if is_new_best:
-                            eval_result['best_result'] = {
-                                'status': attempt_answer.best_status,
-                                'execution_time_ms': attempt_answer.best_execution_time_ms,
-                                'achieved_at': attempt_answer.best_achieved_at.isoformat() if attempt_answer.best_achieved_at else None
-                            }
-                except Attempt.DoesNotExist:
-                    logger.warning(f"Attempt {attempt_id} not found for validate_query_async tracking")
-                except Exception as e:
-                    logger.error(f"Error tracking best result in validate_query_async: {e}", exc_info=True)
-            
-            return eval_result
-
-        job_id = _start_query_job(_validate_query_job)
-        return Response({'job_id': job_id, 'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
+        rejected, estimate = _admit(request, conn_str, PRIORITY_VALIDATE)
+        if rejected:
+            return rejected
+
+        return _queue_job(
+            'validate_query',
+            {
+                'query': query, 'question_id': question.id, 'config_id': config_id,
+                'attempt_id': attempt_id, 'user_id': request.user.id,
+            },
+            PRIORITY_VALIDATE, estimate,
+        )
 
     @action(detail=False, methods=['get'])
     def validate_query_status(self, request):
         """
-        Polls status/result for an async query validation job.
+        Status/result for an async query validation job.  Pass ``wait=<seconds>``
+        (at most QUERY_JOB_MAX_WAIT_SECONDS) to have the response held until
+        the job finishes instead of polling.
         """
         job_id = request.query_params.get('job_id', '').strip()
         if not job_id:
             return Response({'error': 'job_id query parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        job = _get_query_job(job_id)
+        job = _get_query_job(job_id, _wait_param(request), request.user.id)
         if not job:
             return Response({'error': 'Job not found or expired.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(_job_payload(job_id, job, 'Async query validation failed.'))
 
-        payload = {'job_id': job_id, 'status': job.get('status')}
-        if job.get('status') == 'completed':
-            payload['result'] = job.get('result')
-        elif job.get('status') == 'failed':
-            payload['error'] = job.get('error', 'Async query validation failed.')
-        return Response(payload)
+    @action(detail=False, methods=['post'])
+    def cancel_job(self, request):
+        """
+        Cancels one of the caller's async jobs: a queued job never runs, a
+        running one has its statement stopped on the database server.
+        """
+        job_id = str(request.data.get('job_id') or '').strip()
+        if not job_id:
+            return Response({'error': 'job_id is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        owner = job_queue.owner(job_id)
+        if owner is None or (owner != request.user.id and not request.user.is_staff):
+            return Response({'error': 'Job not found or expired.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'job_id': job_id, 'cancelled': job_queue.cancel(job_id)})
+
+    @action(detail=False, methods=['get'])
+    def job_status(self, request):
+        """
+        Status of several async jobs in one request: ``job_ids=<id>,<id>,...``
+        (up to MAX_JOB_STATUS_IDS).  With ``wait=<seconds>`` the response is
+        held until any of them finishes.  Unknown or expired ids are listed
+        under ``missing``.
+        """
+        job_ids = list(dict.fromkeys(
+            j.strip() for j in request.query_params.get('job_ids', '').split(',') if j.strip()
+        ))
+        if not job_ids:
+            return Response({'error': 'job_ids query parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(job_ids) > MAX_JOB_STATUS_IDS:
+            return Response(
+                {'error': f'At most {MAX_JOB_STATUS_IDS} job ids per request.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        jobs = _get_query_jobs(job_ids, _wait_param(request), request.user.id)
+        return Response({
+            'jobs': {job_id: _job_payload(job_id, job, 'Async job failed.') for job_id, job in jobs.items()},
+            'missing': [job_id for job_id in job_ids if job_id not in jobs],
+        })
 
 
 class DatabaseConfigViewSet(viewsets.ModelViewSet):
     queryset = DatabaseConfig.objects.all()
     serializer_class = DatabaseConfigSerializer
 
+    @action(detail=True, methods=['post'])
+    def invalidate_solution_cache(self, request, pk=None):
+        """
+        Drops cached solution results for every question graded against this
+        database.  Call after the dataset behind the config has been changed.
+        """
+        if not request.user.is_staff:
+            return Response({'error': 'Forbidden.'}, status=status.HTTP_403_FORBIDDEN)
+        config = self.get_object()
+        result_cache.invalidate_target(build_conn_str(config))
+        return Response({'invalidated': True, 'config_id': config.id})
+
+    @action(detail=True, methods=['post'])
+    def check_snapshots(self, request, pk=None):
+        """
+        Re-runs every captured solution on this database and flags snapshots
+        whose result no longer matches (drift).  Drifted snapshots stop being
+        used for grading until captured again.
+        """
+        if not request.user.is_staff:
+            return Response({'error': 'Forbidden.'}, status=status.HTTP_403_FORBIDDEN)
+        config = self.get_object()
+        conn_str = build_conn_str(config)
+        results = []
+        for snapshot in config.snapshots.select_related('question'):
+            drifted, err = snapshots.check_drift(snapshot, conn_str)
+            results.append({
+                'question_id': snapshot.question_id,
+                'drifted': drifted,
+                'detail': snapshot.drift_detail,
+                'error': err,
+            })
+        return Response({'config_id': config.id, 'snapshots': results})
+
     @action(detail=False, methods=['post'])
     def test_connection(self, request):
         """
@@ -0,0 +1,92 @@
+"""
+Microbenchmark: per-cell isinstance normalisation vs a compiled column plan.
+
+Run from the project root:
+    python -m backend.bench_normalize
+    python -m backend.bench_normalize --rows 5000 --repeat 20
+
+No database connection or Django settings required.  Rows mimic a typical
+pyodbc result (int id, varchar name, decimal amount, datetime, date, float,
+nullable varchar) and both paths must produce identical output.
+"""
+
+import argparse
+import datetime
+import decimal
+import random
+import timeit
+
+from .config import DECIMAL_PRECISION, STRIP_STRINGS
+from .sql_eval import normalize_rows, plan_normalizers
+
+_DESCRIPTION = [
+    ('id', int, None, 10, 10, 0, False),
+    ('name', str, None, 50, 50, 0, True),
+    ('amount', decimal.Decimal, None, 12, 12, 2, True),
+    ('created_at', datetime.datetime, None, 23, 23, 3, True),
+    ('birth_date', datetime.date, None, 10, 10, 0, True),
+    ('score', float, None, 53, 53, 0, True),
+    ('note', str, None, 200, 200, 0, True),
+]
+
+
+def _isinstance_chain(val):
+    """The per-cell normaliser execute_query used before column plans."""
+    if val is None:
+        return None
+    if isinstance(val, decimal.Decimal):
+        return round(float(val), DECIMAL_PRECISION)
+    if isinstance(val, datetime.datetime):
+        return val.replace(microsecond=0).isoformat()
+    if isinstance(val, datetime.date):
+        return val.isoformat()
+    if isinstance(val, str) and STRIP_STRINGS:
+        return val.strip()
+    return val
+
+
+def _make_rows(n, seed=7):
+    rnd = random.Random(seed)
+    base = datetime.datetime(2024, 1, 1, 8, 30, 0, 123456)
+    rows = []
+    for i in range(n):
+        rows.append((
+            i,
+            f"  customer {rnd.randint(1, 999)} ",
+            decimal.Decimal(rnd.randint(0, 10 ** 7)) / 100,
+            base + datetime.timedelta(seconds=rnd.randint(0, 10 ** 7)),
+            datetime.date(1970, 1, 1) + datetime.timedelta(days=rnd.randint(0, 20000)),
+            rnd.random() * 100,
+            None if i % 3 else "vip",
+        ))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=1000, help='rows per result (default 1000)')
+    parser.add_argument('--repeat', type=int, default=50, help='timed runs per path (default 50)')
+    args = parser.parse_args()
+
+    rows = _make_rows(args.rows)
+    plan = plan_normalizers(_DESCRIPTION)
+
+    def per_cell():
+        return [tuple(_isinstance_chain(v) for v in row) for row in rows]
+
+    def planned():
+        return normalize_rows(rows, plan)
+
+    assert per_cell() == planned(), "plan output differs from the per-cell path"
+
+    results = {}
+    for label, fn in (('isinstance per cell', per_cell), ('column plan', planned)):
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        results[label] = best
+        print(f"{label:<20} {best * 1000:8.2f} ms  ({args.rows} rows x {len(_DESCRIPTION)} cols, best of {args.repeat})")
+
+    print(f"speed-up            {results['isinstance per cell'] / results['column plan']:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
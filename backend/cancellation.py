@@ -0,0 +1,90 @@
+"""
+backend/cancellation.py — stopping queries that nobody is waiting for any more.
+
+A CancelScope is activated on the thread doing a unit of work (an async
+query job).  While it is active, _run_select registers each statement's
+cursor with it; cancel() — usually called from a watchdog thread — then
+calls ``cursor.cancel()``, so SQL Server actually stops the statement and
+the connection and query slot are released straight away.  Queries started
+under a scope that is already cancelled return at once without taking a
+slot.
+
+Queries run on other threads (the solution half of a concurrent
+evaluation) are not covered: their result is cached for the next
+submission anyway.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+
+class QueryCancelled(Exception):
+    """Raised into the query path when its scope was cancelled before the statement started."""
+
+
+class CancelScope:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursors: set = set()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Marks the scope cancelled and cancels any statement running under it (idempotent)."""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            cursors = list(self._cursors)
+        for cursor in cursors:
+            try:
+                cursor.cancel()
+            except Exception:
+                pass  # the statement finished meanwhile, or the driver cannot cancel
+
+    @contextmanager
+    def watch(self, cursor):
+        with self._lock:
+            if self.reason is not None:
+                raise QueryCancelled(self.reason)
+            self._cursors.add(cursor)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._cursors.discard(cursor)
+
+
+_local = threading.local()
+
+
+def current() -> Optional[CancelScope]:
+    """The scope active on this thread, if any."""
+    return getattr(_local, "scope", None)
+
+
+@contextmanager
+def activate(scope: CancelScope):
+    """Makes ``scope`` the current scope on this thread for the duration of the block."""
+    previous = current()
+    _local.scope = scope
+    try:
+        yield scope
+    finally:
+        _local.scope = previous
+
+
+@contextmanager
+def watching(cursor):
+    """Registers ``cursor`` with the current scope, if any, while its statement runs."""
+    scope = current()
+    if scope is None:
+        yield
+    else:
+        with scope.watch(cursor):
+            yield
@@ -0,0 +1,126 @@
+"""
+backend/circuit_breaker.py — per-target circuit breakers shared by every worker.
+
+Connect failures are counted per database target (by fingerprint) in the
+Django cache, so with Redis one worker's observation protects all the others:
+
+    closed     connections are attempted; CIRCUIT_FAILURE_THRESHOLD connect
+               failures within CIRCUIT_FAILURE_WINDOW_SECONDS open the circuit.
+    open       for CIRCUIT_OPEN_SECONDS nobody connects: replicas are skipped,
+               and a target with no fallback fails at once (TargetUnavailable
+               in db_router) instead of every request waiting out the connect
+               timeout.
+    half_open  after that, one caller (cluster-wide) gets a trial connect;
+               success closes the circuit, failure opens it again.  Everyone
+               else still fails fast until the trial ends.
+
+Replica probes (db_router) report into the same breakers, so a replica's
+circuit also closes as soon as any worker's probe succeeds.  With
+LocMemCache (local development) the state is per process.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from django.core.cache import cache
+
+from .config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_FAILURE_WINDOW_SECONDS, CIRCUIT_OPEN_SECONDS
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+_STATE_KEY = "cb:{}"        # {'until', 'opened_at', 'error'} while open/half-open
+_FAILURES_KEY = "cb:fail:{}"  # connect failures in the current window
+_TRIAL_KEY = "cb:trial:{}"    # held by the caller making the half-open trial connect
+_STATE_TTL_SECONDS = 3600     # forget a circuit nobody has touched for this long
+
+
+class CircuitBreakers:
+
+    # A closed circuit is re-read from the cache at most this often per process,
+    # which keeps the cache off the per-query path while the target is healthy.
+    _LOCAL_TTL_SECONDS = 1.0
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        window_seconds: int = CIRCUIT_FAILURE_WINDOW_SECONDS,
+        open_seconds: int = CIRCUIT_OPEN_SECONDS,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.window_seconds = max(1, window_seconds)
+        self.open_seconds = max(1, open_seconds)
+        self._closed_until: Dict[str, float] = {}  # target id → monotonic time to re-check the cache
+        self._lock = threading.Lock()
+
+    def state(self, target_id: str) -> str:
+        """The circuit's current state (read-only; does not take the half-open trial)."""
+        with self._lock:
+            if self._closed_until.get(target_id, 0) > time.monotonic():
+                return CLOSED
+        record = cache.get(_STATE_KEY.format(target_id))
+        if record is None:
+            with self._lock:
+                self._closed_until[target_id] = time.monotonic() + self._LOCAL_TTL_SECONDS
+            return CLOSED
+        return OPEN if time.time() < record['until'] else HALF_OPEN
+
+    def allow(self, target_id: str) -> Optional[str]:
+        """
+        Whether to attempt a connect now.  Returns the state the attempt was
+        made in (CLOSED, or HALF_OPEN for the trial), or None to fail fast.
+        """
+        state = self.state(target_id)
+        if state == CLOSED:
+            return CLOSED
+        if state == HALF_OPEN and cache.add(_TRIAL_KEY.format(target_id), 1, timeout=self.open_seconds):
+            return HALF_OPEN
+        return None
+
+    def record_success(self, target_id: str, state: str = HALF_OPEN) -> None:
+        """Closes the circuit.  Only needs a cache write when ``state`` was not CLOSED."""
+        if state == CLOSED:
+            return
+        cache.delete_many([_STATE_KEY.format(target_id), _FAILURES_KEY.format(target_id), _TRIAL_KEY.format(target_id)])
+
+    def release_trial(self, target_id: str, state: str) -> None:
+        """Gives up a half-open trial that never got to connect, so another caller can take it."""
+        if state == HALF_OPEN:
+            cache.delete(_TRIAL_KEY.format(target_id))
+
+    def record_failure(self, target_id: str, error: str = '') -> str:
+        """Counts a connect failure, opening (or re-opening) the circuit. Returns the new state."""
+        with self._lock:
+            self._closed_until.pop(target_id, None)
+        state_key = _STATE_KEY.format(target_id)
+        failures_key = _FAILURES_KEY.format(target_id)
+        if cache.add(failures_key, 1, timeout=self.window_seconds):
+            failures = 1
+        else:
+            try:
+                failures = cache.incr(failures_key)
+            except ValueError:  # the window expired in between
+                cache.add(failures_key, 1, timeout=self.window_seconds)
+                failures = 1
+        record = cache.get(state_key)
+        if record is None and failures < self.failure_threshold:
+            return CLOSED
+        now = time.time()
+        cache.set(state_key, {
+            'until': now + self.open_seconds,
+            'opened_at': record['opened_at'] if record else now,
+            'error': error[:200],
+        }, timeout=_STATE_TTL_SECONDS)
+        cache.delete(_TRIAL_KEY.format(target_id))
+        return OPEN
+
+    def describe(self, target_id: str) -> Dict[str, Any]:
+        """State, failure count and (when not closed) since when and why, for ops endpoints."""
+        record = cache.get(_STATE_KEY.format(target_id))
+        info: Dict[str, Any] = {
+            'state': CLOSED if record is None else (OPEN if time.time() < record['until'] else HALF_OPEN),
+            'recent_failures': cache.get(_FAILURES_KEY.format(target_id), 0),
+        }
+        if record is not None:
+            info.update(opened_at=record['opened_at'], last_error=record['error'])
+        return info
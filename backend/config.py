@@ -5,7 +5,42 @@ import os
 QUERY_TIMEOUT_SECONDS = int(os.getenv('QUERY_TIMEOUT_SECONDS', 5))
 MAX_RESULT_ROWS = int(os.getenv('MAX_RESULT_ROWS', 100))
 RUN_RATE_LIMIT = int(os.getenv('RUN_RATE_LIMIT', 10)) # Runs per minute per user
-MAX_CONCURRENT_QUERY_RUNS = int(os.getenv('MAX_CONCURRENT_QUERY_RUNS', 20)) # App-wide concurrency cap
+# Per-user token buckets (calls per minute, also the burst size) for each kind of query run.
+SUBMIT_RATE_LIMIT = int(os.getenv('SUBMIT_RATE_LIMIT', RUN_RATE_LIMIT))      # submit_answer
+VALIDATE_RATE_LIMIT = int(os.getenv('VALIDATE_RATE_LIMIT', RUN_RATE_LIMIT))  # validate_query(_async)
+PREVIEW_RATE_LIMIT = int(os.getenv('PREVIEW_RATE_LIMIT', 30))                # run_query(_async)
+MAX_CONCURRENT_QUERY_RUNS = int(os.getenv('MAX_CONCURRENT_QUERY_RUNS', 20)) # Default per-database concurrency cap (all workers)
+# Shared slots any database may borrow once its own budget is full.
+QUERY_OVERFLOW_SLOTS = int(os.getenv('QUERY_OVERFLOW_SLOTS', 4))
+# Queued queries are admitted by class (submit > validate > preview); a lower class is
+# promoted one level for every this-many seconds its oldest query has been waiting.
+QUERY_PRIORITY_AGING_SECONDS = int(os.getenv('QUERY_PRIORITY_AGING_SECONDS', 2))
+# Load shedding: a query whose estimated wait for a slot (queue depth x average query time)
+# exceeds this is rejected at once with 503 + Retry-After instead of holding a web thread.
+QUERY_WAIT_BUDGET_SECONDS = int(os.getenv('QUERY_WAIT_BUDGET_SECONDS', 3))
+
+# Adaptive concurrency: each database's limit starts at its static budget (the ceiling) and
+# moves between ADAPTIVE_MIN_LIMIT and it, +1 per window of ADAPTIVE_WINDOW_SAMPLES queries while median latency
+# stays within ADAPTIVE_LATENCY_TOLERANCE x baseline, cut when latency rises or queries time out.
+ADAPTIVE_CONCURRENCY = os.getenv('ADAPTIVE_CONCURRENCY', 'True').lower() == 'true'
+ADAPTIVE_MIN_LIMIT = int(os.getenv('ADAPTIVE_MIN_LIMIT', 2))
+ADAPTIVE_WINDOW_SAMPLES = int(os.getenv('ADAPTIVE_WINDOW_SAMPLES', 20))
+ADAPTIVE_LATENCY_TOLERANCE = float(os.getenv('ADAPTIVE_LATENCY_TOLERANCE', 1.5))
+# Query slots are leases in the shared cache, renewed while held; a crashed worker's
+# slots are reclaimed after at most this many seconds.
+QUERY_SLOT_LEASE_SECONDS = int(os.getenv('QUERY_SLOT_LEASE_SECONDS', 15))
+
+# Async query jobs (run_query_async / validate_query_async). With QUERY_WORKERS on, web
+# processes only enqueue jobs in the management DB and `manage.py run_query_workers`
+# processes run them (job status is shared through the cache, so use Redis). Off: each web
+# process runs its jobs on its own threads, and queued jobs are lost on restart.
+QUERY_WORKERS = os.getenv('QUERY_WORKERS', 'False').lower() == 'true'
+QUERY_JOB_QUEUE_MAX = int(os.getenv('QUERY_JOB_QUEUE_MAX', 200))                  # waiting jobs beyond this are refused (503)
+QUERY_JOB_VISIBILITY_SECONDS = int(os.getenv('QUERY_JOB_VISIBILITY_SECONDS', 60))  # a claimed job not finished by then is run again
+QUERY_JOB_MAX_ATTEMPTS = int(os.getenv('QUERY_JOB_MAX_ATTEMPTS', 3))              # runs per job before it is marked failed
+# A job whose client has not asked for its status for this long is cancelled (running
+# statements are stopped on the server). Must exceed the 25 s status long poll.
+QUERY_JOB_ABANDON_SECONDS = int(os.getenv('QUERY_JOB_ABANDON_SECONDS', 60))
 
 # Grace period after the assessment deadline during which submit_answer is still accepted.
 # Covers: auto-finalize latency (frontend timer fires → HTTP round-trip takes ~100-500ms),
@@ -16,6 +51,21 @@ SUBMIT_GRACE_SECONDS = int(os.getenv('SUBMIT_GRACE_SECONDS', 60))
 # Schema introspection cache TTL in seconds. Set to 0 to disable caching.
 SCHEMA_CACHE_TTL_SECONDS = int(os.getenv('SCHEMA_CACHE_TTL_SECONDS', 300))
 
+# Solution-result cache TTL in seconds (gold results reused across submissions). Set to 0 to disable.
+SOLUTION_CACHE_TTL_SECONDS = int(os.getenv('SOLUTION_CACHE_TTL_SECONDS', 1800))
+
+# Verdict cache TTL in seconds: a graded participant query (canonicalised) is not re-run for the
+# same question and dataset version within this window. Set to 0 to disable.
+VERDICT_CACHE_TTL_SECONDS = int(os.getenv('VERDICT_CACHE_TTL_SECONDS', 600))
+
+# When a solution result is not cached, run the solution and participant queries
+# concurrently (two connections, admitted together) instead of one after the other.
+CONCURRENT_EVALUATION = os.getenv('CONCURRENT_EVALUATION', 'True').lower() == 'true'
+
+# Participant rows are fetched and compared against the solution in batches of this
+# size; grading stops fetching at the first batch that rules out a correct answer.
+COMPARE_FETCH_BATCH_ROWS = int(os.getenv('COMPARE_FETCH_BATCH_ROWS', 25))
+
 # Database Connections
 # Primary is mandatory
 PRIMARY_CONN = os.getenv('ASSESSMENT_DB_PRIMARY_CONN', "Driver={ODBC Driver 17 for SQL Server};Server=primary-db;Database=master;Uid=readonly;Pwd=password;")
@@ -23,6 +73,28 @@ PRIMARY_CONN = os.getenv('ASSESSMENT_DB_PRIMARY_CONN', "Driver={ODBC Driver 17 f
 # Replicas are optional, comma separated. Can be missing or empty.
 REPLICAS_STR = os.getenv('ASSESSMENT_DB_REPLICA_CONNS', "")
 REPLICAS = [s.strip() for s in REPLICAS_STR.split(',') if s.strip()] if REPLICAS_STR else []
+# Each web/worker process probes every replica (connect + SELECT 1) this often, in the
+# background; queries go to the less loaded of two healthy replicas, weighted by the probed
+# latency. 0 disables probing.
+REPLICA_PROBE_INTERVAL_SECONDS = int(os.getenv('REPLICA_PROBE_INTERVAL_SECONDS', 5))
+REPLICA_PROBE_TIMEOUT_SECONDS = int(os.getenv('REPLICA_PROBE_TIMEOUT_SECONDS', 2))
+# Circuit breaker per database target, shared by all workers through the cache: this many
+# connect failures (or failed probes) within the window open it; while open, replicas are
+# skipped and targets without a fallback fail at once. After CIRCUIT_OPEN_SECONDS one trial
+# connect is let through; a successful trial or replica probe closes it again.
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 2))
+CIRCUIT_FAILURE_WINDOW_SECONDS = int(os.getenv('CIRCUIT_FAILURE_WINDOW_SECONDS', 60))
+CIRCUIT_OPEN_SECONDS = int(os.getenv('CIRCUIT_OPEN_SECONDS', 15))
+
+# Connection pooling (one bounded pool per distinct connection string, owned by db_router).
+# POOL_MAX_SIZE caps open connections (idle + checked out) per target; defaults to the
+# query slots a target can grant (its budget plus the shared overflow), since no more than
+# that many queries can run at once anyway.  A DatabaseConfig's pools are sized from its
+# own budget instead (api/connections.py).
+POOL_MAX_SIZE = int(os.getenv('POOL_MAX_SIZE', MAX_CONCURRENT_QUERY_RUNS + QUERY_OVERFLOW_SLOTS))
+POOL_MAX_IDLE_SECONDS = int(os.getenv('POOL_MAX_IDLE_SECONDS', 300))       # close connections idle longer than this
+POOL_MAX_LIFETIME_SECONDS = int(os.getenv('POOL_MAX_LIFETIME_SECONDS', 1800))  # recycle connections older than this
+POOL_PING_AFTER_IDLE_SECONDS = int(os.getenv('POOL_PING_AFTER_IDLE_SECONDS', 30))  # SELECT 1 before reusing a connection idle this long
 
 # Normalization Settings for Deterministic Comparison
 DECIMAL_PRECISION = int(os.getenv('DECIMAL_PRECISION', 4))
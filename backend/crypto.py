@@ -3,6 +3,9 @@ backend/crypto.py — symmetric encryption for sensitive DB config fields.
 
 Uses Fernet (AES-128-CBC + HMAC-SHA256) from the `cryptography` package.
 The key is loaded from the DB_FIELD_ENCRYPTION_KEY environment variable.
+For key rotation it may hold several comma-separated keys: the first
+encrypts, any of them decrypts (MultiFernet).  The cipher is built once per
+process and rebuilt only if the variable changes.
 
 Encrypted values are prefixed with "enc:" so plain-text legacy values can be
 detected and passed through unchanged (migration safety).
@@ -16,27 +19,43 @@ Usage:
 
 import os
 import logging
-from cryptography.fernet import Fernet, InvalidToken
+import threading
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 
 logger = logging.getLogger(__name__)
 
 _ENC_PREFIX = "enc:"
 
-def _get_fernet() -> Fernet | None:
-    key = os.environ.get("DB_FIELD_ENCRYPTION_KEY", "").strip()
-    if not key:
+_fernet_lock = threading.Lock()
+_fernet_for: tuple[str, MultiFernet | None] | None = None  # (env value, cipher built from it)
+
+
+def _build_fernet(keys: str) -> MultiFernet | None:
+    if not keys:
         logger.warning(
             "DB_FIELD_ENCRYPTION_KEY is not set. "
             "DB passwords are stored unencrypted. Set this variable in production."
         )
         return None
     try:
-        return Fernet(key.encode())
+        return MultiFernet([Fernet(k.strip().encode()) for k in keys.split(",") if k.strip()])
     except Exception:
-        logger.error("DB_FIELD_ENCRYPTION_KEY is invalid. Must be a valid Fernet key.")
+        logger.error("DB_FIELD_ENCRYPTION_KEY is invalid. Must be a valid Fernet key (or comma-separated keys).")
         return None
 
 
+def _get_fernet() -> MultiFernet | None:
+    global _fernet_for
+    keys = os.environ.get("DB_FIELD_ENCRYPTION_KEY", "").strip()
+    cached = _fernet_for
+    if cached is not None and cached[0] == keys:
+        return cached[1]
+    with _fernet_lock:
+        if _fernet_for is None or _fernet_for[0] != keys:
+            _fernet_for = (keys, _build_fernet(keys))
+        return _fernet_for[1]
+
+
 def encrypt_field(value: str) -> str:
     """
     Encrypts a plain-text string. Returns the encrypted value prefixed with 'enc:'.
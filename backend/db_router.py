@@ -1,66 +1,598 @@
 
+import hashlib
+import logging
+import os
+import random
+import re
 import pyodbc
 import threading
 import time
-from typing import Dict
-from .config import PRIMARY_CONN, REPLICAS
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from .circuit_breaker import CLOSED, OPEN, CircuitBreakers
+from .config import (
+    PRIMARY_CONN, REPLICAS, QUERY_TIMEOUT_SECONDS,
+    REPLICA_PROBE_INTERVAL_SECONDS, REPLICA_PROBE_TIMEOUT_SECONDS,
+    POOL_MAX_SIZE, POOL_MAX_IDLE_SECONDS, POOL_MAX_LIFETIME_SECONDS, POOL_PING_AFTER_IDLE_SECONDS,
+)
+
+logger = logging.getLogger("QueryBench.DBRouter")
+
+# Errors raised by the statement itself (bad SQL, bad data).  The connection that
+# produced them is still usable, so it goes back to the pool.  Anything else —
+# timeouts, dropped links, driver failures — discards the connection.
+_STATEMENT_ERRORS = (pyodbc.ProgrammingError, pyodbc.DataError, pyodbc.IntegrityError)
+
+
+def target_fingerprint(conn_str: str) -> str:
+    """Stable, non-reversible id for a connection string — safe for logs, stats and cache keys."""
+    return hashlib.sha256(conn_str.encode()).hexdigest()[:16]
+
+
+def describe_target(conn_str: str) -> str:
+    """Human-readable 'server/database' label for a connection string (credentials omitted)."""
+    server = re.search(r'(?:^|;)\s*Server=([^;]*)', conn_str, re.IGNORECASE)
+    database = re.search(r'(?:^|;)\s*Database=([^;]*)', conn_str, re.IGNORECASE)
+    return f"{server.group(1) if server else '?'}/{database.group(1) if database else '?'}"
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of ODBC connections for a single connection string.
+
+    - At most ``max_size`` connections are open at once (idle + checked out);
+      checkout blocks up to ``timeout`` seconds for one to be returned.
+    - Idle connections are reused LIFO so hot connections stay hot and cold
+      ones age out; a connection idle longer than ``max_idle`` or older than
+      ``max_lifetime`` is closed instead of reused.
+    - A connection idle longer than ``ping_after_idle`` gets a ``SELECT 1``
+      liveness check before it is handed out; recently used ones are trusted.
+    """
+
+    def __init__(
+        self,
+        conn_str: str,
+        max_size: int = POOL_MAX_SIZE,
+        max_idle: float = POOL_MAX_IDLE_SECONDS,
+        max_lifetime: float = POOL_MAX_LIFETIME_SECONDS,
+        ping_after_idle: float = POOL_PING_AFTER_IDLE_SECONDS,
+    ):
+        self.conn_str = conn_str
+        self.max_size = max(1, max_size)
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_after_idle = ping_after_idle
+        self._idle: Deque[Tuple[pyodbc.Connection, float, float]] = deque()  # (conn, created_at, last_used)
+        self._created_at: Dict[int, float] = {}  # id(conn) → created_at for checked-out connections
+        self._open = 0  # idle + checked out (includes slots reserved for connections being opened)
+        self._cond = threading.Condition()
+        self._counters = {
+            'checkouts': 0, 'created': 0, 'reused': 0, 'expired': 0,
+            'failed_pings': 0, 'discarded': 0, 'waits': 0, 'timeouts': 0,
+        }
+
+    def _expired(self, created_at: float, last_used: float, now: float) -> bool:
+        return now - created_at > self.max_lifetime or now - last_used > self.max_idle
+
+    def _release_slot_locked(self, count: int = 1) -> None:
+        self._open -= count
+        self._cond.notify(count)
+
+    def checkout(self, timeout: float = QUERY_TIMEOUT_SECONDS, connect_timeout: int = 2) -> pyodbc.Connection:
+        """
+        Returns a live connection, reusing an idle one when possible.
+        Raises PoolTimeout when the pool stays full for ``timeout`` seconds,
+        or the pyodbc error from connect() when a new connection cannot be opened.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._counters['checkouts'] += 1
+        while True:
+            stale: List[pyodbc.Connection] = []
+            entry = None
+            with self._cond:
+                while True:
+                    now = time.time()
+                    while self._idle:
+                        conn, created_at, last_used = self._idle.pop()
+                        if self._expired(created_at, last_used, now):
+                            stale.append(conn)
+                            self._counters['expired'] += 1
+                            self._release_slot_locked()
+                            continue
+                        entry = (conn, created_at, last_used)
+                        break
+                    if entry is not None or self._open < self.max_size:
+                        if entry is None:
+                            self._open += 1  # reserve the slot; connect happens outside the lock
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeout("Timed out waiting for a pooled database connection.")
+                    self._counters['waits'] += 1
+                    self._cond.wait(remaining)
+            for conn in stale:
+                self._close_quietly(conn)
+
+            if entry is None:
+                try:
+                    conn = pyodbc.connect(self.conn_str, timeout=connect_timeout)
+                except BaseException:
+                    with self._cond:
+                        self._release_slot_locked()
+                    raise
+                with self._cond:
+                    self._counters['created'] += 1
+                    self._created_at[id(conn)] = time.time()
+                return conn
+
+            conn, created_at, last_used = entry
+            if self._is_alive(conn, idle_for=time.time() - last_used):
+                with self._cond:
+                    self._counters['reused'] += 1
+                    self._created_at[id(conn)] = created_at
+                return conn
+            # Dead connection: drop it and go round again (counts against the same deadline).
+            self._close_quietly(conn)
+            with self._cond:
+                self._counters['failed_pings'] += 1
+                self._release_slot_locked()
+
+    def checkin(self, conn: pyodbc.Connection, discard: bool = False) -> None:
+        """
+        Returns a connection to the pool.  ``discard=True`` closes it instead
+        (use after connection-level errors).  Any open transaction is rolled
+        back so the next borrower starts clean.
+        """
+        now = time.time()
+        with self._cond:
+            created_at = self._created_at.pop(id(conn), now)
+            over_size = self._open > self.max_size   # shrunk by resize() while checked out
+        if not discard and not over_size and now - created_at <= self.max_lifetime:
+            try:
+                conn.rollback()
+            except pyodbc.Error:
+                discard = True
+        else:
+            discard = True
+
+        if discard:
+            self._close_quietly(conn)
+            with self._cond:
+                self._counters['discarded'] += 1
+                self._release_slot_locked()
+            return
+        with self._cond:
+            self._idle.append((conn, created_at, now))
+            self._cond.notify()
+
+    def fill(self, size: int, connect_timeout: int = 2) -> int:
+        """Opens connections until ``size`` (capped at max_size) are idle. Returns the idle count."""
+        target = min(size, self.max_size)
+        opened = []
+        try:
+            while True:
+                with self._cond:
+                    if len(self._idle) + len(opened) >= target or self._open >= self.max_size:
+                        break
+                    self._open += 1
+                try:
+                    conn = pyodbc.connect(self.conn_str, timeout=connect_timeout)
+                except BaseException:
+                    with self._cond:
+                        self._release_slot_locked()
+                    raise
+                opened.append(conn)
+        finally:
+            now = time.time()
+            with self._cond:
+                self._counters['created'] += len(opened)
+                self._idle.extendleft((conn, now, now) for conn in opened)
+                self._cond.notify(len(opened))
+        return len(self._idle)
+
+    def resize(self, max_size: int) -> None:
+        """
+        Changes ``max_size``.  Growing admits waiting checkouts at once;
+        after shrinking, connections above the new size are closed as they
+        are returned.
+        """
+        with self._cond:
+            self.max_size = max(1, max_size)
+            self._cond.notify_all()
+
+    def clear(self) -> None:
+        """Closes every idle connection. Checked-out connections are closed when returned."""
+        with self._cond:
+            idle = [conn for conn, _, _ in self._idle]
+            self._idle.clear()
+            self._release_slot_locked(len(idle))
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'max_size': self.max_size,
+                'open': self._open,
+                'idle': idle,
+                'in_use': self._open - idle,
+                **self._counters,
+            }
+
+    def _is_alive(self, conn: pyodbc.Connection, idle_for: float) -> bool:
+        if getattr(conn, 'closed', False):
+            return False
+        if idle_for < self.ping_after_idle:
+            return True
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn: pyodbc.Connection) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class TargetUnavailable(Exception):
+    """Raised without connecting when a target's circuit is open and there is no fallback."""
+
+
+class _ReplicaState:
+    """Probe latency and load of one replica, as seen by this process (health is shared)."""
+
+    __slots__ = ('connect_ms', 'ping_ms', 'outstanding', 'last_probe_at', 'last_probe_ok')
+
+    def __init__(self):
+        self.connect_ms: Optional[float] = None  # EWMA of probe connect time
+        self.ping_ms: Optional[float] = None     # EWMA of probe SELECT 1 round trip
+        self.outstanding = 0                     # queries currently routed here
+        self.last_probe_at: Optional[float] = None
+        self.last_probe_ok: Optional[bool] = None
+
 
 class AssessmentDBRouter:
     """
-    Manages connection strings, connection pooling (via ODBC),
+    Manages connection strings and per-target connection pools,
     and routes queries to read replicas with fallback to primary.
+
+    Two kinds of replica set: the env-configured ``REPLICAS`` of
+    ``PRIMARY_CONN``, and per-assessment sets registered with
+    ``set_replicas`` for a DatabaseConfig's connection string.  Both share
+    the health tracking, probing and pooling below.
+
+    Replicas are probed in the background (connect + ``SELECT 1``) every
+    ``REPLICA_PROBE_INTERVAL_SECONDS``.  Each query goes to the better of two
+    randomly chosen healthy replicas, scored by queries in flight times probed
+    round-trip latency ("power of two choices").
+
+    Health is a circuit breaker per target, shared by all workers through the
+    cache (``backend/circuit_breaker.py``): connect failures and failed probes
+    open it, a successful probe or half-open trial closes it.  An open replica
+    is skipped; an open target with nothing to fall back to raises
+    TargetUnavailable at once.
     """
+    _EWMA_WEIGHT = 0.3           # weight of the newest probe sample
+    _UNPROBED_LATENCY_MS = 1.0   # assumed until a replica's first probe completes
+
     def __init__(self):
         self.primary = PRIMARY_CONN
         self.replicas = REPLICAS
-        self._last_index = 0
-        self._index_lock = threading.Lock()
-        self._unhealthy_replicas: Dict[str, float] = {}
-        self._health_check_cooldown = 300 # 5 minutes
+        self._replica_sets: Dict[str, List[str]] = {}  # per-assessment primary conn_str → its replicas
+        self._replica_state: Dict[str, _ReplicaState] = {r: _ReplicaState() for r in self.replicas}
+        self._state_lock = threading.Lock()
+        self.breakers = CircuitBreakers()
+        self._probe_interval = REPLICA_PROBE_INTERVAL_SECONDS
+        self._prober_pid: Optional[int] = None
+        self._pools: Dict[str, ConnectionPool] = {}
+        self._pool_sizes: Dict[str, int] = {}  # conn_str → max_size, when not POOL_MAX_SIZE
+        self._pools_lock = threading.Lock()
+
+    def set_replicas(self, conn_str: str, replicas: List[str]) -> None:
+        """Registers (or, with an empty list, removes) the read replicas serving ``conn_str``."""
+        if replicas:
+            with self._state_lock:
+                for r in replicas:
+                    self._replica_state.setdefault(r, _ReplicaState())
+            self._replica_sets[conn_str] = list(replicas)
+        else:
+            self._replica_sets.pop(conn_str, None)
+
+    def _replicas_for(self, conn_str: Optional[str]) -> List[str]:
+        return self._replica_sets.get(conn_str, []) if conn_str else self.replicas
+
+    def _all_replicas(self) -> List[str]:
+        replicas = list(self.replicas)
+        for replica_set in list(self._replica_sets.values()):
+            replicas.extend(r for r in replica_set if r not in replicas)
+        return replicas
+
+    def _state(self, conn_str: str) -> _ReplicaState:
+        state = self._replica_state.get(conn_str)
+        if state is None:
+            with self._state_lock:
+                state = self._replica_state.setdefault(conn_str, _ReplicaState())
+        return state
 
     def _is_healthy(self, conn_str: str) -> bool:
-        if conn_str not in self._unhealthy_replicas:
-            return True
-        if time.time() - self._unhealthy_replicas[conn_str] > self._health_check_cooldown:
-            # Try to recover
-            del self._unhealthy_replicas[conn_str]
-            return True
-        return False
+        return self.breakers.state(target_fingerprint(conn_str)) != OPEN
+
+    def mark_unhealthy(self, conn_str: str, error: Optional[str] = None):
+        """Records a connect failure against ``conn_str``'s circuit (any target, primaries included)."""
+        if self.breakers.record_failure(target_fingerprint(conn_str), error or '') == OPEN:
+            logger.warning(f"Circuit open for {describe_target(conn_str)}: {error or 'connect failed'}")
+
+    # ── Active health probing ────────────────────────────────────────────────
 
-    def mark_unhealthy(self, conn_str: str):
-        if conn_str != self.primary:
-            self._unhealthy_replicas[conn_str] = time.time()
+    def _ensure_prober(self) -> None:
+        """Starts this process's background prober (again after a fork)."""
+        if self._probe_interval <= 0 or self._prober_pid == os.getpid():
+            return
+        with self._state_lock:
+            if self._prober_pid == os.getpid():
+                return
+            self._prober_pid = os.getpid()
+        threading.Thread(target=self._probe_loop, name="qb-replica-prober", daemon=True).start()
 
-    def get_connection(self, force_primary: bool = False) -> pyodbc.Connection:
+    def _probe_loop(self) -> None:
+        pid = os.getpid()
+        while self._prober_pid == pid:
+            try:
+                self.probe_replicas()
+            except Exception:
+                logger.exception("Replica probe round failed")
+            time.sleep(self._probe_interval)
+
+    def probe_replicas(self) -> Dict[str, bool]:
+        """Probes every known replica once. Returns {fingerprint: healthy}."""
+        return {target_fingerprint(r): self.probe(r) for r in self._all_replicas()}
+
+    def probe(self, conn_str: str, timeout: int = REPLICA_PROBE_TIMEOUT_SECONDS) -> bool:
         """
-        Returns a connection. Tries replicas in round-robin fashion first.
-        Falls back to primary if all replicas are unhealthy or fail.
+        Opens a fresh connection to ``conn_str`` and runs ``SELECT 1``, timing
+        both.  Success closes the replica's circuit straight away (for every
+        worker); failure counts against it.  Pooled connections are not touched.
+        """
+        started = time.monotonic()
+        try:
+            conn = pyodbc.connect(conn_str, timeout=timeout)
+            connected = time.monotonic()
+            try:
+                conn.timeout = timeout
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+                finally:
+                    cursor.close()
+            finally:
+                ConnectionPool._close_quietly(conn)
+            pinged = time.monotonic()
+        except pyodbc.Error as e:
+            state = self._state(conn_str)
+            state.last_probe_at, state.last_probe_ok = time.time(), False
+            self.mark_unhealthy(conn_str, error=str(e)[:200])
+            return False
+        self._record_probe(conn_str, (connected - started) * 1000, (pinged - connected) * 1000)
+        return True
+
+    def _record_probe(self, conn_str: str, connect_ms: float, ping_ms: float) -> None:
+        state = self._state(conn_str)
+        w = self._EWMA_WEIGHT
+        with self._state_lock:
+            state.connect_ms = connect_ms if state.connect_ms is None else w * connect_ms + (1 - w) * state.connect_ms
+            state.ping_ms = ping_ms if state.ping_ms is None else w * ping_ms + (1 - w) * state.ping_ms
+            state.last_probe_at, state.last_probe_ok = time.time(), True
+        target_id = target_fingerprint(conn_str)
+        if self.breakers.state(target_id) != CLOSED:
+            self.breakers.record_success(target_id)
+            logger.info(f"Replica {describe_target(conn_str)} healthy again ({ping_ms:.1f} ms)")
+
+    def replica_health(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-replica circuit state (shared), and this worker's probe latencies
+        and load, keyed by target fingerprint (no credentials).
+        """
+        def _ms(value):
+            return None if value is None else round(value, 2)
+        replicas = self._all_replicas()
+        with self._state_lock:
+            states = [(r, self._replica_state.setdefault(r, _ReplicaState())) for r in replicas]
+            local = {
+                r: {
+                    'connect_ms': _ms(state.connect_ms),
+                    'ping_ms': _ms(state.ping_ms),
+                    'outstanding': state.outstanding,
+                    'last_probe_at': state.last_probe_at,
+                    'last_probe_ok': state.last_probe_ok,
+                }
+                for r, state in states
+            }
+        health = {}
+        for r in replicas:
+            circuit = self.breakers.describe(target_fingerprint(r))
+            health[target_fingerprint(r)] = {
+                'target': describe_target(r),
+                'healthy': circuit['state'] != OPEN,
+                'circuit': circuit,
+                **local[r],
+            }
+        return health
+
+    def get_pool(self, conn_str: str) -> ConnectionPool:
+        """Returns the pool for ``conn_str``, creating it on first use."""
+        pool = self._pools.get(conn_str)
+        if pool is None:
+            with self._pools_lock:
+                pool = self._pools.get(conn_str)
+                if pool is None:
+                    size = self._pool_sizes.get(conn_str, POOL_MAX_SIZE)
+                    pool = self._pools[conn_str] = ConnectionPool(conn_str, max_size=size)
+        return pool
+
+    def set_pool_size(self, conn_str: str, size: int) -> None:
+        """
+        Sizes this process's pool for ``conn_str`` (default POOL_MAX_SIZE),
+        e.g. to the number of query slots its target can grant, so that a
+        query holding a slot never waits for a connection.
+        """
+        with self._pools_lock:
+            self._pool_sizes[conn_str] = size
+            pool = self._pools.get(conn_str)
+        if pool is not None:
+            pool.resize(size)
+
+    def _load(self, conn_str: str) -> float:
+        # Called with _state_lock held, so not through _state().
+        state = self._replica_state.setdefault(conn_str, _ReplicaState())
+        latency = state.ping_ms if state.ping_ms is not None else self._UNPROBED_LATENCY_MS
+        return (state.outstanding + 1) * max(latency, 0.1)
+
+    def _pick_replica(self, replicas: List[str]) -> Optional[str]:
+        """The less loaded of two random healthy ``replicas``, or None when none is healthy."""
+        healthy = [r for r in replicas if self._is_healthy(r)]
+        if len(healthy) <= 1:
+            return healthy[0] if healthy else None
+        with self._state_lock:
+            return min(random.sample(healthy, 2), key=self._load)
+
+    def _route(self, force_primary: bool = False, conn_str: Optional[str] = None) -> List[str]:
+        """
+        Returns the connection strings to try, in order.  One healthy replica
+        of ``conn_str`` (default: the env-configured primary), if any — see
+        ``_pick_replica`` — then the primary itself as fallback.
         """
         targets = []
-        if not force_primary and self.replicas:
-            # Filter healthy replicas
-            healthy = [r for r in self.replicas if self._is_healthy(r)]
-            if healthy:
-                # Atomic round-robin: lock covers both the read and write of _last_index
-                # so concurrent threads never see the same index or an out-of-range value.
-                with self._index_lock:
-                    self._last_index = (self._last_index + 1) % len(healthy)
-                    idx = self._last_index
-                targets.append(healthy[idx])
-        
+        replicas = self._replicas_for(conn_str)
+        if not force_primary and replicas:
+            self._ensure_prober()
+            replica = self._pick_replica(replicas)
+            if replica is not None:
+                targets.append(replica)
+
         # Always fallback/default to primary
-        targets.append(self.primary)
+        targets.append(conn_str or self.primary)
+        return targets
+
+    @contextmanager
+    def connection(
+        self,
+        conn_str: Optional[str] = None,
+        force_primary: bool = False,
+        connect_timeout: int = 2,
+        checkout_timeout: float = QUERY_TIMEOUT_SECONDS,
+    ) -> Iterator[pyodbc.Connection]:
+        """
+        Borrows a pooled connection for the duration of the ``with`` block.
+
+        ``conn_str``: per-assessment target; when omitted the env-configured
+        primary is used.  Either way, a healthy replica registered for the
+        target is tried first unless ``force_primary``.  Targets whose circuit
+        is open, or whose pool stays full for ``checkout_timeout``, are
+        skipped; the last error (TargetUnavailable, PoolTimeout or the connect
+        error) is raised if that leaves none.
+
+        The connection is returned to its pool afterwards, or discarded if the
+        block raised anything other than a statement-level pyodbc error.
+        Callers must close their cursors before leaving the block.
+        """
+        targets = self._route(force_primary, conn_str)
 
-        last_error = None
-        for conn_str in targets:
+        last_error: Optional[Exception] = None
+        pool = conn = None
+        for target in targets:
+            target_id = target_fingerprint(target)
+            circuit = self.breakers.allow(target_id)
+            if circuit is None:
+                last_error = TargetUnavailable(
+                    "The database is not accepting connections right now. Please try again shortly."
+                )
+                continue
+            pool = self.get_pool(target)
             try:
-                # pyodbc handles pooling internally when using same connection strings
-                return pyodbc.connect(conn_str, timeout=2)
+                conn = pool.checkout(timeout=checkout_timeout, connect_timeout=connect_timeout)
             except pyodbc.Error as e:
                 last_error = e
-                self.mark_unhealthy(conn_str)
+                self.mark_unhealthy(target, error=str(e)[:200])
+                continue
+            except PoolTimeout as e:
+                # Busy, not broken: no failure is recorded, but the next target is tried.
+                last_error = e
+                self.breakers.release_trial(target_id, circuit)
                 continue
-        
-        raise last_error or Exception("No database targets available.")
+            self.breakers.record_success(target_id, circuit)
+            break
+        if conn is None:
+            raise last_error or Exception("No database targets available.")
+
+        replica = self._state(target) if target != targets[-1] else None
+        if replica is not None:
+            with self._state_lock:
+                replica.outstanding += 1
+        discard = False
+        try:
+            yield conn
+        except _STATEMENT_ERRORS:
+            raise
+        except BaseException:
+            discard = True
+            raise
+        finally:
+            if replica is not None:
+                with self._state_lock:
+                    replica.outstanding -= 1
+            pool.checkin(conn, discard=discard)
+
+    def warm(self, conn_str: Optional[str], size: int, connect_timeout: int = 5) -> Dict[str, Dict[str, Any]]:
+        """
+        Opens connections until ``size`` are idle in this process's pool for
+        ``conn_str`` (default: the env-configured primary) and for each of its
+        replicas.  Returns per-target ``{target, idle, ms, error}`` keyed by
+        fingerprint; a failed connect also counts against that target's circuit.
+        """
+        report = {}
+        for target in self._replicas_for(conn_str) + [conn_str or self.primary]:
+            started = time.monotonic()
+            entry: Dict[str, Any] = {'target': describe_target(target), 'error': None}
+            pool = self.get_pool(target)
+            try:
+                entry['idle'] = pool.fill(size, connect_timeout=connect_timeout)
+            except pyodbc.Error as e:
+                entry['idle'] = pool.stats()['idle']
+                entry['error'] = str(e)[:200]
+                self.mark_unhealthy(target, error=entry['error'])
+            entry['ms'] = round((time.monotonic() - started) * 1000, 1)
+            report[target_fingerprint(target)] = entry
+        return report
+
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-target pool statistics keyed by target fingerprint (no credentials)."""
+        with self._pools_lock:
+            pools = list(self._pools.values())
+        return {
+            target_fingerprint(p.conn_str): {
+                'target': describe_target(p.conn_str),
+                'circuit': self.breakers.state(target_fingerprint(p.conn_str)),
+                **p.stats(),
+            }
+            for p in pools
+        }
 
 db_router = AssessmentDBRouter()
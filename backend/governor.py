@@ -1,29 +1,645 @@
 
+import itertools
+import logging
+import queue
+import random
+import statistics
 import time
 import threading
-from django.core.cache import cache
-from .config import RUN_RATE_LIMIT, MAX_CONCURRENT_QUERY_RUNS
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from uuid import uuid4
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from .config import (
+    QUERY_WAIT_BUDGET_SECONDS, ADAPTIVE_CONCURRENCY, ADAPTIVE_LATENCY_TOLERANCE, ADAPTIVE_MIN_LIMIT, ADAPTIVE_WINDOW_SAMPLES,
+    PREVIEW_RATE_LIMIT, VALIDATE_RATE_LIMIT, SUBMIT_RATE_LIMIT, MAX_CONCURRENT_QUERY_RUNS, QUERY_OVERFLOW_SLOTS, QUERY_PRIORITY_AGING_SECONDS,
+    QUERY_SLOT_LEASE_SECONDS,
+)
+from .db_router import target_fingerprint
 
-# App-wide concurrency cap — intentionally per-process.
-# Each worker process gets its own semaphore of MAX_CONCURRENT_QUERY_RUNS slots.
-# This means total concurrent DB queries across N workers = N * MAX_CONCURRENT_QUERY_RUNS.
-# Reduce MAX_CONCURRENT_QUERY_RUNS proportionally when running multiple workers
-# (e.g. 4 workers → set MAX_CONCURRENT_QUERY_RUNS=5 for the same ~20 total cap).
-query_semaphore = threading.Semaphore(MAX_CONCURRENT_QUERY_RUNS)
+logger = logging.getLogger("QueryBench.Governor")
 
 
-def check_rate_limit(user_id: str) -> bool:
+class QuerySlots:
     """
-    Returns True if the user is within the rate limit (RUN_RATE_LIMIT runs/min).
+    Cluster-wide counting semaphore for query execution slots.
 
-    Uses a fixed 1-minute window keyed by (user_id, current minute bucket).
-    State is stored in Django's cache, so it works correctly across multiple
-    Gunicorn workers when the cache backend is Redis.
+    Each slot is a cache key (``qslots:<name>:<i>``) claimed with cache.add,
+    so every worker process sharing the Django cache (Redis in production)
+    draws from the same ``size`` slots.  Claims are leases: they expire after
+    ``lease_seconds`` unless renewed, and a heartbeat thread renews the
+    leases this process holds, so a crashed worker cannot leak slots for
+    longer than one lease.  With LocMemCache (local development) the slots
+    are per process.
+
+    ``acquire(units=n)`` takes n slots all or nothing: evaluate_submission
+    admits its solution and participant queries as a single unit, because if
+    each query took its own slot, N/2 evaluations holding one slot each while
+    waiting for a second could exhaust the pool and deadlock until timeout.
+    Slots held by this process are interchangeable, so ``release`` may run on
+    a different thread than ``acquire``.
     """
-    bucket = int(time.time() // 60)
-    key = f"rl:{user_id}:{bucket}"
-    # cache.add is atomic: sets key to 0 only if it doesn't already exist.
-    # cache.incr then atomically increments and returns the new count.
-    cache.add(key, 0, timeout=120)  # 2-minute TTL covers the current and prior bucket
-    count = cache.incr(key)
-    return count <= RUN_RATE_LIMIT
+
+    _POLL_MIN_SECONDS = 0.02
+    _POLL_MAX_SECONDS = 0.25
+
+    def __init__(self, size: int, name: str = "query", lease_seconds: int = QUERY_SLOT_LEASE_SECONDS):
+        self.size = size
+        self.name = name
+        self.lease_seconds = max(1, int(lease_seconds))
+        self._keys = [f"qslots:{name}:{i}" for i in range(size)]
+        self._held: Dict[str, str] = {}      # slot key -> lease token, for this process
+        self._cond = threading.Condition()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def resize(self, size: int) -> None:
+        """
+        Changes the number of slots.  After a shrink, leases held on the dropped
+        slots are not counted, so the smaller size binds fully once they finish.
+        """
+        if size != self.size:
+            self.size = size
+            self._keys = [f"qslots:{self.name}:{i}" for i in range(size)]
+
+    def acquire(self, timeout: Optional[float] = None, units: int = 1) -> bool:
+        """Takes ``units`` slots, waiting up to ``timeout`` seconds. Returns False on timeout."""
+        if units > self.size:
+            return False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        poll = self._POLL_MIN_SECONDS
+        while True:
+            if self._try_claim(units):
+                self._ensure_heartbeat()
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            # Wake early when a slot is released in this process; slots freed
+            # by other workers (or by lease expiry) are picked up by polling.
+            with self._cond:
+                self._cond.wait(poll if remaining is None else min(poll, remaining))
+            poll = min(poll * 2, self._POLL_MAX_SECONDS)
+
+    def _try_claim(self, units: int) -> bool:
+        taken = cache.get_many(self._keys)
+        free = [k for k in self._keys if k not in taken]
+        if len(free) < units:
+            return False
+        random.shuffle(free)  # spread contending workers over different keys
+        claimed = []
+        for key in free:
+            token = uuid4().hex
+            if cache.add(key, token, timeout=self.lease_seconds):
+                claimed.append((key, token))
+                if len(claimed) == units:
+                    break
+        if len(claimed) < units:
+            # Lost a race for the last free slots — give back the partial claim.
+            for key, token in claimed:
+                self._drop(key, token)
+            return False
+        with self._cond:
+            self._held.update(claimed)
+        return True
+
+    def release(self, units: int = 1) -> None:
+        with self._cond:
+            released = [self._held.popitem() for _ in range(min(units, len(self._held)))]
+            self._cond.notify_all()
+        for key, token in released:
+            self._drop(key, token)
+
+    @staticmethod
+    def _drop(key: str, token: str) -> None:
+        # Only delete our own lease — it may have expired and been re-claimed.
+        if cache.get(key) == token:
+            cache.delete(key)
+
+    def _ensure_heartbeat(self) -> None:
+        with self._cond:
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(
+                    target=self._renew_leases, name=f"qslots-{self.name}-heartbeat", daemon=True,
+                )
+                self._heartbeat.start()
+
+    def _renew_leases(self) -> None:
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._cond:
+                held = list(self._held.items())
+            if not held:
+                continue
+            for key, token in held:
+                if not cache.touch(key, timeout=self.lease_seconds):
+                    logger.warning(f"Query slot lease {key} expired before renewal")
+
+    @property
+    def in_use(self) -> int:
+        """Slots currently held across the cluster."""
+        return len(cache.get_many(self._keys))
+
+    def occupancy(self) -> Dict[str, int]:
+        """``{'size', 'in_use' (cluster-wide), 'held_here' (this process)}``."""
+        return {'size': self.size, 'in_use': self.in_use, 'held_here': len(self._held)}
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit for one target database, driven by the latency
+    of the queries it runs.
+
+    Query durations are collected in windows of ADAPTIVE_WINDOW_SAMPLES.
+    At the end of each window the median is compared with the target's
+    baseline (the lowest median seen, drifting slowly towards recent ones):
+
+    - any query timed out      -> limit halves;
+    - median > baseline x ADAPTIVE_LATENCY_TOLERANCE -> limit shrinks by 10% (at least 1);
+    - otherwise (latency flat) -> limit grows by 1.
+
+    The limit starts at ``ceiling`` (the static per-database budget), so
+    turning this on never lowers capacity before latency says so, and stays
+    between ADAPTIVE_MIN_LIMIT and the ceiling.  Limit, baseline and the recent changes live in the
+    shared cache, so every worker enforces and feeds the same limit.
+    """
+
+    _REFRESH_SECONDS = 2.0
+    _HISTORY_LENGTH = 50
+
+    def __init__(self, target_id: str, ceiling: int):
+        self.target_id = target_id
+        self.ceiling = ceiling
+        self._state_key = f"qlimit:{target_id}"
+        self._history_key = f"qlimit:hist:{target_id}"
+        self._samples: list = []
+        self._timeouts = 0
+        self._limit = ceiling
+        self._refreshed = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        """The limit in force (re-read from the cache every couple of seconds)."""
+        now = time.monotonic()
+        if now - self._refreshed >= self._REFRESH_SECONDS:
+            self._refreshed = now
+            state = cache.get(self._state_key)
+            if state is not None:
+                self._limit = state['limit']
+        return max(1, min(self._limit, self.ceiling))
+
+    def record(self, duration_ms: float, timed_out: bool = False) -> None:
+        """Adds one finished query; closes the window once it is full."""
+        with self._lock:
+            self._samples.append(duration_ms)
+            self._timeouts += int(timed_out)
+            if len(self._samples) < ADAPTIVE_WINDOW_SAMPLES:
+                return
+            samples, timeouts = self._samples, self._timeouts
+            self._samples, self._timeouts = [], 0
+        self._adjust(statistics.median(samples), timeouts)
+
+    def _adjust(self, p50_ms: float, timeouts: int) -> None:
+        state = cache.get(self._state_key) or {'limit': self.ceiling, 'baseline_ms': p50_ms}
+        limit, baseline = min(state['limit'], self.ceiling), state['baseline_ms']
+
+        if timeouts:
+            new_limit, reason = limit // 2, 'timeouts'
+        elif p50_ms > baseline * ADAPTIVE_LATENCY_TOLERANCE:
+            new_limit, reason = min(limit - 1, int(limit * 0.9)), 'latency'
+        else:
+            new_limit, reason = limit + 1, 'steady'
+        new_limit = max(min(ADAPTIVE_MIN_LIMIT, self.ceiling), min(new_limit, self.ceiling))
+        # Follow improvements at once, degradations slowly: a dataset that became
+        # permanently slower eventually becomes the new normal.
+        baseline = p50_ms if p50_ms < baseline else baseline * 0.95 + p50_ms * 0.05
+
+        cache.set(self._state_key, {'limit': new_limit, 'baseline_ms': baseline}, timeout=None)
+        self._limit, self._refreshed = new_limit, time.monotonic()
+        if new_limit != limit:
+            logger.info(f"Target {self.target_id}: concurrency limit {limit} -> {new_limit} ({reason}, p50 {p50_ms:.0f}ms)")
+            history = cache.get(self._history_key) or []
+            history.append({
+                'at': time.time(), 'limit': new_limit, 'reason': reason,
+                'p50_ms': round(p50_ms, 1), 'baseline_ms': round(baseline, 1),
+            })
+            cache.set(self._history_key, history[-self._HISTORY_LENGTH:], timeout=None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """``{'limit', 'ceiling', 'baseline_ms', 'history'}`` for dashboards."""
+        state = cache.get(self._state_key) or {}
+        return {
+            'limit': self.current(),
+            'ceiling': self.ceiling,
+            'baseline_ms': state.get('baseline_ms'),
+            'history': cache.get(self._history_key) or [],
+        }
+
+
+# Scheduling classes for query admission, highest priority first.
+PRIORITY_SUBMIT = 0      # graded submit_answer
+PRIORITY_VALIDATE = 1    # validate_query / practice checks, admin tooling, schema introspection
+PRIORITY_PREVIEW = 2     # run_query previews
+_PRIORITY_NAMES = {PRIORITY_SUBMIT: 'submit', PRIORITY_VALIDATE: 'validate', PRIORITY_PREVIEW: 'preview'}
+
+
+class QueueEstimate:
+    """Queue position (1 = next; 0 = not queued) and estimated wait for a new query."""
+
+    __slots__ = ('position', 'wait_seconds')
+
+    def __init__(self, position: int, wait_seconds: float):
+        self.position = position
+        self.wait_seconds = wait_seconds
+
+    @property
+    def overloaded(self) -> bool:
+        """True when the wait exceeds QUERY_WAIT_BUDGET_SECONDS and the query should be shed."""
+        return self.wait_seconds > QUERY_WAIT_BUDGET_SECONDS
+
+
+class _Waiter:
+    __slots__ = ('units', 'priority', 'user_id', 'enqueued', 'granted')
+
+    def __init__(self, units: int, priority: int, user_id: str):
+        self.units = units
+        self.priority = priority
+        self.user_id = user_id
+        self.enqueued = time.monotonic()
+        self.granted = threading.Event()
+
+
+class Bulkhead:
+    """
+    The query slots of one target database: its own QuerySlots budget, plus
+    slots borrowed from the overflow pool shared by all targets when the own
+    budget is full.  Like QuerySlots, ``acquire(units=n)`` is all or nothing
+    (the n slots come from one pool) and held slots are interchangeable.
+
+    When no slot is free, callers queue and are admitted by a scheduler
+    rather than in arrival order:
+
+    - priority classes: PRIORITY_SUBMIT before PRIORITY_VALIDATE before
+      PRIORITY_PREVIEW;
+    - fairness: within a class, users take turns (round robin), so one user
+      queueing many queries cannot starve the others;
+    - starvation protection: a class is promoted one level for every
+      QUERY_PRIORITY_AGING_SECONDS its oldest waiter has been queued.
+
+    Scheduling is per process; slots themselves are shared cluster-wide, so
+    across workers the queues compete by polling.
+    """
+
+    _POLL_MIN_SECONDS = 0.02
+    _POLL_MAX_SECONDS = 0.25
+
+    def __init__(self, target_id: str, size: int, overflow: QuerySlots,
+                 aging_seconds: float = QUERY_PRIORITY_AGING_SECONDS):
+        self.target_id = target_id
+        self.size = size   # static budget; the ceiling of the adaptive limit
+        self.limiter = AdaptiveLimit(target_id, size) if ADAPTIVE_CONCURRENCY else None
+        self.own = QuerySlots(self.limiter.current() if self.limiter else size, name=f"t:{target_id}")
+        self.overflow = overflow
+        self.aging_seconds = aging_seconds
+        self._borrowed = 0
+        self._service_seconds: Optional[float] = None   # moving average of query durations
+        # priority -> user id -> that user's waiters, oldest first; dict order is the round robin.
+        self._queues: Dict[int, Dict[str, Deque[_Waiter]]] = {}
+        self._waiting = 0
+        self._lock = threading.RLock()
+
+    def acquire(self, timeout: Optional[float] = None, units: int = 1,
+                priority: int = PRIORITY_VALIDATE, user_id: str = "") -> bool:
+        """
+        Takes ``units`` slots, waiting up to ``timeout`` seconds behind
+        higher-priority and other users' queries. Returns False on timeout.
+        """
+        with self._lock:
+            if not self._waiting and self._try_claim(units):
+                return True
+            if timeout is not None and self._estimate(priority).wait_seconds > timeout:
+                return False   # would not be admitted in time anyway — fail now, not after waiting
+            waiter = _Waiter(units, priority, user_id)
+            self._queues.setdefault(priority, {}).setdefault(user_id, deque()).append(waiter)
+            self._waiting += 1
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        poll = self._POLL_MIN_SECONDS
+        while True:
+            # Slots freed by other workers (or expired leases) are only noticed
+            # by polling; local releases dispatch straight away.
+            self._dispatch()
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if waiter.granted.wait(poll if remaining is None else max(0.0, min(poll, remaining))):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                with self._lock:
+                    if waiter.granted.is_set():
+                        return True
+                    self._dequeue(waiter)
+                return False
+            poll = min(poll * 2, self._POLL_MAX_SECONDS)
+
+    def capacity(self) -> int:
+        """The most slots one acquire() can ever be granted (its units all come from one pool)."""
+        own = self.limiter.current() if self.limiter else self.own.size
+        return max(own, self.overflow.size)
+
+    def set_size(self, size: int) -> None:
+        """Sets the static budget (the adaptive limit's ceiling when adaptive concurrency is on)."""
+        self.size = size
+        if self.limiter:
+            self.limiter.ceiling = size
+            size = self.limiter.current()
+        self.own.resize(size)
+
+    def record(self, duration_ms: float, timed_out: bool = False) -> None:
+        """Feeds a finished query's duration to the service-time average and the adaptive limit."""
+        seconds = duration_ms / 1000
+        with self._lock:
+            self._service_seconds = seconds if self._service_seconds is None \
+                else self._service_seconds * 0.8 + seconds * 0.2
+        if self.limiter:
+            self.limiter.record(duration_ms, timed_out)
+
+    def estimate(self, priority: int = PRIORITY_VALIDATE) -> "QueueEstimate":
+        """Where a query of class ``priority`` would queue now, and roughly how long it would wait."""
+        with self._lock:
+            return self._estimate(priority)
+
+    def _estimate(self, priority: int) -> "QueueEstimate":
+        # Queries of the same or a higher class go first; each wave of
+        # ``size`` queries takes about one average query duration.
+        ahead = sum(
+            len(q) for p, users in self._queues.items() if p <= priority for q in users.values()
+        )
+        if not ahead or self._service_seconds is None:
+            return QueueEstimate(ahead, 0.0)
+        return QueueEstimate(ahead + 1, (ahead + 1) * self._service_seconds / max(1, self.own.size))
+
+    def _try_claim(self, units: int) -> bool:
+        if self.limiter:
+            self.own.resize(self.limiter.current())
+        if self.own.acquire(timeout=0, units=units):
+            return True
+        if self.overflow.acquire(timeout=0, units=units):
+            self._borrowed += units
+            return True
+        return False
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        now = time.monotonic()
+        best, best_rank = None, None
+        for priority, users in self._queues.items():
+            if not users:
+                continue
+            oldest = min(q[0].enqueued for q in users.values())
+            promoted = int((now - oldest) / self.aging_seconds) if self.aging_seconds > 0 else 0
+            rank = (priority - promoted, priority)
+            if best_rank is None or rank < best_rank:
+                best_rank = rank
+                best = next(iter(users.values()))[0]   # the user whose turn it is
+        return best
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        users = self._queues[waiter.priority]
+        queue = users[waiter.user_id]
+        queue.remove(waiter)
+        self._waiting -= 1
+        if not queue:
+            del users[waiter.user_id]
+
+    def _dispatch(self) -> None:
+        """Admits queued waiters in scheduling order while slots are free."""
+        with self._lock:
+            while self._waiting:
+                waiter = self._next_waiter()
+                if waiter is None or not self._try_claim(waiter.units):
+                    return
+                self._dequeue(waiter)
+                users = self._queues[waiter.priority]
+                if waiter.user_id in users:
+                    users[waiter.user_id] = users.pop(waiter.user_id)   # back of the round robin
+                waiter.granted.set()
+
+    def release(self, units: int = 1) -> None:
+        # Hand borrowed slots back to the shared pool first.
+        with self._lock:
+            borrowed = min(units, self._borrowed)
+            self._borrowed -= borrowed
+        if borrowed:
+            self.overflow.release(borrowed)
+        if units > borrowed:
+            self.own.release(units - borrowed)
+        self._dispatch()
+
+    def occupancy(self) -> Dict[str, Any]:
+        """
+        The own budget's occupancy plus ``borrowed`` (overflow slots this
+        process holds for the target), ``waiting`` (queued here, per class),
+        ``estimated_wait_seconds`` for a new lowest-class query and, with adaptive concurrency, ``adaptive`` (AdaptiveLimit.snapshot).
+        """
+        with self._lock:
+            waiting = {
+                _PRIORITY_NAMES.get(priority, str(priority)): sum(len(q) for q in users.values())
+                for priority, users in self._queues.items() if users
+            }
+        result = {
+            **self.own.occupancy(), 'borrowed': self._borrowed, 'waiting': waiting,
+            'estimated_wait_seconds': round(self.estimate(PRIORITY_PREVIEW).wait_seconds, 2),
+        }
+        if self.limiter:
+            result['adaptive'] = self.limiter.snapshot()
+        return result
+
+
+class PriorityExecutor:
+    """
+    Fixed pool of daemon threads running submitted callables lowest
+    ``priority`` first (FIFO within a priority), so queued async validations
+    are picked up before queued previews.  Threads start on first submit.
+    """
+
+    def __init__(self, max_workers: int, name: str):
+        self.max_workers = max_workers
+        self.name = name
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._threads: list = []
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[[], Any], priority: int = PRIORITY_VALIDATE) -> None:
+        self._queue.put((priority, next(self._seq), fn))
+        with self._lock:
+            while len(self._threads) < self.max_workers:
+                t = threading.Thread(target=self._work, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _work(self) -> None:
+        while True:
+            _, _, fn = self._queue.get()
+            try:
+                fn()
+            except Exception:
+                logger.exception(f"{self.name}: job raised")
+
+
+class Bulkheads:
+    """
+    Per-target query admission.  Each target database (connection string
+    fingerprint, or "primary" for the env-configured router) gets its own
+    Bulkhead, so a slow or overloaded database can only exhaust its own
+    budget and the shared overflow pool, never the slots of other targets.
+
+    Budget sizes come from DatabaseConfig.max_concurrent_queries, registered
+    with configure() when the connection string is built; unconfigured
+    targets get ``default_size``.
+    """
+
+    def __init__(self, default_size: int, overflow_size: int):
+        self.default_size = default_size
+        self.overflow = QuerySlots(overflow_size, name="overflow")
+        self._targets: Dict[str, Bulkhead] = {}
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _target_id(conn_str: Optional[str]) -> str:
+        return target_fingerprint(conn_str) if conn_str else "primary"
+
+    def configure(self, conn_str: Optional[str], size: Optional[int]) -> None:
+        """Sets the budget size for a target (None = default_size)."""
+        target_id = self._target_id(conn_str)
+        size = size or self.default_size
+        with self._lock:
+            self._sizes[target_id] = size
+            bulkhead = self._targets.get(target_id)
+        if bulkhead is not None:
+            bulkhead.set_size(size)
+
+    def for_target(self, conn_str: Optional[str]) -> Bulkhead:
+        target_id = self._target_id(conn_str)
+        with self._lock:
+            bulkhead = self._targets.get(target_id)
+            if bulkhead is None:
+                size = self._sizes.get(target_id, self.default_size)
+                bulkhead = self._targets[target_id] = Bulkhead(target_id, size, self.overflow)
+            return bulkhead
+
+    def occupancy(self) -> Dict[str, Any]:
+        """``{'targets': {target id: occupancy}, 'overflow': occupancy}`` for targets this process has used."""
+        with self._lock:
+            targets = dict(self._targets)
+        return {
+            'targets': {target_id: b.occupancy() for target_id, b in targets.items()},
+            'overflow': self.overflow.occupancy(),
+        }
+
+
+# Query concurrency caps, shared by every worker process through the cache:
+# each target database runs at most its budget (MAX_CONCURRENT_QUERY_RUNS by
+# default) plus whatever it borrows from the QUERY_OVERFLOW_SLOTS shared pool,
+# however many Gunicorn workers there are.
+query_bulkheads = Bulkheads(MAX_CONCURRENT_QUERY_RUNS, QUERY_OVERFLOW_SLOTS)
+
+
+class RateLimitResult:
+    """Outcome of check_rate_limit; truthy when the call is allowed."""
+
+    __slots__ = ('allowed', 'remaining', 'retry_after')
+
+    def __init__(self, allowed: bool, remaining: int, retry_after: float):
+        self.allowed = allowed
+        self.remaining = remaining        # whole tokens left after this call
+        self.retry_after = retry_after    # seconds until the next call would be allowed (0 if allowed)
+
+    def __bool__(self) -> bool:
+        return self.allowed
+
+    def __repr__(self) -> str:
+        return f"RateLimitResult(allowed={self.allowed}, remaining={self.remaining}, retry_after={self.retry_after:.2f})"
+
+
+# Token bucket per (kind, user): holds up to ``limit`` tokens, refilled at
+# limit / 60 tokens per second; each call takes one.  Unlike a fixed
+# one-minute window this never admits 2x the limit across a window boundary.
+RATE_LIMITS = {
+    'preview': PREVIEW_RATE_LIMIT,
+    'validate': VALIDATE_RATE_LIMIT,
+    'submit': SUBMIT_RATE_LIMIT,
+}
+
+# Refill, take and persist in one Redis round trip.  The clock is Redis's own
+# (TIME), so workers with skewed clocks agree.  Returns {allowed, tokens, retry_after}
+# with the floats as strings (Lua numbers are truncated to integers on return).
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed, retry_after = 0, (1 - tokens) / rate
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed, retry_after = 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+_token_bucket_script = None
+_local_bucket_lock = threading.Lock()
+
+
+def _take_token(tokens: float, ts: float, now: float, capacity: int, rate: float) -> Tuple[bool, float, float]:
+    """The bucket arithmetic of _TOKEN_BUCKET_LUA: ``(allowed, tokens left, retry_after)``."""
+    tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / rate
+
+
+def check_rate_limit(user_id: str, kind: str = 'submit') -> RateLimitResult:
+    """
+    Takes one token from the user's bucket for ``kind`` ("preview",
+    "validate" or "submit"; limits in RATE_LIMITS, per minute).
+
+    With Redis the whole check is one atomic script call, shared by every
+    Gunicorn worker.  Other cache backends (LocMemCache in development) run
+    the same arithmetic under a process lock, so it is exact per process.
+    A limit of 0 (or less) turns rate limiting off for that kind.
+    """
+    limit = RATE_LIMITS[kind]
+    if limit <= 0:
+        return RateLimitResult(True, 0, 0.0)
+    rate = limit / 60.0
+    key = f"rl:{kind}:{user_id}"
+
+    backend = caches['default']   # the backend itself; ``cache`` is a proxy to it
+    # Django's RedisCache has no public way to reach the redis client, so its
+    # (private) RedisCacheClient is used when present; should that ever change,
+    # the local path below still limits, just per process.
+    get_client = getattr(getattr(backend, '_cache', None), 'get_client', None)
+    if isinstance(backend, RedisCache) and get_client is not None:
+        global _token_bucket_script
+        full_key = backend.make_and_validate_key(key)
+        client = get_client(full_key, write=True)
+        if _token_bucket_script is None:
+            _token_bucket_script = client.register_script(_TOKEN_BUCKET_LUA)
+        allowed, tokens, retry_after = _token_bucket_script(keys=[full_key], args=[limit, rate], client=client)
+        return RateLimitResult(bool(int(allowed)), int(float(tokens)), float(retry_after))
+
+    ttl = int(limit / rate) + 1   # an untouched bucket is full again by then
+    with _local_bucket_lock:
+        now = time.time()
+        tokens, ts = cache.get(key) or (limit, now)
+        allowed, tokens, retry_after = _take_token(tokens, ts, now, limit, rate)
+        cache.set(key, (tokens, now), timeout=ttl)
+    return RateLimitResult(allowed, int(tokens), retry_after)
@@ -0,0 +1,213 @@
+"""
+backend/result_cache.py — Django-cache memoisation of evaluation results.
+
+A question's solution (gold) result does not change during an exam, so
+evaluate_submission caches it instead of re-running the solution query on
+every submit_answer / validate_query call.  It also caches graded verdicts
+per canonicalised participant query, so the same answer submitted again
+(by anyone) is not executed again.
+
+Cache keys
+----------
+    solres:<value format>:<target fingerprint>:<dataset version>:<question id>.<question version>:<solution sql hash>
+
+    - value format:       bumped whenever the cached value shape changes
+                          (currently ``(ResultSet, error)``), so a deploy never
+                          reads entries written by older code.
+
+    - target fingerprint: hash of the connection string (db_router.target_fingerprint),
+      or "primary" for the env-configured router targets.
+    - dataset version:    token bumped by invalidate_target() — admins call it
+                          when the data behind a DatabaseConfig changes.
+    - question version:   token bumped by invalidate_question().
+    - solution sql hash:  editing a solution query naturally misses the old entry.
+
+    Checksum-graded questions cache the solution fingerprint under the same
+    key with a ``:checksum`` suffix.
+
+    verdict:<target fingerprint>:<dataset version>:<question id>.<question version>:<solution sql hash>:<variant>:<participant sql hash>
+
+    - variant:            grading settings the verdict depends on (grading mode, order sensitivity).
+    - participant sql hash: hash of sql_eval.canonicalize_sql(participant query).
+
+Single-flight
+-------------
+get_or_compute() makes sure concurrent misses for the same key run the
+computation once: threads in the same process wait on the leader's result
+directly; other processes wait on a short-lived lock key in the shared cache
+and pick the value up once the leader stores it.
+"""
+
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from .config import QUERY_TIMEOUT_SECONDS, SOLUTION_CACHE_TTL_SECONDS, VERDICT_CACHE_TTL_SECONDS
+from .db_router import target_fingerprint
+
+# Cached values are (sql_eval.ResultSet, error) pairs, or (sql_eval.ResultChecksum, error)
+# under "checksum" keys.
+_VALUE_FORMAT = "rs1"
+_TARGET_VERSION_KEY = "solres:ver:t:{}"
+_QUESTION_VERSION_KEY = "solres:ver:q:{}"
+
+# Followers wait at most this long for a leader before computing themselves:
+# enough for the leader to queue for a query slot and then run the query.
+_FLIGHT_WAIT_SECONDS = QUERY_TIMEOUT_SECONDS * 2 + 2
+_LOCK_POLL_SECONDS = 0.05
+
+
+def _target_id(conn_str: Optional[str]) -> str:
+    return target_fingerprint(conn_str) if conn_str else "primary"
+
+
+def _sql_hash(sql: str) -> str:
+    return hashlib.sha256(sql.strip().encode()).hexdigest()[:24]
+
+
+def _versioned(conn_str: Optional[str], question_id: str, solution_query: str) -> str:
+    """``<target>:<dataset version>:<question id>.<question version>:<solution sql hash>`` (one cache round trip)."""
+    target = _target_id(conn_str)
+    t_key = _TARGET_VERSION_KEY.format(target)
+    q_key = _QUESTION_VERSION_KEY.format(question_id)
+    versions = cache.get_many([t_key, q_key])
+    return (
+        f"{target}:{versions.get(t_key, '0')}:"
+        f"{question_id}.{versions.get(q_key, '0')}:{_sql_hash(solution_query)}"
+    )
+
+
+def solution_cache_key(conn_str: Optional[str], question_id: str, solution_query: str, kind: str = "rows") -> str:
+    """
+    Builds the versioned cache key for a solution result (one cache round trip).
+    ``kind`` separates other cached forms of the same solution, e.g. "checksum"
+    for the server-side fingerprint used by checksum grading.
+    """
+    key = f"solres:{_VALUE_FORMAT}:{_versioned(conn_str, question_id, solution_query)}"
+    return key if kind == "rows" else f"{key}:{kind}"
+
+
+def verdict_cache_key(
+    conn_str: Optional[str],
+    question_id: str,
+    solution_query: str,
+    canonical_sql: str,
+    variant: str = "",
+) -> str:
+    """
+    Builds the versioned cache key for the verdict on one participant query.
+    ``canonical_sql`` is sql_eval.canonicalize_sql(participant query);
+    ``variant`` encodes grading settings that change the verdict.
+    """
+    return (
+        f"verdict:{_versioned(conn_str, question_id, solution_query)}:"
+        f"{variant}:{_sql_hash(canonical_sql)}"
+    )
+
+
+def peek_verdict(key: str) -> Optional[Dict[str, Any]]:
+    """Returns the cached verdict dict for ``key``, or None."""
+    return cache.get(key) if VERDICT_CACHE_TTL_SECONDS > 0 else None
+
+
+def store_verdict(key: str, verdict: Dict[str, Any]) -> None:
+    """Caches a graded evaluate_submission result (CORRECT / INCORRECT only)."""
+    if VERDICT_CACHE_TTL_SECONDS > 0 and verdict.get("status") in ("CORRECT", "INCORRECT"):
+        cache.set(key, verdict, timeout=VERDICT_CACHE_TTL_SECONDS)
+
+
+def invalidate_target(conn_str: Optional[str]) -> None:
+    """Drops every cached solution result and verdict for a database target (new dataset version)."""
+    cache.set(_TARGET_VERSION_KEY.format(_target_id(conn_str)), uuid4().hex[:8], timeout=None)
+
+
+def invalidate_question(question_id) -> None:
+    """Drops every cached solution result and verdict for one question, on all targets."""
+    cache.set(_QUESTION_VERSION_KEY.format(question_id), uuid4().hex[:8], timeout=None)
+
+
+def peek(key: str) -> Any:
+    """Returns the cached value for ``key`` or None, without computing anything."""
+    return cache.get(key) if SOLUTION_CACHE_TTL_SECONDS > 0 else None
+
+
+class _Flight:
+    """An in-process computation that followers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+
+
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_or_compute(
+    key: str,
+    compute: Callable[[], Tuple[Any, bool]],
+    ttl: int = SOLUTION_CACHE_TTL_SECONDS,
+) -> Tuple[Any, str]:
+    """
+    Returns ``(value, cache_status)`` where cache_status is "hit", "miss" or
+    "disabled" (ttl <= 0).
+
+    ``compute`` returns ``(value, cacheable)``; only cacheable values are
+    stored (errors are not), but in-process followers still receive the
+    leader's value rather than repeating a failing computation.
+    """
+    if ttl <= 0:
+        value, _ = compute()
+        return value, "disabled"
+
+    value = cache.get(key)
+    if value is not None:
+        return value, "hit"
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        if flight.done.wait(_FLIGHT_WAIT_SECONDS):
+            return flight.value, "hit"
+        value, _ = compute()
+        return value, "miss"
+
+    try:
+        value, status = _compute_with_cluster_lock(key, compute, ttl)
+        flight.value = value
+        return value, status
+    finally:
+        flight.done.set()
+        with _flights_lock:
+            _flights.pop(key, None)
+
+
+def _compute_with_cluster_lock(key: str, compute, ttl: int) -> Tuple[Any, str]:
+    lock_key = f"{key}:lock"
+    token = uuid4().hex
+    deadline = time.monotonic() + _FLIGHT_WAIT_SECONDS
+    locked = cache.add(lock_key, token, timeout=int(_FLIGHT_WAIT_SECONDS))
+    while not locked and time.monotonic() < deadline:
+        # Another worker process is computing this key — wait for its result.
+        time.sleep(_LOCK_POLL_SECONDS)
+        value = cache.get(key)
+        if value is not None:
+            return value, "hit"
+        locked = cache.add(lock_key, token, timeout=int(_FLIGHT_WAIT_SECONDS))
+
+    try:
+        value, cacheable = compute()
+        if cacheable:
+            cache.set(key, value, timeout=ttl)
+        return value, "miss"
+    finally:
+        if locked and cache.get(lock_key) == token:
+            cache.delete(lock_key)
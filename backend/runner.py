@@ -1,18 +1,45 @@
 
-import decimal
-import datetime
 import time
 import pyodbc
 import logging
-from typing import List, Dict, Any, Tuple, Optional
-
-from .config import QUERY_TIMEOUT_SECONDS, MAX_RESULT_ROWS, DECIMAL_PRECISION, CASE_INSENSITIVE_COLUMNS, STRIP_STRINGS
-from .db_router import db_router
-from .governor import query_semaphore, check_rate_limit
-from . import sql_eval
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, List, Tuple, Optional
+
+from .config import (
+    QUERY_TIMEOUT_SECONDS, MAX_RESULT_ROWS, CASE_INSENSITIVE_COLUMNS,
+    CONCURRENT_EVALUATION, COMPARE_FETCH_BATCH_ROWS,
+)
+from .db_router import db_router, PoolTimeout, TargetUnavailable
+from .governor import PRIORITY_SUBMIT, PRIORITY_VALIDATE, query_bulkheads, check_rate_limit
+from . import cancellation, result_cache, sql_eval
 
 logger = logging.getLogger("QueryBench.Runner")
 
+_BUSY_MSG = "Server is busy. Too many queries are running simultaneously. Please try again in a moment."
+_CANCELLED_MSG = "Query cancelled."
+
+
+def _run_pair_leg(fn, *args) -> Future:
+    """
+    Runs the solution half of a concurrent evaluation (see evaluate_submission)
+    on its own thread.  Every such task already holds a query slot, so their
+    number is bounded by the slot budgets (per target, overflow, replicas) —
+    a fixed-size pool could be smaller and leave slot holders queued.
+    """
+    future: Future = Future()
+
+    def _run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=_run, name="qb-eval", daemon=True).start()
+    return future
+
 
 def validate_sql_security(query: str, is_solution: bool = False) -> Tuple[bool, str]:
     """
@@ -30,93 +57,235 @@ def validate_sql_security(query: str, is_solution: bool = False) -> Tuple[bool,
 
 
 def normalize_value(val: Any) -> Any:
-    """Per-cell value normalisation used by execute_query."""
-    if val is None:
-        return None
-    if isinstance(val, decimal.Decimal):
-        return round(float(val), DECIMAL_PRECISION)
-    # datetime.datetime must be checked before datetime.date because datetime is a
-    # subclass of date — reversing the order causes date's .replace() to be called
-    # with microsecond=, which raises TypeError.
-    if isinstance(val, datetime.datetime):
-        return val.replace(microsecond=0).isoformat()
-    if isinstance(val, datetime.date):
-        return val.isoformat()
-    if isinstance(val, str) and STRIP_STRINGS:
-        return val.strip()
-    return val
+    """Per-cell value normalisation (see sql_eval.normalize_value)."""
+    return sql_eval.normalize_value(val)
 
 
 def execute_query(
     query: str,
     user_id: str = "system",
     conn_str: Optional[str] = None,
-) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str], float]:
+    slot_held: bool = False,
+    priority: int = PRIORITY_VALIDATE,
+) -> Tuple[Optional[sql_eval.ResultSet], Optional[str], float]:
     """
     Safely executes a query on SQL Server with enforced row limit (never wraps in a derived table), timeout,
-    and app-wide concurrency control.
+    and per-target concurrency control (governor.query_bulkheads).
 
     - Row limit is always enforced at the outermost SELECT (never by wrapping in a derived table)
     - ORDER BY is always preserved at the top level (never inside a derived table)
     - CTEs and queries with ORDER BY are supported and safe
     - All unsafe or ambiguous SQL is rejected by validate_sql
 
-    ``conn_str``: if provided, connects to that database directly rather
-    than using the router (used for per-assessment database targeting).
+    On success the result is a ``sql_eval.ResultSet`` (column names plus one
+    tuple of normalised values per row); on failure it is None and the
+    error string is set.
+
+    ``conn_str``: if provided, targets that database rather than the router's
+    primary/replica set (used for per-assessment database targeting).  Either
+    way the connection is borrowed from db_router's pool for that target.
+
+    ``slot_held``: the caller already acquired a query slot from this
+    target's bulkhead on this query's behalf (concurrent evaluation admits its
+    pair together); the slot is still released here when the query finishes.
+
+    ``priority``: scheduling class used when the query has to queue for a
+    slot (governor.PRIORITY_SUBMIT / PRIORITY_VALIDATE / PRIORITY_PREVIEW).
     """
-    start_time = time.time()
+    def _fetch_all(cursor, cols):
+        plan = sql_eval.plan_normalizers(cursor.description)
+        # Hard fetch cap in application memory (defence-in-depth)
+        rows = cursor.fetchmany(MAX_RESULT_ROWS)
+        return sql_eval.ResultSet(cols, sql_eval.normalize_rows(rows, plan))
+
+    return _run_select(query, user_id, conn_str, slot_held, _fetch_all, priority=priority)
 
-    # Wait up to QUERY_TIMEOUT_SECONDS for a concurrency slot before giving up.
+
+def compare_query(
+    query: str,
+    expected: sql_eval.ResultSet,
+    order_sensitive: bool = False,
+    user_id: str = "system",
+    conn_str: Optional[str] = None,
+    priority: int = PRIORITY_VALIDATE,
+) -> Tuple[Optional[Tuple[List[str], sql_eval.StreamingComparator]], Optional[str], float]:
+    """
+    Executes a participant query like execute_query, but streams its rows
+    into a ``sql_eval.StreamingComparator`` against ``expected`` instead of
+    materialising them.
+
+    Rows are fetched COMPARE_FETCH_BATCH_ROWS at a time.  Fetching stops —
+    and the statement is cancelled, so the slot and connection are freed —
+    as soon as the columns differ or there are more rows than expected.
+    Once a row cannot occur in ``expected`` the rest (at most MAX_RESULT_ROWS)
+    are only counted, not normalised or compared, so the feedback can still
+    tell a wrong row count from wrong values.
+
+    Returns ``((columns, comparator), error, duration_ms)``.
+    """
+    expected_cols = [c.lower() for c in expected.columns]
+
+    def _stream(cursor, cols):
+        comparator = sql_eval.StreamingComparator(expected, order_sensitive)
+        if [c.lower() for c in cols] != expected_cols:
+            # The column check decides the verdict; no rows are needed.
+            _cancel_statement(cursor)
+            return cols, comparator
+        plan = sql_eval.plan_normalizers(cursor.description)
+        while comparator.count < MAX_RESULT_ROWS:
+            batch = cursor.fetchmany(COMPARE_FETCH_BATCH_ROWS)
+            if not batch:
+                break
+            seen = comparator.count
+            if not comparator.feed(sql_eval.normalize_rows(batch, plan)):
+                if comparator.mismatch != "overflow":
+                    comparator.tally(seen + len(batch) - comparator.count)   # rest of this batch
+                    _count_rest(cursor, comparator)
+                _cancel_statement(cursor)
+                break
+        return cols, comparator
+
+    return _run_select(query, user_id, conn_str, False, _stream, priority=priority)
+
+
+def _count_rest(cursor, comparator: sql_eval.StreamingComparator) -> None:
+    """Counts the remaining rows into ``comparator``, up to MAX_RESULT_ROWS in all (as execute_query reads)."""
+    while comparator.count < MAX_RESULT_ROWS:
+        batch = cursor.fetchmany(min(COMPARE_FETCH_BATCH_ROWS, MAX_RESULT_ROWS - comparator.count))
+        if not batch:
+            break
+        comparator.tally(len(batch))
+
+
+def checksum_query(
+    query: str,
+    user_id: str = "system",
+    conn_str: Optional[str] = None,
+    expected_columns: Optional[List[str]] = None,
+    priority: int = PRIORITY_VALIDATE,
+) -> Tuple[Optional[sql_eval.ResultChecksum], Optional[str], float]:
+    """
+    Fingerprints the complete result of ``query`` inside SQL Server (see
+    sql_eval.checksum_sql) — no row limit, and only the row count and two
+    checksum aggregates cross the wire.
+
+    The columns are described first; if ``expected_columns`` is given and
+    they differ (case-insensitively), the aggregate is skipped and the
+    returned ResultChecksum has ``row_count`` None.
+    """
+    expected = [c.lower() for c in expected_columns] if expected_columns is not None else None
+
+    def _fingerprint(cursor, cols):
+        description = cursor.description
+        result = sql_eval.ResultChecksum(cols, sql_eval.column_signature(description))
+        if expected is not None and [c.lower() for c in cols] != expected:
+            return result
+        cursor.execute(sql_eval.checksum_sql(query, description))
+        row_count, checksum_sum, checksum_agg = cursor.fetchone()
+        result.row_count = int(row_count)
+        result.checksum = (checksum_sum, checksum_agg)
+        return result
+
+    return _run_select(
+        sql_eval.describe_sql(query), user_id, conn_str, False, _fingerprint, rewrite=False, priority=priority,
+    )
+
+
+def _cancel_statement(cursor) -> None:
+    """Tells the server to stop producing rows for a statement we no longer read."""
+    try:
+        cursor.cancel()
+    except Exception:
+        pass  # close() still discards the pending results
+
+
+def _run_select(
+    query: str, user_id: str, conn_str: Optional[str], slot_held: bool, consume,
+    rewrite: bool = True, priority: int = PRIORITY_VALIDATE,
+):
+    """
+    Admission, connection, row-limit rewrite and error handling shared by
+    execute_query, compare_query and checksum_query.
+
+    ``consume(cursor, columns)`` reads the executed statement and returns the
+    success value; it runs while the slot and the pooled connection are held.
+    ``rewrite=False`` executes ``query`` verbatim (no TOP / ORDER BY 1).
+    Returns ``(value, error, duration_ms)``.
+    """
+    start_time = time.time()
+    slots = query_bulkheads.for_target(conn_str)
+    scope = cancellation.current()
+    if scope is not None and scope.cancelled:
+        if slot_held:
+            slots.release()  # the caller's slot is ours to release, as on every other path
+        return None, _CANCELLED_MSG, 0.0
+
+    # Wait up to QUERY_TIMEOUT_SECONDS for a slot in this target's bulkhead before giving up.
     # Without a timeout, all 20+ queued threads would block indefinitely under
     # sustained load, exhausting the thread pool silently.
-    if not query_semaphore.acquire(timeout=QUERY_TIMEOUT_SECONDS):
-        return None, "Server is busy. Too many queries are running simultaneously. Please try again in a moment.", (time.time() - start_time) * 1000
+    if not slot_held and not slots.acquire(timeout=QUERY_TIMEOUT_SECONDS, priority=priority, user_id=user_id):
+        return None, _BUSY_MSG, (time.time() - start_time) * 1000
+    admitted_at = time.time()   # latency fed to the adaptive limit excludes the wait for a slot
 
     try:
-        conn = None
         try:
-            if conn_str:
-                conn = pyodbc.connect(conn_str, timeout=2)
-            else:
-                conn = db_router.get_connection()
-            cursor = conn.cursor()
-
-            # Enforce statement-level query timeout (pyodbc >= 4.0.26 only)
-            try:
-                cursor.timeout = QUERY_TIMEOUT_SECONDS
-            except Exception:
-                pass
-
-            rewritten_sql = sql_eval.apply_row_limit(query)
-            rewritten_sql = sql_eval.ensure_order_by(rewritten_sql)
-            cursor.execute(rewritten_sql)
-
-            cols = [column[0] for column in cursor.description]
-            if CASE_INSENSITIVE_COLUMNS:
-                cols = [c.lower() for c in cols]
-
-            # Hard fetch cap in application memory (defence-in-depth)
-            rows = cursor.fetchmany(MAX_RESULT_ROWS)
-
-            results = [
-                dict(zip(cols, [normalize_value(v) for v in row]))
-                for row in rows
-            ]
-
-            duration_ms = (time.time() - start_time) * 1000
-            logger.info(
-                f"User: {user_id} | Execution Success | "
-                f"Target: {conn.getinfo(pyodbc.SQL_SERVER_NAME)} | "
-                f"Duration: {duration_ms:.1f}ms"
-            )
-            return results, None, duration_ms
-
+            with db_router.connection(conn_str) as conn:
+                cursor = conn.cursor()
+                try:
+                    # Enforce statement-level query timeout (pyodbc >= 4.0.26 only)
+                    try:
+                        cursor.timeout = QUERY_TIMEOUT_SECONDS
+                    except Exception:
+                        pass
+
+                    if rewrite:
+                        rewritten_sql = sql_eval.apply_row_limit(query)
+                        rewritten_sql = sql_eval.ensure_order_by(rewritten_sql)
+                    else:
+                        rewritten_sql = query
+                    # A cancelled job's watchdog calls cursor.cancel() while the statement runs.
+                    with cancellation.watching(cursor):
+                        cursor.execute(rewritten_sql)
+
+                        cols = [column[0] for column in cursor.description]
+                        if CASE_INSENSITIVE_COLUMNS:
+                            cols = [c.lower() for c in cols]
+
+                        value = consume(cursor, cols)
+                finally:
+                    # Close before the connection goes back to the pool so the
+                    # next borrower never sees pending results from this query.
+                    cursor.close()
+
+                duration_ms = (time.time() - start_time) * 1000
+                slots.record((time.time() - admitted_at) * 1000)
+                logger.info(
+                    f"User: {user_id} | Execution Success | "
+                    f"Target: {conn.getinfo(pyodbc.SQL_SERVER_NAME)} | "
+                    f"Duration: {duration_ms:.1f}ms"
+                )
+                return value, None, duration_ms
+
+        except PoolTimeout:
+            return None, _BUSY_MSG, (time.time() - start_time) * 1000
+        except TargetUnavailable as e:
+            logger.warning(f"User: {user_id} | Target unavailable (circuit open)")
+            return None, str(e), (time.time() - start_time) * 1000
+        except cancellation.QueryCancelled:
+            return None, _CANCELLED_MSG, (time.time() - start_time) * 1000
         except pyodbc.Error as e:
             err_msg = str(e)
+            if scope is not None and scope.cancelled:
+                logger.info(f"User: {user_id} | Execution Cancelled ({scope.reason})")
+                return None, _CANCELLED_MSG, (time.time() - start_time) * 1000
             logger.error(f"User: {user_id} | Execution Error: {err_msg}")
 
             if "timeout" in err_msg.lower():
+                slots.record((time.time() - admitted_at) * 1000, timed_out=True)
                 display_msg = "Query execution timed out. Limit your query's complexity or check for missing joins."
+            elif "no column name was specified" in err_msg.lower() or "specified multiple times" in err_msg.lower():
+                # Only reachable in checksum grading, where the query is wrapped in a CTE.
+                display_msg = "Every result column needs a unique name for this question. Add column aliases with AS."
             else:
                 display_msg = f"Database Error: {err_msg[:300]}"
 
@@ -125,11 +294,8 @@ def execute_query(
             err_msg = str(e)
             logger.error(f"User: {user_id} | Unexpected Error: {err_msg}", exc_info=True)
             return None, f"Query execution error: {err_msg[:200]}", (time.time() - start_time) * 1000
-        finally:
-            if conn:
-                conn.close()
     finally:
-        query_semaphore.release()
+        slots.release()
 
 
 def evaluate_submission(
@@ -139,6 +305,11 @@ def evaluate_submission(
     solution_query: str,
     conn_str: Optional[str] = None,
     order_sensitive: bool = False,
+    concurrent: Optional[bool] = None,
+    grading_mode: str = "ROWS",
+    expected: Optional[Any] = None,
+    priority: int = PRIORITY_VALIDATE,
+    check_rate: bool = True,
 ) -> Dict[str, Any]:
     """
     Full deterministic evaluation flow.
@@ -148,78 +319,323 @@ def evaluate_submission(
                          unordered set — ORDER BY in the participant query does
                          not affect the CORRECT/INCORRECT verdict.
                          When True, row order must match the solution exactly.
+    ``concurrent``:    when the solution result is not cached, run the solution
+                         and participant queries at the same time on separate
+                         connections (defaults to CONCURRENT_EVALUATION).  The
+                         pair is admitted as one unit (two slots, atomically),
+                         and a participant error is returned without waiting
+                         for the solution to finish.
+
+    When the solution result is available first (cache hit, or not
+    ``concurrent``) the participant rows are streamed through compare_query and
+    fetching stops at the first row that rules out a CORRECT verdict; the
+    row-count feedback then says "more than N rows" when the exact count was
+    never read.
+
+    ``grading_mode``:  "CHECKSUM" grades the complete, unlimited results by a
+                         fingerprint computed inside SQL Server (row count plus
+                         checksum aggregates) instead of comparing up to
+                         MAX_RESULT_ROWS rows in Python; always order-insensitive.
+
+    ``expected``:      a stored golden result for this question and database
+                         (sql_eval.ResultSet for row grading, sql_eval.ResultChecksum
+                         for checksum grading).  When given, the solution query is
+                         not executed at all.
+
+    ``priority``:      scheduling class for every query this evaluation runs
+                         (governor.PRIORITY_SUBMIT for graded submissions).
+
+    ``check_rate``:    False when the caller already took this call's rate-limit
+                         token (the API checks before queueing work so it can
+                         answer 429 with Retry-After).  A rate-limited result
+                         carries ``retry_after`` in seconds.
+
+    Once the solution has run, ``execution_metadata.solution_cache`` reports
+    whether its result came from the solution-result cache ("hit"/"miss"/"disabled"),
+    or "snapshot" when ``expected`` was supplied.
+
+    Graded verdicts are cached per question, solution, dataset version and
+    canonicalised participant SQL (sql_eval.canonicalize_sql); a repeat of the
+    same query returns the stored verdict with ``verdict_cache: "hit"`` and runs
+    nothing.  The rate limit above still counts it, and callers record the
+    returned verdict (best result etc.) as usual.
     """
-    # 1. Per-user rate limit
-    if not check_rate_limit(user_id):
-        return {"status": "ERROR", "feedback": "Rate limit exceeded. Please wait a moment before submitting again."}
+    # 1. Per-user rate limit (the submit or validate bucket, by priority)
+    if check_rate:
+        limit = check_rate_limit(user_id, "submit" if priority == PRIORITY_SUBMIT else "validate")
+        if not limit:
+            return {
+                "status": "ERROR",
+                "feedback": "Rate limit exceeded. Please wait a moment before submitting again.",
+                "retry_after": limit.retry_after,
+            }
 
     # 2. Security validation (participant only; solution queries are admin-trusted)
     is_safe, msg = validate_sql_security(participant_query)
     if not is_safe:
         return {"status": "INCORRECT", "feedback": msg}
 
-    # 3. Execute solution (gold standard)
-    sol_res, sol_err, _ = execute_query(solution_query, "system_eval", conn_str=conn_str)
-    if sol_err:
-        return {"status": "ERROR", "feedback": "System Error: Failed to generate expected results. Please contact an admin."}
+    # 3. Verdict cache — a query identical after canonicalisation was already
+    #    graded against this solution and dataset version; reuse its verdict.
+    verdict_key = result_cache.verdict_cache_key(
+        conn_str, question_id, solution_query, sql_eval.canonicalize_sql(participant_query),
+        variant=f"{grading_mode}:{int(bool(order_sensitive))}",
+    )
+    verdict = result_cache.peek_verdict(verdict_key)
+    if verdict is not None:
+        metadata = {**verdict.get("execution_metadata", {}), "verdict_cache": "hit"}
+        return {**verdict, "execution_metadata": metadata}
+
+    if grading_mode == "CHECKSUM":
+        result, graded = _evaluate_checksum(
+            user_id, question_id, participant_query, solution_query, conn_str, expected, priority,
+        )
+    else:
+        result, graded = _evaluate_rows(
+            user_id, question_id, participant_query, solution_query, conn_str, order_sensitive, concurrent,
+            expected, priority,
+        )
+    if graded:
+        result_cache.store_verdict(verdict_key, result)
+    return result
 
-    # 4. Execute participant query
-    user_res, user_err, user_dur = execute_query(participant_query, user_id, conn_str=conn_str)
-    if user_err:
-        return {"status": "INCORRECT", "feedback": user_err}
 
-    # 5. Structural checks — column count and names
-    user_cols = list(user_res[0].keys()) if user_res else []
-    sol_cols  = list(sol_res[0].keys())  if sol_res  else []
+def _evaluate_rows(
+    user_id: str,
+    question_id: str,
+    participant_query: str,
+    solution_query: str,
+    conn_str: Optional[str],
+    order_sensitive: bool,
+    concurrent: Optional[bool],
+    expected: Optional[sql_eval.ResultSet] = None,
+    priority: int = PRIORITY_VALIDATE,
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Row grading (steps 4-7 of evaluate_submission).  Returns ``(result, graded)``;
+    ``graded`` is True when the verdict came from comparing the two results
+    (and so may be reused for the same query), False for errors.
+    """
+    # 4-5. Solution (gold standard) and participant query.  The solution
+    #      comes from a golden snapshot or the solution-result cache when
+    #      possible; a cold one is computed either alongside the participant
+    #      query or before it.
+    if expected is not None:
+        sol_key, cached, hit_status = None, (expected, None), "snapshot"
+    else:
+        sol_key = result_cache.solution_cache_key(conn_str, question_id, solution_query)
+        cached, hit_status = result_cache.peek(sol_key), "hit"
+    if concurrent is None:
+        concurrent = CONCURRENT_EVALUATION
+
+    # The participant result is streamed into a comparator against the
+    # solution whenever the solution is known first, so a wrong answer stops
+    # fetching at its first impossible row.  The concurrent path has no
+    # solution to compare against yet and materialises the result instead.
+    user_cmp = user_err = user_dur = None
+    total_rows = None   # participant row count, when every row was read
+    if cached is not None:
+        (sol_res, sol_err), cache_status = cached, hit_status
+        if not sol_err:
+            user_cmp, user_err, user_dur = compare_query(
+                participant_query, sol_res, order_sensitive, user_id, conn_str=conn_str, priority=priority,
+            )
+    elif concurrent and query_bulkheads.for_target(conn_str).capacity() >= 2:
+        # (A target that can never grant two slots at once is evaluated sequentially below.)
+        if not query_bulkheads.for_target(conn_str).acquire(
+            timeout=QUERY_TIMEOUT_SECONDS, units=2, priority=priority, user_id=user_id,
+        ):
+            return {"status": "ERROR", "feedback": _BUSY_MSG}, False
+        sol_future = _run_pair_leg(_solution_result, sol_key, solution_query, conn_str, True, priority)
+        user_res, user_err, user_dur = execute_query(
+            participant_query, user_id, conn_str=conn_str, slot_held=True, priority=priority,
+        )
+        if user_err:
+            # Fail fast — the solution keeps running in the background and
+            # still warms the cache for the next submission.
+            return {"status": "INCORRECT", "feedback": user_err, "execution_metadata": {"solution_cache": "miss"}}, False
+        (sol_res, sol_err), cache_status = sol_future.result()
+        if not sol_err:
+            comparator = sql_eval.StreamingComparator(sol_res, order_sensitive)
+            comparator.feed(user_res.rows)
+            user_cmp, total_rows = (user_res.columns, comparator), len(user_res)
+    else:
+        (sol_res, sol_err), cache_status = _solution_result(sol_key, solution_query, conn_str, priority=priority)
+        if not sol_err:
+            user_cmp, user_err, user_dur = compare_query(
+                participant_query, sol_res, order_sensitive, user_id, conn_str=conn_str, priority=priority,
+            )
 
-    if len(user_cols) != len(sol_cols):
+    metadata = {"solution_cache": cache_status}
+    if sol_err:
         return {
-            "status": "INCORRECT",
-            "feedback": (
-                f"Column count mismatch: You returned {len(user_cols)} columns, "
-                f"expected {len(sol_cols)}. Check your SELECT clause."
-            ),
-        }
+            "status": "ERROR",
+            "feedback": "System Error: Failed to generate expected results. Please contact an admin.",
+            "execution_metadata": metadata,
+        }, False
+    if user_err:
+        return {"status": "INCORRECT", "feedback": user_err, "execution_metadata": metadata}, False
 
-    if [c.lower() for c in user_cols] != [c.lower() for c in sol_cols]:
+    # 6. Structural checks — column count and names
+    user_cols, comparator = user_cmp
+    column_feedback = _column_feedback(user_cols, sol_res.columns)
+    if column_feedback:
+        return {"status": "INCORRECT", "feedback": column_feedback, "execution_metadata": metadata}, True
+
+    # 7. Row-level comparison (multiset, or positional when order_sensitive)
+    if comparator.matched:
         return {
-            "status": "INCORRECT",
-            "feedback": (
-                f"Column names or order mismatch. "
-                f"You have: {', '.join(user_cols)} | Expected: {', '.join(sol_cols)}"
-            ),
-        }
-
-    # 6. Row-level comparison
-    if order_sensitive:
-        # Exact ordered comparison — ORDER BY matters
-        is_correct = (user_res == sol_res)
-        order_hint = (
-            " Check your ORDER BY clause."
-            if not is_correct and len(user_res) == len(sol_res)
-            else ""
+            "status": "CORRECT",
+            "execution_metadata": {"duration_ms": user_dur, "rows_returned": comparator.count, **metadata},
+        }, True
+
+    expected_count = comparator.expected_count
+    if total_rows is None and comparator.mismatch != "overflow":
+        total_rows = comparator.count   # every row was read or counted
+
+    if total_rows is None:
+        # Overflow: fetching stopped at the first row past the expected count.
+        feedback = (
+            f"Row count mismatch: You returned more than {expected_count} rows, "
+            f"expected {expected_count}. Check your WHERE clause and filters."
+        )
+    elif total_rows != expected_count:
+        feedback = (
+            f"Row count mismatch: You returned {total_rows} rows, "
+            f"expected {expected_count}. Check your WHERE clause and filters."
         )
+    elif comparator.mismatch == "order":
+        feedback = "Rows are not in the expected order. Check your ORDER BY clause."
     else:
-        # Set comparison — sort both sides before comparing
-        is_correct = (
-            sql_eval.normalize_result(user_res, user_cols)
-            == sql_eval.normalize_result(sol_res, sol_cols)
+        order_hint = " Check your ORDER BY clause." if order_sensitive else ""
+        feedback = f"Row count matches but values are incorrect.{order_hint} Check your WHERE conditions and JOINs."
+
+    return {"status": "INCORRECT", "feedback": feedback, "execution_metadata": metadata}, True
+
+
+def _column_feedback(user_cols: List[str], sol_cols: List[str]) -> Optional[str]:
+    """Feedback for a column count or name/order mismatch, or None if the columns agree."""
+    if len(user_cols) != len(sol_cols):
+        return (
+            f"Column count mismatch: You returned {len(user_cols)} columns, "
+            f"expected {len(sol_cols)}. Check your SELECT clause."
         )
-        order_hint = ""
+    if [c.lower() for c in user_cols] != [c.lower() for c in sol_cols]:
+        return (
+            f"Column names or order mismatch. "
+            f"You have: {', '.join(user_cols)} | Expected: {', '.join(sol_cols)}"
+        )
+    return None
+
+
+def _evaluate_checksum(
+    user_id: str,
+    question_id: str,
+    participant_query: str,
+    solution_query: str,
+    conn_str: Optional[str],
+    expected: Optional[sql_eval.ResultChecksum] = None,
+    priority: int = PRIORITY_VALIDATE,
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Checksum grading: compares the database-side fingerprints of both
+    complete results.  The solution fingerprint comes from ``expected`` (a
+    golden snapshot) or is cached like a solution result; the participant
+    aggregate is skipped when the columns differ.
+    Returns ``(result, graded)`` like _evaluate_rows.
+    """
+    if expected is not None:
+        (sol_sum, sol_err), cache_status = (expected, None), "snapshot"
+    else:
+        sol_key = result_cache.solution_cache_key(conn_str, question_id, solution_query, kind="checksum")
+        (sol_sum, sol_err), cache_status = _solution_checksum(sol_key, solution_query, conn_str, priority)
+    metadata = {"solution_cache": cache_status, "grading": "checksum"}
+    if sol_err:
+        return {
+            "status": "ERROR",
+            "feedback": "System Error: Failed to generate expected results. Please contact an admin.",
+            "execution_metadata": metadata,
+        }, False
+
+    user_sum, user_err, user_dur = checksum_query(
+        participant_query, user_id, conn_str=conn_str, expected_columns=sol_sum.columns, priority=priority,
+    )
+    if user_err:
+        return {"status": "INCORRECT", "feedback": user_err, "execution_metadata": metadata}, False
 
-    if is_correct:
+    column_feedback = _column_feedback(user_sum.columns, sol_sum.columns)
+    if column_feedback:
+        return {"status": "INCORRECT", "feedback": column_feedback, "execution_metadata": metadata}, True
+
+    if user_sum.same_rows(sol_sum):
         return {
             "status": "CORRECT",
-            "execution_metadata": {"duration_ms": user_dur, "rows_returned": len(user_res)},
-        }
+            "execution_metadata": {"duration_ms": user_dur, "rows_returned": user_sum.row_count, **metadata},
+        }, True
 
-    feedback = "Result set mismatch."
-    if len(user_res) != len(sol_res):
+    if user_sum.row_count != sol_sum.row_count:
         feedback = (
-            f"Row count mismatch: You returned {len(user_res)} rows, "
-            f"expected {len(sol_res)}. Check your WHERE clause and filters."
+            f"Row count mismatch: You returned {user_sum.row_count} rows, "
+            f"expected {sol_sum.row_count}. Check your WHERE clause and filters."
         )
     else:
-        feedback = f"Row count matches but values are incorrect.{order_hint} Check your WHERE conditions and JOINs."
+        feedback = "Row count matches but values are incorrect. Check your WHERE conditions and JOINs."
+    return {"status": "INCORRECT", "feedback": feedback, "execution_metadata": metadata}, True
+
+
+def _solution_result(
+    key: str, solution_query: str, conn_str: Optional[str], slot_held: bool = False,
+    priority: int = PRIORITY_VALIDATE,
+):
+    """
+    Returns ``((result_set, error), cache_status)`` for a question's solution query.
+    Successful results are cached under ``key``; concurrent misses share a
+    single execution.
+
+    ``slot_held``: a query slot was acquired for this call.  If another
+    in-flight computation satisfies it, the unused slot is released here.
+    """
+    executed = []
+
+    def _compute():
+        executed.append(True)
+        res, err, _ = execute_query(
+            solution_query, "system_eval", conn_str=conn_str, slot_held=slot_held, priority=priority,
+        )
+        return (res, err), err is None
 
-    return {"status": "INCORRECT", "feedback": feedback}
+    try:
+        return result_cache.get_or_compute(key, _compute)
+    finally:
+        if slot_held and not executed:
+            query_bulkheads.for_target(conn_str).release()
+
+
+def _solution_checksum(key: str, solution_query: str, conn_str: Optional[str], priority: int = PRIORITY_VALIDATE):
+    """Like _solution_result, for the checksum fingerprint of a solution."""
+    def _compute():
+        res, err, _ = checksum_query(solution_query, "system_eval", conn_str=conn_str, priority=priority)
+        return (res, err), err is None
+
+    return result_cache.get_or_compute(key, _compute)
+
+
+def warm_solution(
+    question_id: str,
+    solution_query: str,
+    conn_str: Optional[str] = None,
+    grading_mode: str = "ROWS",
+    priority: int = PRIORITY_VALIDATE,
+) -> Tuple[str, Optional[str]]:
+    """
+    Puts a question's solution result (or checksum fingerprint) in the
+    solution cache, exactly as grading would on a miss.
+    Returns ``(cache_status, error)``.
+    """
+    if grading_mode == "CHECKSUM":
+        key = result_cache.solution_cache_key(conn_str, question_id, solution_query, kind="checksum")
+        (_, err), cache_status = _solution_checksum(key, solution_query, conn_str, priority)
+    else:
+        key = result_cache.solution_cache_key(conn_str, question_id, solution_query)
+        (_, err), cache_status = _solution_result(key, solution_query, conn_str, priority=priority)
+    return cache_status, err
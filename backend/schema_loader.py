@@ -54,11 +54,11 @@ def extract_tables_from_sqlserver(sql: str) -> set[str]:
     return {t for t in tables if t}
 
 import hashlib
-import pyodbc
 from typing import Dict, List, Any, Optional
 from django.core.cache import cache
-from .config import PRIMARY_CONN, SCHEMA_CACHE_TTL_SECONDS
+from .config import PRIMARY_CONN, QUERY_TIMEOUT_SECONDS, SCHEMA_CACHE_TTL_SECONDS
 from .db_router import db_router
+from .governor import query_bulkheads
 
 # SQL Server introspection query - extracts schemas, tables, columns, PKs, FKs
 _META_QUERY = """
@@ -148,20 +148,24 @@ def _parse_rows(rows, schema_filter: str = '') -> Dict[str, Any]:
 
 
 def _fetch_full_schema(conn_str: Optional[str], schema_filter: str) -> Dict[str, Any]:
-    """Runs _META_QUERY against the DB and parses results. Results are cached by the caller."""
-    conn = None
+    """
+    Runs _META_QUERY against the DB and parses results. Results are cached by the caller.
+    Takes a slot from the target's bulkhead like any other query on that database.
+    """
+    slots = query_bulkheads.for_target(conn_str)
+    if not slots.acquire(timeout=QUERY_TIMEOUT_SECONDS):
+        raise RuntimeError("Server is busy. Too many queries are running against this database. Please try again in a moment.")
     try:
-        if conn_str:
-            conn = pyodbc.connect(conn_str, timeout=5)
-        else:
-            conn = db_router.get_connection(force_primary=True)
-        cursor = conn.cursor()
-        cursor.execute(_META_QUERY)
-        rows = cursor.fetchall()
-        return _parse_rows(rows, schema_filter=schema_filter)
+        with db_router.connection(conn_str, force_primary=True, connect_timeout=5) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(_META_QUERY)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
     finally:
-        if conn:
-            conn.close()
+        slots.release()
+    return _parse_rows(rows, schema_filter=schema_filter)
 
 
 def inspect_schema(db_config_id: int = None, conn_str: Optional[str] = None, solution_query: Optional[str] = None, schema_filter: str = '') -> Dict[str, Any]:
@@ -175,7 +179,7 @@ def inspect_schema(db_config_id: int = None, conn_str: Optional[str] = None, sol
     returned, along with FK relationships between those tables.
     Falls back to the full schema when solution_query is absent or matches nothing.
 
-    If conn_str is provided, connects directly using that string.
+    If conn_str is provided, borrows a pooled connection to that target.
     Otherwise falls back to the primary router connection.
 
     Results are cached for SCHEMA_CACHE_TTL_SECONDS (default 300 s) to avoid
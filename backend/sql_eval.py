@@ -4,8 +4,19 @@ sql_eval.py — focused SQL safety, rewriting, and result-normalisation layer.
 Public API
 -----------
     validate_sql(sql)            — raises ValueError if the query is unsafe/unsupported
+    canonicalize_sql(sql)        — whitespace/keyword-case/trailing-';' insensitive form of a query (cache keys)
     apply_row_limit(sql, limit)  — rewrites SQL to enforce a TOP (n) hard row cap (never wraps in a derived table; always preserves ORDER BY)
-    normalize_result(rows, cols) — canonical sorted list of tuples for set comparison
+    plan_normalizers(description) — per-column value converters compiled from cursor.description
+    normalize_rows(rows, plan)   — applies a plan to raw rows in one pass
+    ResultSet(columns, rows)     — compact query result: column names + one tuple per row
+    multiset_equal(a, b)         — O(n) order-insensitive comparison of normalised tuple rows
+    StreamingComparator(expected, order_sensitive)
+                                 — checks rows batch by batch against an expected result, stops at the first impossible row
+    describe_sql(sql) / checksum_sql(sql, description)
+                                 — server-side, order-independent fingerprint of a whole result (checksum grading)
+    multiset_digest(rows)        — order-independent digest of normalised tuple rows (golden snapshots)
+    canonical_rows(rows)         — sorted copy of already-normalised tuple rows (display/debugging)
+    normalize_result(rows, cols) — canonical sorted list of tuples from dict rows (legacy callers)
 
 This module ensures:
     - Only a single SELECT/CTE statement is allowed (no DML/DDL/EXEC, no multi-statement, no comments)
@@ -18,9 +29,12 @@ This module ensures:
 
 import re
 import decimal
+import hashlib
 import datetime
 import sqlparse
-from typing import Any, Dict, List, Tuple
+from sqlparse import tokens as sql_tokens
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from .config import MAX_RESULT_ROWS, DECIMAL_PRECISION, CASE_INSENSITIVE_COLUMNS, STRIP_STRINGS
 
@@ -119,6 +133,30 @@ def validate_sql(sql: str) -> None:
             raise ValueError(f"Unauthorized keyword detected: {label}.")
 
 
+# ---------------------------------------------------------------------------
+# canonicalize_sql
+# ---------------------------------------------------------------------------
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Returns a canonical form of ``sql`` for use as a cache key: tokens joined
+    by single spaces, keywords upper-cased, comments and trailing semicolons
+    dropped.  String literals and identifiers are left exactly as written.
+
+    Queries that differ only in whitespace, keyword case or a trailing ';'
+    map to the same string.  The result is never executed.
+    """
+    tokens = []
+    for statement in sqlparse.parse(sql.strip()):
+        for tok in statement.flatten():
+            if tok.is_whitespace or tok.ttype in sql_tokens.Comment:
+                continue
+            tokens.append(tok.value.upper() if tok.is_keyword else tok.value)
+    while tokens and tokens[-1] == ';':
+        tokens.pop()
+    return ' '.join(tokens)
+
+
 # ---------------------------------------------------------------------------
 # apply_row_limit
 # ---------------------------------------------------------------------------
@@ -266,24 +304,162 @@ def ensure_order_by(sql: str) -> str:
 
 
 # ---------------------------------------------------------------------------
-# normalize_result
+# ResultSet
 # ---------------------------------------------------------------------------
 
-def _norm_val(val: Any) -> Any:
-    """Per-cell normalisation (mirrors runner.normalize_value)."""
+class ResultSet:
+    """
+    A query result as returned by runner.execute_query.
+
+    ``columns`` is the list of column names (lowercased when
+    CASE_INSENSITIVE_COLUMNS is True) and ``rows`` one tuple of already
+    normalised values per row.  Columns are known even when no rows came
+    back.  Column names are stored once instead of once per row, so the
+    object is cheap to build, compare, pickle into the cache and hand to
+    the API as ``{'columns': [...], 'rows': [[...], ...]}``.
+    """
+
+    __slots__ = ('columns', 'rows')
+
+    def __init__(self, columns: Sequence[str], rows: List[Tuple]):
+        self.columns = list(columns)
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ResultSet):
+            return NotImplemented
+        return self.columns == other.columns and self.rows == other.rows
+
+    def __repr__(self) -> str:
+        return f"ResultSet(columns={self.columns!r}, rows=<{len(self.rows)} rows>)"
+
+    def column_major(self) -> List[Tuple]:
+        """One tuple of values per column (transposed view of ``rows``)."""
+        if not self.rows:
+            return [() for _ in self.columns]
+        return list(zip(*self.rows))
+
+    def column(self, name: str) -> Tuple:
+        """All values of one column, looked up case-insensitively."""
+        idx = [c.lower() for c in self.columns].index(name.lower())
+        return tuple(row[idx] for row in self.rows)
+
+    def to_payload(self) -> Dict[str, Any]:
+        """The ``{'columns', 'rows'}`` shape used by run_query responses and job results."""
+        return {'columns': self.columns, 'rows': self.rows}
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> 'ResultSet':
+        return cls(payload.get('columns') or [], [tuple(r) for r in payload.get('rows') or []])
+
+
+# ---------------------------------------------------------------------------
+# Value normalisation
+# ---------------------------------------------------------------------------
+
+def _round_decimal(val: decimal.Decimal) -> float:
+    return round(float(val), DECIMAL_PRECISION)
+
+
+def _iso_datetime(val: datetime.datetime) -> str:
+    return val.replace(microsecond=0).isoformat()
+
+
+def _iso_date(val: datetime.date) -> str:
+    return val.isoformat()
+
+
+def _strip(val: str) -> str:
+    return val.strip()
+
+
+# Python type -> converter for non-None values of that type.  None means the
+# value is compared as-is.  This table is the single source of truth for
+# cell normalisation: both normalize_value (one cell at a time) and
+# plan_normalizers (one converter per result column) read it.
+_CONVERTERS: Dict[type, Optional[Callable[[Any], Any]]] = {
+    int: None,
+    bool: None,
+    float: None,
+    decimal.Decimal: _round_decimal,
+    datetime.datetime: _iso_datetime,
+    datetime.date: _iso_date,
+    str: _strip if STRIP_STRINGS else None,
+}
+
+# Marks a column whose declared type is not in _CONVERTERS; its cells go
+# through normalize_value.
+_GENERIC = object()
+
+
+def _converter_for(type_code: Any) -> Any:
+    if not isinstance(type_code, type):
+        return _GENERIC
+    # Walk the MRO so subclasses resolve to their closest known base —
+    # datetime.datetime must win over datetime.date (its base class).
+    for base in type_code.__mro__:
+        if base in _CONVERTERS:
+            return _CONVERTERS[base]
+    return _GENERIC
+
+
+def normalize_value(val: Any) -> Any:
+    """
+    Per-cell normalisation: Decimal → rounded float, datetime → ISO string
+    without microseconds, date → ISO string, str → stripped (STRIP_STRINGS).
+    Anything else is returned unchanged.
+    """
     if val is None:
         return None
-    if isinstance(val, decimal.Decimal):
-        return round(float(val), DECIMAL_PRECISION)
-    if isinstance(val, datetime.datetime):
-        return val.replace(microsecond=0).isoformat()
-    if isinstance(val, datetime.date):
-        return val.isoformat()
-    if isinstance(val, str) and STRIP_STRINGS:
-        return val.strip()
-    return val
+    conv = _converter_for(type(val))
+    if conv is None or conv is _GENERIC:
+        return val
+    return conv(val)
+
+
+def plan_normalizers(description: Sequence[Sequence[Any]]) -> List[Optional[Callable[[Any], Any]]]:
+    """
+    Compiles a normalisation plan from a DB-API ``cursor.description``:
+    one converter per column, chosen from the column's declared Python type
+    (pyodbc reports ``int``, ``decimal.Decimal``, ``datetime.datetime`` …
+    as the type code).  None means the column needs no conversion;
+    columns of an unrecognised type fall back to normalize_value.
+    """
+    plan = []
+    for column in description:
+        conv = _converter_for(column[1])
+        plan.append(normalize_value if conv is _GENERIC else conv)
+    return plan
+
+
+def normalize_rows(rows: Iterable[Sequence[Any]], plan: Sequence[Optional[Callable[[Any], Any]]]) -> List[Tuple]:
+    """
+    Applies a plan from plan_normalizers to raw rows in a single pass and
+    returns one tuple per row.  Columns without a converter are copied
+    untouched; NULLs are never passed to a converter.
+    """
+    active = [(i, conv) for i, conv in enumerate(plan) if conv is not None]
+    if not active:
+        return [tuple(row) for row in rows]
+
+    out = []
+    for row in rows:
+        vals = list(row)
+        for i, conv in active:
+            v = vals[i]
+            if v is not None:
+                vals[i] = conv(v)
+        out.append(tuple(vals))
+    return out
 
 
+# ---------------------------------------------------------------------------
+# normalize_result
+# ---------------------------------------------------------------------------
+
 def normalize_result(
     rows: List[Dict[str, Any]],
     columns: List[str],
@@ -301,8 +477,270 @@ def normalize_result(
     cols_lower = [c.lower() for c in columns]
 
     def to_tuple(row: Dict[str, Any]) -> Tuple:
-        return tuple(_norm_val(row.get(c)) for c in cols_lower)
+        return tuple(normalize_value(row.get(c)) for c in cols_lower)
+
+    return canonical_rows(to_tuple(r) for r in rows)
+
+
+def canonical_rows(rows: Iterable[Tuple]) -> List[Tuple]:
+    """
+    Returns ``rows`` (already normalised tuples, e.g. ``ResultSet.rows``)
+    sorted into a canonical order for order-insensitive comparison.
+    None sorts before any real value.
+    """
+    return sorted(rows, key=lambda t: tuple('\x00' if v is None else str(v) for v in t))
+
+
+def multiset_equal(rows_a: Sequence[Tuple], rows_b: Sequence[Tuple]) -> bool:
+    """
+    True if two lists of normalised row tuples hold the same rows with the
+    same multiplicities, in any order.
+
+    Counts hashed tuples instead of sorting, so it runs in O(n) and never
+    stringifies values.  Falls back to canonical_rows for the rare result
+    containing an unhashable value.
+    """
+    if len(rows_a) != len(rows_b):
+        return False
+    try:
+        return Counter(rows_a) == Counter(rows_b)
+    except TypeError:
+        return canonical_rows(rows_a) == canonical_rows(rows_b)
 
-    canonical = [to_tuple(r) for r in rows]
-    canonical.sort(key=lambda t: tuple('\x00' if v is None else str(v) for v in t))
-    return canonical
+
+
+def multiset_digest(rows: Iterable[Tuple]) -> str:
+    """
+    Order-independent digest of normalised row tuples: the row count plus
+    the sum (mod 2**128) of a SHA-256 prefix of each row's repr.  Equal
+    multisets of rows give equal digests whatever the row order, and
+    duplicate rows are counted rather than cancelled.
+    """
+    count = 0
+    acc = 0
+    for row in rows:
+        count += 1
+        acc = (acc + int.from_bytes(hashlib.sha256(repr(row).encode()).digest()[:16], 'big')) % (1 << 128)
+    return f"{count}:{acc:032x}"
+
+# ---------------------------------------------------------------------------
+# StreamingComparator
+# ---------------------------------------------------------------------------
+
+class StreamingComparator:
+    """
+    Compares a result against an expected ResultSet while it is still being
+    fetched.
+
+    Feed normalised row tuples in batches; ``feed`` returns False as soon as
+    the verdict can no longer be CORRECT, so the caller can stop fetching.
+    The rows themselves are not kept.  After the last batch, ``matched``
+    gives the verdict and ``mismatch`` the reason it failed early:
+
+        "overflow" — more rows than expected
+        "row"      — a row that does not occur (often enough) in the expected result
+        "order"    — order-sensitive only: an expected row in the wrong position
+
+    If the stream ended with every row accounted for but fewer rows than
+    expected, ``mismatch`` stays None and ``count < expected_count``.
+
+    After a "row" or "order" mismatch the caller may pass the remaining
+    rows to ``tally``, which only counts them, so ``count`` is the full row
+    count again and the feedback can still report a row count mismatch.
+    """
+
+    def __init__(self, expected: ResultSet, order_sensitive: bool = False):
+        self.expected_count = len(expected.rows)
+        self.order_sensitive = order_sensitive
+        self.count = 0
+        self.mismatch: Optional[str] = None
+        self._expected_rows = expected.rows
+        self._buffered: Optional[List[Tuple]] = None
+        try:
+            self._remaining: Optional[Counter] = Counter(expected.rows)
+        except TypeError:
+            # Unhashable values: keep the rows and compare once at the end.
+            self._remaining = None
+            if not order_sensitive:
+                self._buffered = []
+
+    def feed(self, rows: Iterable[Tuple]) -> bool:
+        """Checks the next batch; returns False once the result cannot match."""
+        if self.mismatch:
+            return False
+        for row in rows:
+            self.count += 1
+            if self.count > self.expected_count:
+                self.mismatch = "overflow"
+                return False
+            if self.order_sensitive:
+                if row != self._expected_rows[self.count - 1]:
+                    self.mismatch = "order" if self._take(row) else "row"
+                    return False
+                self._take(row)
+            elif self._buffered is not None:
+                self._buffered.append(row)
+            elif not self._take(row):
+                self.mismatch = "row"
+                return False
+        return True
+
+    def tally(self, n: int) -> None:
+        """Counts ``n`` further rows without comparing them (after a mismatch)."""
+        self.count += n
+
+    @property
+    def matched(self) -> bool:
+        if self.mismatch or self.count != self.expected_count:
+            return False
+        if self._buffered is not None:
+            return multiset_equal(self._buffered, self._expected_rows)
+        return True
+
+    def _take(self, row: Tuple) -> bool:
+        """Consumes one occurrence of ``row`` from the expected multiset."""
+        if self._remaining is None:
+            return False
+        try:
+            left = self._remaining.get(row, 0)
+        except TypeError:
+            return False
+        if left <= 0:
+            return False
+        self._remaining[row] = left - 1
+        return True
+
+
+# ---------------------------------------------------------------------------
+# Server-side checksum grading
+# ---------------------------------------------------------------------------
+#
+# For questions whose answer is too large to pull into Python, both queries
+# are wrapped in a CTE and SQL Server returns only
+#
+#     COUNT_BIG(*), SUM(BINARY_CHECKSUM(row)), CHECKSUM_AGG(BINARY_CHECKSUM(row))
+#
+# Both aggregates are order-independent; the SUM also keeps duplicate rows
+# from cancelling out (CHECKSUM_AGG alone is XOR-like).  Each column is first
+# cast the way the Python normaliser would treat it, so that e.g. an INT and a
+# DECIMAL holding the same value fingerprint the same.  BINARY_CHECKSUM is a
+# 32-bit hash: equal fingerprints are strong evidence, not proof, of equality.
+
+_CHECKSUM_CTE = "_qb_q"
+
+# Same type keys as _CONVERTERS; ``{col}`` is the quoted column name.
+_CHECKSUM_EXPRS: Dict[type, str] = {
+    int: "CAST({col} AS FLOAT)",
+    bool: "CAST({col} AS FLOAT)",
+    float: "CAST({col} AS FLOAT)",
+    decimal.Decimal: "ROUND(CAST({col} AS FLOAT), %d)" % DECIMAL_PRECISION,
+    datetime.datetime: "CONVERT(NVARCHAR(19), {col}, 126)",
+    datetime.date: "CONVERT(NVARCHAR(10), {col}, 126)",
+    str: "LTRIM(RTRIM(CAST({col} AS NVARCHAR(MAX))))" if STRIP_STRINGS else "CAST({col} AS NVARCHAR(MAX))",
+}
+
+
+class ResultChecksum:
+    """
+    Order-independent fingerprint of a complete query result, computed by
+    SQL Server (see checksum_sql).  ``row_count`` and ``checksum`` are None
+    when only the columns were described.
+    """
+
+    __slots__ = ('columns', 'signature', 'row_count', 'checksum')
+
+    def __init__(self, columns: Sequence[str], signature: Sequence[Tuple[str, str]],
+                 row_count: Optional[int] = None, checksum: Optional[Tuple] = None):
+        self.columns = list(columns)
+        self.signature = [tuple(s) for s in signature]
+        self.row_count = row_count
+        self.checksum = checksum
+
+    def same_rows(self, other: 'ResultChecksum') -> bool:
+        return self.row_count == other.row_count and self.checksum == other.checksum
+
+    def __repr__(self) -> str:
+        return f"ResultChecksum(columns={self.columns!r}, row_count={self.row_count!r}, checksum={self.checksum!r})"
+
+
+def column_signature(description: Sequence[Sequence[Any]]) -> List[Tuple[str, str]]:
+    """``[(lowercased column name, Python type name), ...]`` from a cursor.description."""
+    return [
+        (str(col[0]).lower(), getattr(col[1], '__name__', str(col[1])))
+        for col in description
+    ]
+
+
+def _top_level_matches(sql: str, pattern: str) -> List[int]:
+    """
+    Start offsets of keyword ``pattern`` at parenthesis depth 0, outside
+    string literals and quoted identifiers.
+    """
+    upper = sql.upper()
+    rx = re.compile(pattern)
+    depth = 0
+    quote = None
+    found = []
+    for i, ch in enumerate(sql):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch == '[':
+            quote = ']'
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif depth == 0 and (i == 0 or not (sql[i - 1].isalnum() or sql[i - 1] == '_')):
+            if rx.match(upper, i):
+                found.append(i)
+    return found
+
+
+def _wrap_as_cte(sql: str, outer_select: str) -> str:
+    """
+    Runs ``outer_select ... FROM _qb_q`` over the whole result of ``sql``.
+
+    A trailing ORDER BY is dropped unless TOP / OFFSET depends on it (SQL
+    Server rejects ORDER BY inside a CTE otherwise, and the fingerprint is
+    order-independent anyway).  A query that already starts with WITH gets
+    _qb_q appended to its own CTE list.
+    """
+    clean = sql.strip().rstrip(';')
+    if not _top_level_matches(clean, r'(TOP|OFFSET)\b'):
+        order_by = _top_level_matches(clean, r'ORDER\s+BY\b')
+        if order_by:
+            clean = clean[:order_by[-1]].rstrip()
+
+    if clean.upper().startswith('WITH'):
+        selects = _top_level_matches(clean, r'SELECT\b')
+        if selects:
+            head, body = clean[:selects[0]].rstrip(), clean[selects[0]:]
+            return f"{head}, {_CHECKSUM_CTE} AS ({body}) {outer_select} FROM {_CHECKSUM_CTE}"
+    return f"WITH {_CHECKSUM_CTE} AS ({clean}) {outer_select} FROM {_CHECKSUM_CTE}"
+
+
+def describe_sql(sql: str) -> str:
+    """Returns SQL whose cursor.description is that of ``sql`` without producing rows."""
+    return _wrap_as_cte(sql, "SELECT TOP 0 *")
+
+
+def _checksum_expr(name: str, type_code: Any) -> str:
+    col = "[" + str(name).replace("]", "]]") + "]"
+    if isinstance(type_code, type):
+        for base in type_code.__mro__:
+            if base in _CHECKSUM_EXPRS:
+                return _CHECKSUM_EXPRS[base].format(col=col)
+    return col
+
+
+def checksum_sql(sql: str, description: Sequence[Sequence[Any]]) -> str:
+    """
+    Returns SQL producing one row ``(row_count, checksum_sum, checksum_agg)``
+    for the complete, unlimited result of ``sql``.  ``description`` is the
+    cursor.description obtained by running describe_sql(sql).
+    """
+    row = "BINARY_CHECKSUM({})".format(", ".join(_checksum_expr(c[0], c[1]) for c in description))
+    return _wrap_as_cte(sql, f"SELECT COUNT_BIG(*), SUM(CAST({row} AS BIGINT)), CHECKSUM_AGG({row})")
@@ -0,0 +1,362 @@
+"""
+Unit tests for backend/db_router.py
+
+Run from the project root:
+    python -m unittest backend.tests_db_router -v
+
+pyodbc.connect is patched with fake connections, so no database is required
+(the pyodbc module itself must still be importable).  Circuit breakers use a
+local-memory Django cache.
+"""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+import pyodbc
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+from django.core.cache import cache  # noqa: E402
+
+from backend.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreakers  # noqa: E402
+from backend.db_router import (  # noqa: E402
+    AssessmentDBRouter, ConnectionPool, PoolTimeout, TargetUnavailable, target_fingerprint,
+)
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql):
+        if not self._conn.alive:
+            raise pyodbc.OperationalError("08S01", "Communication link failure")
+        self._conn.executed.append(sql)
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.executed = []
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def _patch_connect():
+    return mock.patch('backend.db_router.pyodbc.connect', side_effect=lambda *a, **k: _FakeConnection())
+
+
+# ---------------------------------------------------------------------------
+# ConnectionPool
+# ---------------------------------------------------------------------------
+
+class TestConnectionPool(unittest.TestCase):
+
+    def test_connection_reused_after_checkin(self):
+        with _patch_connect() as connect:
+            pool = ConnectionPool("DSN=x", max_size=2)
+            conn = pool.checkout()
+            pool.checkin(conn)
+            self.assertIs(pool.checkout(), conn)
+            self.assertEqual(connect.call_count, 1)
+            self.assertEqual(pool.stats()['reused'], 1)
+
+    def test_bounded_checkout_times_out(self):
+        with _patch_connect():
+            pool = ConnectionPool("DSN=x", max_size=1)
+            pool.checkout()
+            with self.assertRaises(PoolTimeout):
+                pool.checkout(timeout=0.05)
+            self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_discard_frees_slot(self):
+        with _patch_connect():
+            pool = ConnectionPool("DSN=x", max_size=1)
+            conn = pool.checkout()
+            pool.checkin(conn, discard=True)
+            self.assertTrue(conn.closed)
+            self.assertIsNot(pool.checkout(timeout=0.05), conn)
+
+    def test_expired_connection_not_reused(self):
+        with _patch_connect():
+            pool = ConnectionPool("DSN=x", max_size=2, max_lifetime=0.01)
+            conn = pool.checkout()
+            pool.checkin(conn)
+            time.sleep(0.02)
+            self.assertIsNot(pool.checkout(), conn)
+            self.assertTrue(conn.closed)
+
+    def test_dead_idle_connection_fails_ping_and_is_replaced(self):
+        with _patch_connect():
+            pool = ConnectionPool("DSN=x", max_size=1, ping_after_idle=0)
+            conn = pool.checkout()
+            pool.checkin(conn)
+            conn.alive = False
+            fresh = pool.checkout(timeout=0.05)
+            self.assertIsNot(fresh, conn)
+            self.assertEqual(pool.stats()['failed_pings'], 1)
+
+    def test_resize_admits_waiters_and_sheds_extra_connections(self):
+        with _patch_connect():
+            pool = ConnectionPool("DSN=x", max_size=1)
+            first = pool.checkout()
+            got = []
+            waiter = threading.Thread(target=lambda: got.append(pool.checkout(timeout=2)))
+            waiter.start()
+            time.sleep(0.05)
+            pool.resize(2)
+            waiter.join()
+            self.assertEqual(len(got), 1)
+
+            pool.resize(1)
+            pool.checkin(first)
+            self.assertTrue(first.closed)
+            pool.checkin(got[0])
+            self.assertEqual((pool.stats()['open'], pool.stats()['idle']), (1, 1))
+
+    def test_stats_track_in_use_and_idle(self):
+        with _patch_connect():
+            pool = ConnectionPool("DSN=x", max_size=3)
+            conn = pool.checkout()
+            pool.checkout()   # stays checked out
+            pool.checkin(conn)
+            stats = pool.stats()
+            self.assertEqual((stats['open'], stats['idle'], stats['in_use']), (2, 1, 1))
+
+
+# ---------------------------------------------------------------------------
+# AssessmentDBRouter.connection
+# ---------------------------------------------------------------------------
+
+class TestRouterConnection(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_statement_error_keeps_connection(self):
+        with _patch_connect():
+            router = AssessmentDBRouter()
+            with self.assertRaises(pyodbc.ProgrammingError):
+                with router.connection("DSN=x") as conn:
+                    raise pyodbc.ProgrammingError("42S02", "Invalid object name")
+            with router.connection("DSN=x") as again:
+                self.assertIs(again, conn)
+
+    def test_connection_error_discards_connection(self):
+        with _patch_connect():
+            router = AssessmentDBRouter()
+            with self.assertRaises(pyodbc.OperationalError):
+                with router.connection("DSN=x") as conn:
+                    raise pyodbc.OperationalError("HYT00", "Query timeout expired")
+            self.assertTrue(conn.closed)
+            stats = next(iter(router.pool_stats().values()))
+            self.assertEqual(stats['discarded'], 1)
+            self.assertNotIn("DSN=x", str(router.pool_stats()))
+
+
+# ---------------------------------------------------------------------------
+# Replica routing and health probing
+# ---------------------------------------------------------------------------
+
+def _replica_router(*replicas):
+    router = AssessmentDBRouter()
+    router.primary = "DSN=primary"
+    router.replicas = list(replicas)
+    router._probe_interval = 0  # no background prober; tests call probe() directly
+    router.breakers = CircuitBreakers(failure_threshold=1, window_seconds=60, open_seconds=60)
+    return router
+
+
+class TestReplicaRouting(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_prefers_lower_latency_replica(self):
+        router = _replica_router("DSN=fast", "DSN=slow")
+        router._record_probe("DSN=fast", connect_ms=5, ping_ms=1)
+        router._record_probe("DSN=slow", connect_ms=5, ping_ms=50)
+        picks = {router._route()[0] for _ in range(20)}
+        self.assertEqual(picks, {"DSN=fast"})
+
+    def test_outstanding_queries_shift_load(self):
+        router = _replica_router("DSN=a", "DSN=b")
+        router._record_probe("DSN=a", connect_ms=5, ping_ms=1)
+        router._record_probe("DSN=b", connect_ms=5, ping_ms=2)
+        with _patch_connect():
+            with router.connection():
+                health = router.replica_health()
+                self.assertEqual(health[target_fingerprint("DSN=a")]['outstanding'], 1)
+            self.assertEqual(router.replica_health()[target_fingerprint("DSN=a")]['outstanding'], 0)
+        router._state("DSN=a").outstanding = 2  # 3 x 1 ms > 1 x 2 ms
+        self.assertEqual(router._route()[0], "DSN=b")
+
+    def test_failed_connect_skips_replica_until_probe_succeeds(self):
+        router = _replica_router("DSN=r1")
+        healthy = {"DSN=r1": False, "DSN=primary": True}
+
+        def fake_connect(conn_str, **_):
+            if not healthy[conn_str]:
+                raise pyodbc.OperationalError("08001", "Login timeout expired")
+            return _FakeConnection()
+
+        with mock.patch('backend.db_router.pyodbc.connect', side_effect=fake_connect):
+            with router.connection():
+                pass
+            self.assertEqual(router._route(), ["DSN=primary"])
+            self.assertFalse(router.probe("DSN=r1"))
+            self.assertEqual(router._route(), ["DSN=primary"])
+
+            healthy["DSN=r1"] = True
+            self.assertTrue(router.probe("DSN=r1"))
+            self.assertEqual(router._route(), ["DSN=r1", "DSN=primary"])
+
+    def test_per_target_replica_set_routes_and_fails_over(self):
+        router = _replica_router()
+        router.set_replicas("DSN=exam", ["DSN=exam-r1", "DSN=exam-r2"])
+        # Unprobed replicas are routed to as well (no state needed from a probe first).
+        targets = router._route(conn_str="DSN=exam")
+        self.assertIn(targets[0], ("DSN=exam-r1", "DSN=exam-r2"))
+        self.assertEqual(targets[1:], ["DSN=exam"])
+        self.assertEqual(router._route(True, "DSN=exam"), ["DSN=exam"])
+        self.assertEqual(router._route(conn_str="DSN=other"), ["DSN=other"])
+        self.assertEqual(router._route(), ["DSN=primary"])
+
+        router._record_probe("DSN=exam-r1", connect_ms=5, ping_ms=1)
+        router._record_probe("DSN=exam-r2", connect_ms=5, ping_ms=5)
+
+        def fake_connect(conn_str, **_):
+            if conn_str == "DSN=exam-r1":
+                raise pyodbc.OperationalError("08001", "Login timeout expired")
+            return _FakeConnection()
+
+        with mock.patch('backend.db_router.pyodbc.connect', side_effect=fake_connect):
+            with router.connection("DSN=exam"):  # r1 (faster) fails, falls back to the primary
+                pass
+        self.assertEqual(router._route(conn_str="DSN=exam"), ["DSN=exam-r2", "DSN=exam"])
+        self.assertIn(target_fingerprint("DSN=exam-r1"), router.replica_health())
+
+        router.set_replicas("DSN=exam", [])
+        self.assertEqual(router._route(conn_str="DSN=exam"), ["DSN=exam"])
+        self.assertEqual(router.replica_health(), {})
+
+    def test_warm_fills_primary_and_replica_pools(self):
+        router = _replica_router()
+        router.set_replicas("DSN=exam", ["DSN=exam-r1"])
+        with _patch_connect():
+            report = router.warm("DSN=exam", 3)
+        self.assertEqual({r['idle'] for r in report.values()}, {3})
+        self.assertEqual(router.get_pool("DSN=exam-r1").stats()['idle'], 3)
+        self.assertEqual(router.get_pool("DSN=exam").stats()['idle'], 3)
+
+    def test_replica_health_reports_probe_results_without_credentials(self):
+        router = _replica_router("Server=rep1;Database=exam;Uid=u;Pwd=secret;")
+        with _patch_connect():
+            router.probe_replicas()
+        (health,) = router.replica_health().values()
+        self.assertTrue(health['healthy'])
+        self.assertEqual(health['circuit']['state'], CLOSED)
+        self.assertEqual(health['target'], "rep1/exam")
+        self.assertIsNotNone(health['ping_ms'])
+        self.assertIsNotNone(health['connect_ms'])
+        self.assertNotIn("secret", str(router.replica_health()))
+
+
+# ---------------------------------------------------------------------------
+# Circuit breakers (shared through the cache)
+# ---------------------------------------------------------------------------
+
+class TestCircuitBreakers(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_opens_after_threshold_then_admits_a_single_trial(self):
+        breakers = CircuitBreakers(failure_threshold=2, window_seconds=60, open_seconds=1)
+        self.assertEqual(breakers.record_failure("t", "login timeout"), CLOSED)
+        self.assertEqual(breakers.allow("t"), CLOSED)
+        self.assertEqual(breakers.record_failure("t", "login timeout"), OPEN)
+        self.assertIsNone(breakers.allow("t"))
+        self.assertEqual(breakers.describe("t")['last_error'], "login timeout")
+
+        with mock.patch('backend.circuit_breaker.time.time', return_value=time.time() + 2):
+            self.assertEqual(breakers.state("t"), HALF_OPEN)
+            self.assertEqual(breakers.allow("t"), HALF_OPEN)
+            self.assertIsNone(breakers.allow("t"))  # one trial at a time
+            breakers.record_success("t", HALF_OPEN)
+        self.assertEqual(breakers.allow("t"), CLOSED)
+
+    def test_one_workers_failures_protect_the_others(self):
+        def fake_connect(conn_str, **_):
+            raise pyodbc.OperationalError("08001", "Login timeout expired")
+
+        worker_a, worker_b = AssessmentDBRouter(), AssessmentDBRouter()  # same cache, as in two processes
+        with mock.patch('backend.db_router.pyodbc.connect', side_effect=fake_connect) as connect:
+            for _ in range(worker_a.breakers.failure_threshold):
+                with self.assertRaises(pyodbc.OperationalError):
+                    with worker_a.connection("DSN=exam"):
+                        pass
+            calls = connect.call_count
+            with self.assertRaises(TargetUnavailable):
+                with worker_b.connection("DSN=exam"):
+                    pass
+            self.assertEqual(connect.call_count, calls)  # failed fast, no connect attempted
+        self.assertEqual(worker_a.pool_stats()[target_fingerprint("DSN=exam")]['circuit'], OPEN)
+
+    def test_open_replica_is_skipped_in_favour_of_primary(self):
+        router = _replica_router("DSN=r1")
+        router.mark_unhealthy("DSN=r1", "down")
+        with _patch_connect() as connect:
+            with router.connection():
+                pass
+        self.assertEqual([c.args[0] for c in connect.call_args_list], ["DSN=primary"])
+        self.assertFalse(router.replica_health()[target_fingerprint("DSN=r1")]['healthy'])
+
+    def test_full_replica_pool_falls_back_to_primary(self):
+        router = _replica_router("DSN=r1")
+        router._record_probe("DSN=r1", connect_ms=5, ping_ms=1)
+        with _patch_connect() as connect:
+            pool = router.get_pool("DSN=r1")
+            pool.max_size = 1
+            pool.checkout()   # the replica's only connection stays busy
+            with router.connection(checkout_timeout=0.05):
+                pass
+        self.assertEqual([c.args[0] for c in connect.call_args_list], ["DSN=r1", "DSN=primary"])
+        self.assertTrue(router.replica_health()[target_fingerprint("DSN=r1")]['healthy'])
+
+    def test_pool_timeout_gives_up_the_half_open_trial(self):
+        router = AssessmentDBRouter()
+        router.breakers = CircuitBreakers(failure_threshold=1, window_seconds=60, open_seconds=1)
+        target_id = target_fingerprint("DSN=exam")
+        with _patch_connect():
+            pool = router.get_pool("DSN=exam")
+            pool.max_size = 1
+            pool.checkout()
+            router.breakers.record_failure(target_id, "login timeout")
+            with mock.patch('backend.circuit_breaker.time.time', return_value=time.time() + 2):
+                with self.assertRaises(PoolTimeout):
+                    with router.connection("DSN=exam", checkout_timeout=0.05):
+                        pass
+                self.assertEqual(router.breakers.allow(target_id), HALF_OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,11 @@ import decimal
 import datetime
 import unittest
 
-from backend.sql_eval import validate_sql, apply_row_limit, normalize_result
+from backend.sql_eval import (
+    ResultSet, validate_sql, apply_row_limit, canonical_rows, multiset_equal, normalize_result,
+    normalize_rows, normalize_value, plan_normalizers, StreamingComparator,
+    checksum_sql, describe_sql, canonicalize_sql, multiset_digest,
+)
 
 
 # ---------------------------------------------------------------------------
@@ -366,5 +370,228 @@ class TestNormalizeResult(unittest.TestCase):
         self.assertEqual(result, [(1,), (2,), (3,)])
 
 
+# ---------------------------------------------------------------------------
+# ResultSet / canonical_rows
+# ---------------------------------------------------------------------------
+
+class TestResultSet(unittest.TestCase):
+    def test_columns_kept_without_rows(self):
+        rs = ResultSet(['id', 'name'], [])
+        self.assertEqual(len(rs), 0)
+        self.assertEqual(rs.column_major(), [(), ()])
+
+    def test_column_major_view(self):
+        rs = ResultSet(['id', 'name'], [(1, 'a'), (2, 'b')])
+        self.assertEqual(rs.column_major(), [(1, 2), ('a', 'b')])
+        self.assertEqual(rs.column('NAME'), ('a', 'b'))
+
+    def test_payload_round_trip(self):
+        rs = ResultSet(['id'], [(1,), (2,)])
+        payload = rs.to_payload()
+        self.assertEqual(payload, {'columns': ['id'], 'rows': [(1,), (2,)]})
+        # JSON turns tuples into lists; from_payload restores them.
+        self.assertEqual(ResultSet.from_payload({'columns': ['id'], 'rows': [[1], [2]]}), rs)
+
+    def test_canonical_rows_order_insensitive(self):
+        self.assertEqual(
+            canonical_rows([(3, 'c'), (None, 'x'), (1, 'a')]),
+            [(None, 'x'), (1, 'a'), (3, 'c')],
+        )
+
+    def test_canonical_rows_matches_normalize_result(self):
+        dict_rows = [{'a': 2, 'b': 'y'}, {'a': 1, 'b': 'x'}]
+        self.assertEqual(
+            canonical_rows([(2, 'y'), (1, 'x')]),
+            normalize_result(dict_rows, ['a', 'b']),
+        )
+
+
+# ---------------------------------------------------------------------------
+# plan_normalizers / normalize_rows
+# ---------------------------------------------------------------------------
+
+def _desc(*types):
+    return [(f'c{i}', t, None, None, None, None, True) for i, t in enumerate(types)]
+
+
+class TestNormalizerPlan(unittest.TestCase):
+    def test_identity_columns_have_no_converter(self):
+        self.assertEqual(plan_normalizers(_desc(int, float, bool)), [None, None, None])
+
+    def test_datetime_column_not_treated_as_date(self):
+        dt = datetime.datetime(2024, 6, 1, 12, 30, 45, 999)
+        plan = plan_normalizers(_desc(datetime.datetime, datetime.date))
+        self.assertEqual(
+            normalize_rows([(dt, dt.date())], plan),
+            [('2024-06-01T12:30:45', '2024-06-01')],
+        )
+
+    def test_matches_per_cell_normalisation(self):
+        row = (1, '  x ', decimal.Decimal('2.718281'), None, datetime.date(2024, 1, 2), 1.5)
+        plan = plan_normalizers(_desc(int, str, decimal.Decimal, decimal.Decimal, datetime.date, float))
+        self.assertEqual(normalize_rows([row], plan), [tuple(normalize_value(v) for v in row)])
+
+    def test_unknown_type_falls_back_to_per_cell(self):
+        # Some drivers report a non-type code; values are still normalised.
+        plan = plan_normalizers(_desc(bytes, 'varchar'))
+        self.assertEqual(normalize_rows([(b'\x01', ' a ')], plan), [(b'\x01', 'a')])
+
+    def test_nulls_pass_through(self):
+        plan = plan_normalizers(_desc(decimal.Decimal, datetime.datetime))
+        self.assertEqual(normalize_rows([(None, None)], plan), [(None, None)])
+
+
+# ---------------------------------------------------------------------------
+# multiset_equal
+# ---------------------------------------------------------------------------
+
+class TestMultisetEqual(unittest.TestCase):
+    def test_same_rows_different_order(self):
+        self.assertTrue(multiset_equal([(1, 'a'), (2, None)], [(2, None), (1, 'a')]))
+
+    def test_duplicate_counts_must_match(self):
+        self.assertFalse(multiset_equal([(1,), (1,), (2,)], [(1,), (2,), (2,)]))
+
+    def test_different_lengths(self):
+        self.assertFalse(multiset_equal([(1,)], [(1,), (1,)]))
+
+    def test_empty(self):
+        self.assertTrue(multiset_equal([], []))
+
+    def test_int_and_float_compare_equal(self):
+        # Same rule as tuple equality (and the sorted comparison before it).
+        self.assertTrue(multiset_equal([(1,)], [(1.0,)]))
+
+    def test_unhashable_values_fall_back_to_sorting(self):
+        self.assertTrue(multiset_equal([([1],), ([2],)], [([2],), ([1],)]))
+
+
+class TestMultisetDigest(unittest.TestCase):
+    def test_order_independent(self):
+        self.assertEqual(multiset_digest([(1, 'a'), (2, None)]), multiset_digest([(2, None), (1, 'a')]))
+
+    def test_duplicates_change_digest(self):
+        self.assertNotEqual(multiset_digest([(1,), (1,), (2,)]), multiset_digest([(1,), (2,), (2,)]))
+
+    def test_row_count_prefix(self):
+        self.assertTrue(multiset_digest([(1,), (2,)]).startswith('2:'))
+        self.assertTrue(multiset_digest([]).startswith('0:'))
+
+
+# ---------------------------------------------------------------------------
+# StreamingComparator
+# ---------------------------------------------------------------------------
+
+class TestStreamingComparator(unittest.TestCase):
+    EXPECTED = ResultSet(['id'], [(1,), (2,), (2,), (3,)])
+
+    def _feed(self, batches, order_sensitive=False):
+        cmp = StreamingComparator(self.EXPECTED, order_sensitive)
+        for batch in batches:
+            if not cmp.feed(batch):
+                break
+        return cmp
+
+    def test_matching_rows_in_any_order(self):
+        cmp = self._feed([[(2,), (3,)], [(1,), (2,)]])
+        self.assertTrue(cmp.matched)
+        self.assertEqual(cmp.count, 4)
+
+    def test_stops_at_first_impossible_row(self):
+        cmp = StreamingComparator(self.EXPECTED)
+        self.assertFalse(cmp.feed([(1,), (9,), (2,)]))
+        self.assertEqual((cmp.mismatch, cmp.count), ('row', 2))
+        self.assertFalse(cmp.matched)
+
+    def test_extra_duplicate_is_impossible(self):
+        self.assertEqual(self._feed([[(3,), (3,)]]).mismatch, 'row')
+
+    def test_tally_counts_rows_after_a_mismatch(self):
+        cmp = StreamingComparator(self.EXPECTED)
+        cmp.feed([(9,)])
+        cmp.tally(1)
+        self.assertEqual((cmp.mismatch, cmp.count), ('row', 2))
+        self.assertFalse(cmp.matched)
+
+    def test_overflow_detected_without_reading_everything(self):
+        cmp = self._feed([[(1,), (2,), (2,), (3,)], [(1,)], [(1,)]])
+        self.assertEqual((cmp.mismatch, cmp.count), ('overflow', 5))
+
+    def test_short_result_has_no_early_mismatch(self):
+        cmp = self._feed([[(1,), (2,)], []])
+        self.assertIsNone(cmp.mismatch)
+        self.assertFalse(cmp.matched)
+        self.assertEqual(cmp.count, 2)
+
+    def test_order_sensitive_reports_misplaced_row(self):
+        cmp = self._feed([[(2,), (1,)]], order_sensitive=True)
+        self.assertEqual(cmp.mismatch, 'order')
+        self.assertEqual(self._feed([[(7,)]], order_sensitive=True).mismatch, 'row')
+        self.assertTrue(self._feed([[(1,), (2,), (2,), (3,)]], order_sensitive=True).matched)
+
+    def test_unhashable_expected_rows_compared_at_end(self):
+        cmp = StreamingComparator(ResultSet(['v'], [([1],), ([2],)]))
+        cmp.feed([([2],), ([1],)])
+        self.assertTrue(cmp.matched)
+
+
+# ---------------------------------------------------------------------------
+# describe_sql / checksum_sql
+# ---------------------------------------------------------------------------
+
+class TestChecksumSQL(unittest.TestCase):
+    def test_plain_query_wrapped_and_order_by_dropped(self):
+        self.assertEqual(
+            describe_sql("SELECT a, b FROM t ORDER BY a;"),
+            "WITH _qb_q AS (SELECT a, b FROM t) SELECT TOP 0 * FROM _qb_q",
+        )
+
+    def test_order_by_kept_when_top_depends_on_it(self):
+        self.assertIn("ORDER BY a) SELECT", describe_sql("SELECT TOP 5 a FROM t ORDER BY a"))
+        self.assertIn("OFFSET 2 ROWS) SELECT", describe_sql("SELECT a FROM t ORDER BY a OFFSET 2 ROWS"))
+
+    def test_cte_query_extends_its_cte_list(self):
+        sql = describe_sql("WITH x AS (SELECT a FROM t) SELECT a, COUNT(*) AS n FROM x GROUP BY a ORDER BY n")
+        self.assertEqual(
+            sql,
+            "WITH x AS (SELECT a FROM t), _qb_q AS (SELECT a, COUNT(*) AS n FROM x GROUP BY a) "
+            "SELECT TOP 0 * FROM _qb_q",
+        )
+
+    def test_keywords_inside_literals_ignored(self):
+        self.assertIn("AS s FROM t)", describe_sql("SELECT 'ORDER BY x' AS s FROM t"))
+
+    def test_checksum_casts_columns_like_the_normaliser(self):
+        sql = checksum_sql("SELECT a, b, c FROM t", [('a', int), ('b]x', decimal.Decimal), ('c', str)])
+        self.assertIn("COUNT_BIG(*)", sql)
+        self.assertIn("CAST([a] AS FLOAT)", sql)
+        self.assertIn("ROUND(CAST([b]]x] AS FLOAT), 4)", sql)
+        self.assertIn("CHECKSUM_AGG(BINARY_CHECKSUM(", sql)
+
+
+# ---------------------------------------------------------------------------
+# canonicalize_sql
+# ---------------------------------------------------------------------------
+
+class TestCanonicalizeSQL(unittest.TestCase):
+    def test_whitespace_case_and_semicolon_variants_collapse(self):
+        variants = [
+            "select a,b from t where x = 'A  b';",
+            "SELECT a , b\n  FROM t\n WHERE x='A  b'",
+            "  Select a,  b From t Where x = 'A  b' ;  ",
+        ]
+        self.assertEqual(len({canonicalize_sql(v) for v in variants}), 1)
+
+    def test_string_literals_and_identifiers_preserved(self):
+        self.assertNotEqual(
+            canonicalize_sql("SELECT a FROM t WHERE x = 'A  b'"),
+            canonicalize_sql("SELECT a FROM t WHERE x = 'a b'"),
+        )
+        self.assertIn("[Order Date]", canonicalize_sql("select [Order Date] from t"))
+
+    def test_different_queries_differ(self):
+        self.assertNotEqual(canonicalize_sql("SELECT a FROM t"), canonicalize_sql("SELECT b FROM t"))
+
+
 if __name__ == '__main__':
     unittest.main()
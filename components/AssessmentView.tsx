@@ -13,15 +13,15 @@ import SchemaVisualizer from './SchemaVisualizer';
 import { assessmentsApi, attemptsApi, schemaApi, assignmentsApi, ApiAttempt, ApiAssessmentFull, ApiSubmitResult, ApiQuestion, ApiValidationResult } from '../services/api';
 import { AssessmentHeader } from './AssessmentView/AssessmentHeader';
 
-const JOB_POLL_INTERVAL_MS = 700;
+// Status requests are long polls: the backend answers as soon as the job finishes,
+// or after JOB_WAIT_SECONDS with the job still pending, and we ask again.
+const JOB_WAIT_SECONDS = 25;
 const JOB_POLL_TIMEOUT_MS = 120000;
 
-const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
-
 async function waitForRunQueryJob(jobId: string) {
   const startedAt = Date.now();
   while (Date.now() - startedAt < JOB_POLL_TIMEOUT_MS) {
-    const job = await attemptsApi.getRunQueryStatus(jobId);
+    const job = await attemptsApi.getRunQueryStatus(jobId, JOB_WAIT_SECONDS);
     if (job.status === 'completed') {
       if (!job.result) {
         throw new Error('Query job completed without a result payload.');
@@ -31,7 +31,9 @@ async function waitForRunQueryJob(jobId: string) {
     if (job.status === 'failed') {
       throw new Error(job.error || 'Query execution job failed.');
     }
-    await sleep(JOB_POLL_INTERVAL_MS);
+    if (job.status === 'cancelled') {
+      throw new Error(job.reason === 'superseded' ? 'Replaced by a newer run.' : 'Query execution was cancelled.');
+    }
   }
   throw new Error('Query execution timed out while waiting for backend completion.');
 }
@@ -39,7 +41,7 @@ async function waitForRunQueryJob(jobId: string) {
 async function waitForValidateQueryJob(jobId: string) {
   const startedAt = Date.now();
   while (Date.now() - startedAt < JOB_POLL_TIMEOUT_MS) {
-    const job = await attemptsApi.getValidateQueryStatus(jobId);
+    const job = await attemptsApi.getValidateQueryStatus(jobId, JOB_WAIT_SECONDS);
     if (job.status === 'completed') {
       if (!job.result) {
         throw new Error('Validation job completed without a result payload.');
@@ -49,7 +51,9 @@ async function waitForValidateQueryJob(jobId: string) {
     if (job.status === 'failed') {
       throw new Error(job.error || 'Query validation job failed.');
     }
-    await sleep(JOB_POLL_INTERVAL_MS);
+    if (job.status === 'cancelled') {
+      throw new Error(job.reason === 'superseded' ? 'Replaced by a newer run.' : 'Query validation was cancelled.');
+    }
   }
   throw new Error('Query validation timed out while waiting for backend completion.');
 }
@@ -76,6 +80,8 @@ const AssessmentView: React.FC<Props> = ({ assessmentId: assignmentId, onExit })
   const [queries, setQueries] = useState<Record<string, string>>({});
   const [result, setResult] = useState<QueryResult | null>(null);
   const [isExecuting, setIsExecuting] = useState(false);
+  // Incremented per run; a run that is no longer the latest (re-run while it was executing) drops its outcome.
+  const runSeqRef = useRef(0);
   const [validationResult, setValidationResult] = useState<ApiValidationResult | null>(null);
   const [isValidating, setIsValidating] = useState(false);
   const [isFinished, setIsFinished] = useState(false);
@@ -197,12 +203,16 @@ const AssessmentView: React.FC<Props> = ({ assessmentId: assignmentId, onExit })
       return;
     }
 
+    const runSeq = ++runSeqRef.current;
+    const isLatestRun = () => runSeq === runSeqRef.current;
     setIsExecuting(true);
     setResult(null);
     setValidationResult(null);
     try {
-      const runJob = await attemptsApi.runQueryAsync(query, assessment.db_config);
+      // Re-running while a run is in flight cancels the older job on the server.
+      const runJob = await attemptsApi.runQueryAsync(query, assessment.db_config, attempt.id);
       const resultData = await waitForRunQueryJob(runJob.job_id);
+      if (!isLatestRun()) return;
       setResult(resultData);
 
       // Validate the query against expected solution
@@ -211,8 +221,9 @@ const AssessmentView: React.FC<Props> = ({ assessmentId: assignmentId, onExit })
         try {
           const validateJob = await attemptsApi.validateQueryAsync(query, currentQuestion.id, assessment.db_config);
           const validation = await waitForValidateQueryJob(validateJob.job_id);
-          setValidationResult(validation);
+          if (isLatestRun()) setValidationResult(validation);
         } catch (err) {
+          if (!isLatestRun()) return;
           // If validation fails, don't break the UI - just log it
           console.warn('Query validation failed (non-critical):', err);
           setValidationResult({
@@ -220,10 +231,11 @@ const AssessmentView: React.FC<Props> = ({ assessmentId: assignmentId, onExit })
             feedback: 'Real-time validation unavailable. Your query has executed successfully.'
           });
         } finally {
-          setIsValidating(false);
+          if (isLatestRun()) setIsValidating(false);
         }
       }
     } catch (err: unknown) {
+      if (!isLatestRun()) return;
       setResult({
         columns: [],
         rows: [],
@@ -232,7 +244,7 @@ const AssessmentView: React.FC<Props> = ({ assessmentId: assignmentId, onExit })
       });
       setValidationResult(null);
     } finally {
-      setIsExecuting(false);
+      if (isLatestRun()) setIsExecuting(false);
     }
   };
 
@@ -588,7 +600,7 @@ const AssessmentView: React.FC<Props> = ({ assessmentId: assignmentId, onExit })
         <div className="flex-1 flex flex-col bg-slate-900 min-w-0" ref={rightPaneRef}>
           <div className="bg-slate-800 px-4 py-2 border-b border-slate-700 flex justify-between items-center h-14 shrink-0">
             <span className="text-[10px] text-slate-500 font-mono tracking-widest uppercase flex items-center gap-2"><div className="w-2 h-2 rounded-full bg-blue-500 animate-pulse" /> Workspace</span>
-            <button onClick={handleExecute} disabled={isExecuting || isValidating} className="bg-blue-600 hover:bg-blue-500 text-white px-5 py-2 rounded-lg font-bold text-xs transition flex items-center gap-2 disabled:opacity-50">{isExecuting || isValidating ? <Loader2 className="w-3.5 h-3.5 animate-spin" /> : <><Play className="w-3.5 h-3.5" /> Run Query</>}</button>
+            <button onClick={handleExecute} disabled={isValidating} className="bg-blue-600 hover:bg-blue-500 text-white px-5 py-2 rounded-lg font-bold text-xs transition flex items-center gap-2 disabled:opacity-50">{isValidating ? <Loader2 className="w-3.5 h-3.5 animate-spin" /> : isExecuting ? <><Loader2 className="w-3.5 h-3.5 animate-spin" /> Re-run</> : <><Play className="w-3.5 h-3.5" /> Run Query</>}</button>
           </div>
 
           <div className="flex-1 relative overflow-hidden">
@@ -20,7 +20,7 @@ import {
   ApiDatabaseConfig, ApiQuestion, ApiAssessment, ApiAssignment, ApiResult, ApiParticipant,
 } from '../../services/api';
 import { Download } from 'lucide-react';
-import { getConfigDisplayName, getConfigDisplayTag } from '../../utils/databaseConfigs';
+import { findConfigByTag, getConfigDisplayName, getConfigDisplayTag } from '../../utils/databaseConfigs';
 
 // ─── Mappers: API response → frontend types ──────────────────────────────────
 
@@ -43,6 +43,7 @@ function mapConfig(c: ApiDatabaseConfig): ConfigWithId {
     provider: c.provider,
     default_schema: c.default_schema ?? 'dbo',
     schema_filter: c.schema_filter ?? '',
+    max_concurrent_queries: c.max_concurrent_queries ?? null,
   };
 }
 
@@ -166,10 +167,16 @@ const AdminDashboard: React.FC = () => {
       created_by: null,
     };
     try {
-      if (q._id) {
-        await questionsApi.update(q._id, payload);
-      } else {
-        await questionsApi.create(payload);
+      const saved = q._id ? await questionsApi.update(q._id, payload) : await questionsApi.create(payload);
+      // A validated question gets its golden snapshot on its target database, so
+      // grading there compares against the snapshot instead of running the solution.
+      const config = findConfigByTag(targets, payload.expected_schema_ref);
+      if (payload.is_validated && config) {
+        try {
+          await questionsApi.captureSnapshot(saved.id, config._id);
+        } catch (e: unknown) {
+          alert(`Question saved, but its solution snapshot could not be captured: ${e instanceof Error ? e.message : 'unknown error'}`);
+        }
       }
       setModal({ type: null, data: null });
       await loadAll();
@@ -255,6 +262,16 @@ const AdminDashboard: React.FC = () => {
     }
   };
 
+  const handleCheckSnapshots = async (t: DatabaseConfig) => {
+    const { snapshots } = await configsApi.checkSnapshots((t as ConfigWithId)._id);
+    return snapshots.map(r => ({
+      title: questions.find(q => q._id === r.question_id)?.title ?? `Question ${r.question_id}`,
+      drifted: r.drifted,
+      detail: r.detail,
+      error: r.error,
+    }));
+  };
+
   // ─── Assignment handlers ────────────────────────────────────────────────
 
   const handleBulkAssign = async (assessmentId: string, userIds: number[], dueDate: string) => {
@@ -460,6 +477,7 @@ const AdminDashboard: React.FC = () => {
             onAdd={() => setModal({ type: 'infrastructure', data: { provider: 'SQL_SERVER', port: 1433 } })}
             onEdit={(t) => setModal({ type: 'infrastructure', data: t })}
             onDelete={(t: ConfigWithId) => handleDeleteTarget(t)}
+            onCheckSnapshots={handleCheckSnapshots}
           />
         )}
 
@@ -792,6 +810,7 @@ const InfraConfigForm: React.FC<{ initial: any; onSave: (d: any) => void; onCanc
     provider: initial?.provider ?? 'SQL_SERVER',
     default_schema: initial?.default_schema ?? 'dbo',
     schema_filter: initial?.schema_filter ?? '',
+    max_concurrent_queries: (initial?.max_concurrent_queries ?? null) as number | null,
   });
   const [testStatus, setTestStatus] = useState<'idle' | 'testing' | 'ok' | 'fail'>(isNew ? 'idle' : 'ok');
   const [testMsg, setTestMsg] = useState('');
@@ -930,6 +949,21 @@ const InfraConfigForm: React.FC<{ initial: any; onSave: (d: any) => void; onCanc
         </div>
       </div>
 
+      {/* Query concurrency budget */}
+      <div>
+        <label className="block text-xs font-bold text-slate-400 uppercase tracking-widest mb-1">Max Concurrent Queries</label>
+        <p className="text-[10px] text-slate-400 mb-2">Queries allowed on this database at once before borrowing from the shared overflow pool. Leave blank for the server default.</p>
+        <input
+          type="number"
+          min={1}
+          name="max_concurrent_queries"
+          value={form.max_concurrent_queries ?? ''}
+          onChange={e => setForm((f: typeof form) => ({ ...f, max_concurrent_queries: e.target.value === '' ? null : Number(e.target.value) }))}
+          placeholder="(default)"
+          className="w-full p-3 bg-slate-50 border border-slate-200 rounded-xl outline-none font-mono text-xs"
+        />
+      </div>
+
       {/* Test connection */}
       <div className="flex items-center gap-4">
         <button
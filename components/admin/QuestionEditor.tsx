@@ -8,16 +8,16 @@ import { EditorView } from '@codemirror/view';
 import { attemptsApi } from '../../services/api';
 import { findConfigByTag, getConfigDisplayName } from '../../utils/databaseConfigs';
 
-const JOB_POLL_INTERVAL_MS = 700;
+// Status requests are long polls: the backend answers as soon as the job finishes,
+// or after JOB_WAIT_SECONDS with the job still pending, and we ask again.
+const JOB_WAIT_SECONDS = 25;
 const JOB_POLL_TIMEOUT_MS = 120000;
 
-const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
-
 async function waitForRunQueryJob(jobId: string) {
   const startedAt = Date.now();
 
   while (Date.now() - startedAt < JOB_POLL_TIMEOUT_MS) {
-    const job = await attemptsApi.getRunQueryStatus(jobId);
+    const job = await attemptsApi.getRunQueryStatus(jobId, JOB_WAIT_SECONDS);
     if (job.status === 'completed') {
       if (!job.result) {
         throw new Error('Query job completed without a result payload.');
@@ -27,7 +27,9 @@ async function waitForRunQueryJob(jobId: string) {
     if (job.status === 'failed') {
       throw new Error(job.error || 'Query execution job failed.');
     }
-    await sleep(JOB_POLL_INTERVAL_MS);
+    if (job.status === 'cancelled') {
+      throw new Error(job.reason === 'superseded' ? 'Replaced by a newer run.' : 'Query execution was cancelled.');
+    }
   }
 
   throw new Error('Query execution timed out while waiting for backend completion.');
@@ -164,6 +166,18 @@ export const QuestionEditor: React.FC<Props> = ({ item, targets, onSave, onCance
                 <span className="text-slate-400">Row order must match the solution exactly. Enable only when the question explicitly tests ORDER BY.</span>
               </span>
             </label>
+            <label className="flex items-start gap-3 p-3 mt-2 bg-slate-50 border border-slate-200 rounded-xl cursor-pointer hover:bg-slate-100 transition">
+              <input
+                type="checkbox"
+                checked={editingItem.grading_mode === 'CHECKSUM'}
+                onChange={e => setEditingItem({...editingItem, grading_mode: e.target.checked ? 'CHECKSUM' : 'ROWS'})}
+                className="mt-0.5 accent-slate-900 w-4 h-4 shrink-0"
+              />
+              <span className="text-xs leading-relaxed">
+                <span className="font-bold text-slate-700 block mb-0.5">Server-side checksum grading</span>
+                <span className="text-slate-400">For answers with many rows. The database compares complete results by row count and checksum, with no row cap. Always order-insensitive; every result column needs a unique name.</span>
+              </span>
+            </label>
           </div>
 
           <div>
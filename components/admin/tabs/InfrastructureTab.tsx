@@ -1,17 +1,41 @@
 
-import React from 'react';
-import { Plus, Server, HardDrive, Settings, Trash2 } from 'lucide-react';
+import React, { useState } from 'react';
+import { Plus, Server, HardDrive, Settings, Trash2, RefreshCw, Loader2, AlertTriangle, CheckCircle } from 'lucide-react';
 import { DatabaseConfig } from '../../../types';
 import { getConfigDisplayName } from '../../../utils/databaseConfigs';
 
+/** One golden snapshot's drift check result, labelled with its question's title. */
+export interface SnapshotCheck {
+  title: string;
+  drifted: boolean;
+  detail: string;
+  error: string | null;
+}
+
+type CheckState = { loading: true } | { loading: false; results?: SnapshotCheck[]; error?: string };
+
 interface Props {
   targets: DatabaseConfig[];
   onAdd: () => void;
   onEdit: (t: DatabaseConfig) => void;
   onDelete: (t: DatabaseConfig) => void;
+  onCheckSnapshots: (t: DatabaseConfig) => Promise<SnapshotCheck[]>;
 }
 
-export const InfrastructureTab: React.FC<Props> = ({ targets, onAdd, onEdit, onDelete }) => {
+export const InfrastructureTab: React.FC<Props> = ({ targets, onAdd, onEdit, onDelete, onCheckSnapshots }) => {
+  const [checks, setChecks] = useState<Record<string, CheckState>>({});
+
+  const checkSnapshots = async (target: DatabaseConfig) => {
+    const key = `${target.id}-${target.database_name}`;
+    setChecks(prev => ({ ...prev, [key]: { loading: true } }));
+    try {
+      const results = await onCheckSnapshots(target);
+      setChecks(prev => ({ ...prev, [key]: { loading: false, results } }));
+    } catch (e: unknown) {
+      setChecks(prev => ({ ...prev, [key]: { loading: false, error: e instanceof Error ? e.message : 'Snapshot check failed.' } }));
+    }
+  };
+
   return (
     <div className="space-y-6">
       <div className="flex justify-between items-center">
@@ -24,36 +48,65 @@ export const InfrastructureTab: React.FC<Props> = ({ targets, onAdd, onEdit, onD
         </button>
       </div>
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-        {targets.map(target => (
-          <div key={`${target.id}-${target.database_name}`} className="bg-white rounded-2xl border border-slate-200 p-6 hover:border-blue-300 transition group">
-            <div className="flex justify-between items-start mb-4">
-              <div className="flex items-center gap-3">
-                <div className="p-3 bg-slate-100 rounded-xl text-slate-600 group-hover:bg-blue-50 group-hover:text-blue-600 transition">
-                  <HardDrive className="w-5 h-5" />
+        {targets.map(target => {
+          const check = checks[`${target.id}-${target.database_name}`];
+          return (
+            <div key={`${target.id}-${target.database_name}`} className="bg-white rounded-2xl border border-slate-200 p-6 hover:border-blue-300 transition group">
+              <div className="flex justify-between items-start mb-4">
+                <div className="flex items-center gap-3">
+                  <div className="p-3 bg-slate-100 rounded-xl text-slate-600 group-hover:bg-blue-50 group-hover:text-blue-600 transition">
+                    <HardDrive className="w-5 h-5" />
+                  </div>
+                  <div>
+                    <h3 className="font-bold text-slate-900">{getConfigDisplayName(target)}</h3>
+                    <p className="text-[10px] font-mono text-slate-400">DB: {target.database_name}</p>
+                    <p className="text-[10px] font-mono text-slate-400">{target.host}:{target.port}</p>
+                  </div>
                 </div>
-                <div>
-                  <h3 className="font-bold text-slate-900">{getConfigDisplayName(target)}</h3>
-                  <p className="text-[10px] font-mono text-slate-400">DB: {target.database_name}</p>
-                  <p className="text-[10px] font-mono text-slate-400">{target.host}:{target.port}</p>
+                <div className="flex items-center gap-1">
+                  <button
+                    onClick={() => checkSnapshots(target)}
+                    disabled={check?.loading}
+                    className="p-2 text-slate-400 hover:text-blue-600 transition"
+                    title="Check solution snapshots for drift"
+                  >
+                    {check?.loading ? <Loader2 className="w-4 h-4 animate-spin" /> : <RefreshCw className="w-4 h-4" />}
+                  </button>
+                  <button onClick={() => onEdit(target)} className="p-2 text-slate-400 hover:text-blue-600 transition" title="Edit">
+                    <Settings className="w-4 h-4" />
+                  </button>
+                  <button onClick={() => onDelete(target)} className="p-2 text-slate-400 hover:text-red-600 transition" title="Delete">
+                    <Trash2 className="w-4 h-4" />
+                  </button>
                 </div>
               </div>
-              <div className="flex items-center gap-1">
-                <button onClick={() => onEdit(target)} className="p-2 text-slate-400 hover:text-blue-600 transition" title="Edit">
-                  <Settings className="w-4 h-4" />
-                </button>
-                <button onClick={() => onDelete(target)} className="p-2 text-slate-400 hover:text-red-600 transition" title="Delete">
-                  <Trash2 className="w-4 h-4" />
-                </button>
+              <div className="flex items-center gap-2 text-[10px] font-bold text-slate-400 uppercase tracking-widest bg-slate-50 px-2 py-1 rounded w-fit">
+                <Server className="w-3 h-3" /> {target.provider}
               </div>
+              {target.schema_filter && (
+                <p className="text-[10px] font-mono text-slate-400 mt-2">Schema: <span className="text-slate-600">{target.schema_filter}</span></p>
+              )}
+              {check && !check.loading && (
+                <div className="mt-4 pt-3 border-t border-slate-100 space-y-1 text-[10px]">
+                  {check.error ? (
+                    <p className="text-red-600 flex items-center gap-1 font-medium"><AlertTriangle className="w-3 h-3" /> {check.error}</p>
+                  ) : check.results && check.results.length === 0 ? (
+                    <p className="text-slate-400 italic">No solution snapshots captured on this database.</p>
+                  ) : check.results && check.results.every(r => !r.drifted && !r.error) ? (
+                    <p className="text-emerald-600 flex items-center gap-1 font-medium"><CheckCircle className="w-3 h-3" /> {check.results.length} snapshot(s) match the live data.</p>
+                  ) : (
+                    check.results?.filter(r => r.drifted || r.error).map((r, i) => (
+                      <p key={i} className="text-red-600 flex items-start gap-1 font-medium">
+                        <AlertTriangle className="w-3 h-3 shrink-0 mt-px" />
+                        <span><span className="font-bold">{r.title}:</span> {r.error ? `check failed — ${r.error}` : `${r.detail} — re-validate and save the question to recapture.`}</span>
+                      </p>
+                    ))
+                  )}
+                </div>
+              )}
             </div>
-            <div className="flex items-center gap-2 text-[10px] font-bold text-slate-400 uppercase tracking-widest bg-slate-50 px-2 py-1 rounded w-fit">
-              <Server className="w-3 h-3" /> {target.provider}
-            </div>
-            {target.schema_filter && (
-              <p className="text-[10px] font-mono text-slate-400 mt-2">Schema: <span className="text-slate-600">{target.schema_filter}</span></p>
-            )}
-          </div>
-        ))}
+          );
+        })}
       </div>
     </div>
   );
@@ -70,6 +70,7 @@ export interface ApiDatabaseConfig {
   provider: 'SQL_SERVER' | 'POSTGRES' | 'SQLITE';
   default_schema?: string;
   schema_filter?: string;
+  max_concurrent_queries?: number | null;
 }
 
 export interface ApiQuestion {
@@ -80,6 +81,7 @@ export interface ApiQuestion {
   tags: string[];
   expected_schema_ref: string | null;
   solution_query: string;
+  grading_mode?: 'ROWS' | 'CHECKSUM';
   is_validated: boolean;
   created_by: number | null;
   created_at: string;
@@ -166,10 +168,44 @@ export interface ApiAttemptDetail extends ApiAttempt {
   answers: ApiAttemptAnswer[];
 }
 
+export interface ApiExecutionMetadata {
+  /** Present only for CORRECT results. */
+  duration_ms?: number;
+  rows_returned?: number;
+  /** Whether the expected (solution) result came from the server-side cache, or from a stored golden snapshot. */
+  solution_cache?: 'hit' | 'miss' | 'disabled' | 'snapshot';
+  /** 'hit' when an identical (canonicalised) query had already been graded and nothing was re-run. */
+  verdict_cache?: 'hit';
+  /** Set when the question uses server-side checksum grading. */
+  grading?: 'checksum';
+}
+
+export interface ApiSolutionSnapshot {
+  id: number;
+  question: number;
+  db_config: number;
+  grading_mode: 'ROWS' | 'CHECKSUM';
+  columns: string[];
+  row_count: number;
+  digest: string;
+  has_rows: boolean;
+  captured_at: string;
+  verified_at: string | null;
+  is_drifted: boolean;
+  drift_detail: string;
+}
+
+export interface ApiSnapshotDriftResult {
+  question_id: number;
+  drifted: boolean;
+  detail: string;
+  error: string | null;
+}
+
 export interface ApiSubmitResult {
   status: 'CORRECT' | 'INCORRECT' | 'ERROR';
   feedback?: string;
-  execution_metadata?: { duration_ms: number; rows_returned: number };
+  execution_metadata?: ApiExecutionMetadata;
 }
 
 export interface ApiFinalizeResult {
@@ -189,26 +225,36 @@ export interface ApiQueryResult {
 export interface ApiValidationResult {
   status: 'CORRECT' | 'INCORRECT' | 'ERROR';
   feedback?: string;
-  execution_metadata?: { duration_ms: number; rows_returned: number };
+  execution_metadata?: ApiExecutionMetadata;
 }
 
 export interface ApiAsyncJobStart {
   job_id: string;
-  status: 'queued' | 'running' | 'completed' | 'failed';
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+  /** While queued: place in the target database's queue (1 = next, 0 = not waiting). */
+  queue_position?: number;
 }
 
 export interface ApiAsyncQueryJobStatus {
   job_id: string;
-  status: 'queued' | 'running' | 'completed' | 'failed';
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+  /** While queued: place in the target database's queue (1 = next, 0 = not waiting). */
+  queue_position?: number;
   result?: ApiQueryResult;
   error?: string;
+  /** When cancelled: 'cancelled' (on request), 'superseded' (a newer run replaced it) or 'abandoned'. */
+  reason?: 'cancelled' | 'superseded' | 'abandoned';
 }
 
 export interface ApiAsyncValidationJobStatus {
   job_id: string;
-  status: 'queued' | 'running' | 'completed' | 'failed';
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+  /** While queued: place in the target database's queue (1 = next, 0 = not waiting). */
+  queue_position?: number;
   result?: ApiValidationResult;
   error?: string;
+  /** When cancelled: 'cancelled' (on request), 'superseded' (a newer run replaced it) or 'abandoned'. */
+  reason?: 'cancelled' | 'superseded' | 'abandoned';
 }
 
 export interface ApiSchemaTable {
@@ -242,6 +288,10 @@ export const configsApi = {
     apiFetch<void>(`/configs/${id}/`, { method: 'DELETE' }),
   testConnection: (data: { host: string; port: number; database_name: string; trusted_connection: boolean; username?: string; password_secret_ref?: string }) =>
     apiFetch<{ success: boolean; message: string }>('/configs/test_connection/', { method: 'POST', body: JSON.stringify(data) }),
+  invalidateSolutionCache: (id: number) =>
+    apiFetch<{ invalidated: boolean; config_id: number }>(`/configs/${id}/invalidate_solution_cache/`, { method: 'POST' }),
+  checkSnapshots: (id: number) =>
+    apiFetch<{ config_id: number; snapshots: ApiSnapshotDriftResult[] }>(`/configs/${id}/check_snapshots/`, { method: 'POST' }),
 };
 
 export const questionsApi = {
@@ -252,6 +302,10 @@ export const questionsApi = {
     apiFetch<ApiQuestion>(`/questions/${id}/`, { method: 'PATCH', body: JSON.stringify(data) }),
   delete: (id: number) =>
     apiFetch<void>(`/questions/${id}/`, { method: 'DELETE' }),
+  invalidateSolutionCache: (id: number) =>
+    apiFetch<{ invalidated: boolean; question_id: number }>(`/questions/${id}/invalidate_solution_cache/`, { method: 'POST' }),
+  captureSnapshot: (id: number, configId: number) =>
+    apiFetch<ApiSolutionSnapshot>(`/questions/${id}/capture_snapshot/`, { method: 'POST', body: JSON.stringify({ config_id: configId }) }),
 };
 
 export const assessmentsApi = {
@@ -292,13 +346,19 @@ export const attemptsApi = {
       method: 'POST',
       body: JSON.stringify({ query, ...(configId !== undefined ? { config_id: configId } : {}) }),
     }),
-  runQueryAsync: (query: string, configId?: number) =>
+  /** Starting a new run cancels the user's previous run for the same attempt. */
+  runQueryAsync: (query: string, configId?: number, attemptId?: number) =>
     apiFetch<ApiAsyncJobStart>('/attempts/run_query_async/', {
       method: 'POST',
-      body: JSON.stringify({ query, ...(configId !== undefined ? { config_id: configId } : {}) }),
+      body: JSON.stringify({
+        query,
+        ...(configId !== undefined ? { config_id: configId } : {}),
+        ...(attemptId !== undefined ? { attempt_id: attemptId } : {}),
+      }),
     }),
-  getRunQueryStatus: (jobId: string) =>
-    apiFetch<ApiAsyncQueryJobStatus>(`/attempts/run_query_status/?job_id=${encodeURIComponent(jobId)}`),
+  /** `waitSeconds` > 0 holds the request until the job finishes (long poll, max 25s). */
+  getRunQueryStatus: (jobId: string, waitSeconds = 0) =>
+    apiFetch<ApiAsyncQueryJobStatus>(`/attempts/run_query_status/?job_id=${encodeURIComponent(jobId)}&wait=${waitSeconds}`),
   validateQuery: (query: string, questionId: number, configId?: number) =>
     apiFetch<ApiValidationResult>('/attempts/validate_query/', {
       method: 'POST',
@@ -309,8 +369,8 @@ export const attemptsApi = {
       method: 'POST',
       body: JSON.stringify({ query, question_id: questionId, ...(configId !== undefined ? { config_id: configId } : {}) }),
     }),
-  getValidateQueryStatus: (jobId: string) =>
-    apiFetch<ApiAsyncValidationJobStatus>(`/attempts/validate_query_status/?job_id=${encodeURIComponent(jobId)}`),
+  getValidateQueryStatus: (jobId: string, waitSeconds = 0) =>
+    apiFetch<ApiAsyncValidationJobStatus>(`/attempts/validate_query_status/?job_id=${encodeURIComponent(jobId)}&wait=${waitSeconds}`),
   submitAnswer: (attemptId: number, questionId: number, query: string) =>
     apiFetch<ApiSubmitResult>(`/attempts/${attemptId}/submit_answer/`, {
       method: 'POST',
@@ -46,6 +46,7 @@ export interface DatabaseConfig {
   provider: 'SQL_SERVER' | 'POSTGRES' | 'SQLITE';
   default_schema: string;   // Default schema for unqualified name resolution (e.g. "dbo")
   schema_filter: string;    // When set, explorer only shows tables in this schema
+  max_concurrent_queries?: number | null; // Per-database query concurrency budget (null = server default)
 }
 
 export interface Question {
@@ -58,6 +59,8 @@ export interface Question {
   expected_schema_ref: string;
   solution_query: string;
   order_sensitive: boolean;
+  /** CHECKSUM: complete results fingerprinted in SQL Server instead of compared row by row. */
+  grading_mode?: 'ROWS' | 'CHECKSUM';
   schema_metadata?: SchemaMetadata;
 }
 